@@ -0,0 +1,87 @@
+from streaming_stats import Ewma
+
+
+class AdaptiveRateController:
+    # Halves a key's probe interval (down to fast_interval) whenever a cycle's
+    # latency, jitter or loss moves past its threshold, and stretches it back
+    # out by `backoff` after `stable_cycles` quiet cycles until it reaches
+    # floor_interval. Every change is clamped so the sum of probes per second
+    # across keys stays within `budget`; the budget wins over the floor, so a
+    # key may be stretched past floor_interval when there are too many probes.
+    def __init__(self, base_interval, fast_interval=1.0, floor_interval=30.0, budget=10.0,
+                 latency_change=20.0, jitter_change=10.0, loss_threshold=0.0,
+                 stable_cycles=3, backoff=1.5):
+        self.base_interval = base_interval
+        self.fast_interval = min(fast_interval, base_interval)
+        self.floor_interval = max(floor_interval, base_interval)
+        self.budget = budget
+        self.latency_change = latency_change
+        self.jitter_change = jitter_change
+        self.loss_threshold = loss_threshold
+        self.stable_cycles = stable_cycles
+        self.backoff = backoff
+
+        self._keys = {}
+
+    def reset(self, base_interval=None):
+        if base_interval:
+            self.base_interval = base_interval
+            self.fast_interval = min(self.fast_interval, base_interval)
+            self.floor_interval = max(self.floor_interval, base_interval)
+        self._keys.clear()
+
+    def interval(self, key):
+        state = self._keys.get(key)
+        return state['interval'] if state else self.base_interval
+
+    def observe(self, key, batch, jitter=None):
+        # Returns the interval the key should use from now on
+        state = self._keys.get(key)
+        if state is None:
+            state = self._keys[key] = {
+                'interval': self.base_interval,
+                'probes': len(batch),
+                'latency': Ewma(),
+                'jitter': Ewma(),
+                'stable': 0
+            }
+        state['probes'] = max(len(batch), 1)
+
+        latencies = batch.successful_latencies()
+        loss = batch.failure_count / len(batch) * 100 if batch else 0
+
+        degraded = loss > self.loss_threshold
+        if latencies:
+            mean = sum(latencies) / len(latencies)
+            baseline = state['latency'].value
+            if baseline is not None and abs(mean - baseline) > self.latency_change:
+                degraded = True
+            state['latency'].add(mean)
+        if jitter is not None:
+            baseline = state['jitter'].value
+            if baseline is not None and jitter - baseline > self.jitter_change:
+                degraded = True
+            state['jitter'].add(jitter)
+
+        if degraded:
+            state['stable'] = 0
+            interval = max(state['interval'] / 2, self.fast_interval)
+        else:
+            state['stable'] += 1
+            interval = state['interval']
+            if state['stable'] >= self.stable_cycles:
+                state['stable'] = 0
+                interval = min(interval * self.backoff, self.floor_interval)
+
+        state['interval'] = self._within_budget(key, interval)
+        return state['interval']
+
+    def _within_budget(self, key, interval):
+        others = sum(state['probes'] / state['interval']
+                     for other, state in self._keys.items() if other != key)
+        available = self.budget - others
+        probes = self._keys[key]['probes']
+        if available <= 0:
+            # The other keys have not been clamped yet; take an equal share
+            return max(interval, probes * len(self._keys) / self.budget)
+        return max(interval, probes / available)
@@ -0,0 +1,150 @@
+from datetime import datetime
+from urllib.parse import urlsplit
+
+
+class PageHinkley:
+    # Two-sided Page-Hinkley test on one latency series. Samples within
+    # `delta` of the segment mean are treated as noise; a shift is reported
+    # once the cumulative deviation exceeds `threshold`. The new level is the
+    # mean of the samples since the cumulative sum last turned, so the
+    # reported shift is not diluted by the old segment. O(1) per sample.
+    def __init__(self, delta=5.0, threshold=100.0, warmup=10):
+        self.delta = delta
+        self.threshold = threshold
+        self.warmup = warmup
+        self.reset()
+
+    def reset(self, level=None):
+        self.count = 0
+        self.mean = 0.0
+        if level is not None:
+            self.count = 1
+            self.mean = level
+        self._up = _Side()
+        self._down = _Side()
+
+    def add(self, value):
+        # Returns the size of a detected shift in ms, or None
+        self.count += 1
+        self.mean += (value - self.mean) / self.count
+
+        self._up.add(value - self.mean - self.delta, value, self.mean, lower=True)
+        self._down.add(value - self.mean + self.delta, value, self.mean, lower=False)
+
+        if self.count < self.warmup:
+            return None
+
+        for side in (self._up, self._down):
+            if side.deviation() > self.threshold and side.since_count:
+                level = side.since_sum / side.since_count
+                shift = level - side.baseline
+                self.reset(level)
+                return shift
+        return None
+
+
+class _Side:
+    def __init__(self):
+        self.total = 0.0
+        self.extreme = 0.0
+        self.baseline = 0.0
+        self.since_sum = 0.0
+        self.since_count = 0
+
+    def add(self, step, value, mean, lower):
+        self.total += step
+        if (self.total < self.extreme) if lower else (self.total > self.extreme):
+            self.extreme = self.total
+            self.baseline = mean
+            self.since_sum = 0.0
+            self.since_count = 0
+        else:
+            self.since_sum += value
+            self.since_count += 1
+
+    def deviation(self):
+        return abs(self.total - self.extreme)
+
+
+def endpoint_label(url):
+    host = urlsplit(url).hostname or url
+    return host.split('.')[0]
+
+
+class AnomalyDetector:
+    # Per-endpoint change-point and loss-burst detection. Alerts are plain
+    # dicts delivered to every subscriber. A latency shift must be at least
+    # `min_shift` ms to be reported and re-baselines the detector, and a loss
+    # burst opens after `burst_failures` consecutive failures and only clears
+    # after `recover_successes` consecutive successes, so alerts don't flap.
+    def __init__(self, delta=5.0, threshold=100.0, warmup=10, min_shift=15.0,
+                 burst_failures=3, recover_successes=3):
+        self.delta = delta
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_shift = min_shift
+        self.burst_failures = burst_failures
+        self.recover_successes = recover_successes
+
+        self._endpoints = {}
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def observe(self, batch, region):
+        for url, latency in zip(batch.urls, batch.latency):
+            self.add(region, url, latency if latency == latency else None)
+
+    def add(self, region, url, latency):
+        # latency is None for a failed probe
+        # Keyed by region too: regions that share an endpoint URL each have
+        # their own baseline and failure run
+        state = self._endpoints.get((region, url))
+        if state is None:
+            state = self._endpoints[(region, url)] = {
+                'detector': PageHinkley(self.delta, self.threshold, self.warmup),
+                'failures': 0,
+                'successes': 0,
+                'burst': False
+            }
+
+        if latency is None:
+            state['failures'] += 1
+            state['successes'] = 0
+            if not state['burst'] and state['failures'] >= self.burst_failures:
+                state['burst'] = True
+                self._emit('loss_burst', region, url,
+                           f"{region} {endpoint_label(url)} loss burst: {state['failures']} probes failed in a row")
+            return
+
+        state['successes'] += 1
+        state['failures'] = 0
+        if state['burst'] and state['successes'] >= self.recover_successes:
+            state['burst'] = False
+            self._emit('loss_recovered', region, url, f"{region} {endpoint_label(url)} recovered from loss burst")
+
+        shift = state['detector'].add(latency)
+        if shift is not None and abs(shift) >= self.min_shift:
+            self._emit('latency_shift', region, url,
+                       f"{region} {endpoint_label(url)} latency shifted {shift:+.0f} ms", shift=round(shift, 1))
+
+    def _emit(self, kind, region, url, message, **fields):
+        event = {
+            'type': kind,
+            'region': region,
+            'endpoint': url,
+            'message': message,
+            'timestamp': datetime.now()
+        }
+        event.update(fields)
+        for callback in list(self._subscribers):
+            try:
+                callback(event)
+            except Exception:
+                pass
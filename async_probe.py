@@ -0,0 +1,252 @@
+import asyncio
+import socket
+import ssl
+import time
+from urllib.parse import urlsplit
+
+from phase_probe import build_get_request, parse_status, phase_result, phased_http_ping, split_url
+from probe_result import ErrorCode, ProbeResult
+from socket_probes import UdpEchoProbe, tcp_connect_ping_async
+
+
+class AsyncProbeEngine:
+    def __init__(self, max_in_flight=64, timeout=3, headers=None, probe_type="http", ssl_context=None,
+                 udp_port=5000, pool_size=2, connection_mode="auto"):
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self.probe_type = probe_type
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self.udp_port = udp_port
+        self.pool_size = pool_size
+        self.connection_mode = connection_mode
+        self._udp_probes = {}
+
+        self.loop = None
+        # Idle keep-alive connections per (scheme, host, port), at most
+        # pool_size each; every HTTP result records whether it reused one
+        self._idle_connections = {}
+
+    def run_cycle(self, urls, offsets=None, budget=None):
+        if self.loop is None or self.loop.is_closed():
+            self.loop = asyncio.new_event_loop()
+
+        return self.loop.run_until_complete(self._run_all(urls, offsets or [0.0] * len(urls), budget))
+
+    def prewarm(self, urls):
+        if self.probe_type != "http" or self.connection_mode == "cold":
+            return 0
+        if self.loop is None or self.loop.is_closed():
+            self.loop = asyncio.new_event_loop()
+        return self.loop.run_until_complete(self._prewarm_all(urls))
+
+    async def _prewarm_all(self, urls):
+        jobs = []
+        for url in urls:
+            parts = urlsplit(url)
+            secure = parts.scheme == "https"
+            origin = (parts.scheme, parts.hostname, parts.port or (443 if secure else 80))
+            missing = self.pool_size - len(self._idle_connections.get(origin, []))
+            jobs.extend(self._warm_one(url) for _ in range(missing))
+        if not jobs:
+            return 0
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        return sum(1 for result in results if result is True)
+
+    async def _warm_one(self, url):
+        await asyncio.wait_for(self._head(url, force_new=True), self.timeout)
+        return True
+
+    def close(self):
+        if self.loop is None or self.loop.is_closed():
+            return
+
+        for connections in self._idle_connections.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle_connections.clear()
+
+        for probe in self._udp_probes.values():
+            probe.close()
+        self._udp_probes.clear()
+
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+
+    async def _run_all(self, urls, offsets, budget):
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        tasks = {
+            asyncio.ensure_future(self._bounded_ping(semaphore, url, offset)): url
+            for url, offset in zip(urls, offsets)
+        }
+        if not tasks:
+            return []
+
+        done, pending = await asyncio.wait(tasks, timeout=budget)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        # One bad target fails on its own instead of losing the whole cycle
+        results = [ProbeResult.failure(tasks[task], ErrorCode.UNEXPECTED, str(task.exception()))
+                   if task.exception() else task.result() for task in done]
+        results.extend(ProbeResult.failure(tasks[task], ErrorCode.CYCLE_DEADLINE) for task in pending)
+        return results
+
+    async def _bounded_ping(self, semaphore, url, offset):
+        if offset:
+            await asyncio.sleep(offset)
+        async with semaphore:
+            if self.probe_type == "tcp":
+                return await tcp_connect_ping_async(url, self.timeout)
+            if self.probe_type == "udp":
+                probe = self._udp_probes.get(url)
+                if probe is None:
+                    probe = self._udp_probes[url] = UdpEchoProbe(url, self.udp_port)
+                return await probe.ping_async(self.timeout)
+            return await self._http_ping(url)
+
+    async def _http_ping(self, url):
+        try:
+            if self.probe_type == "phased":
+                return await asyncio.wait_for(self._phased_get(url), self.timeout)
+            
+            if self.connection_mode == "warm":
+                await asyncio.wait_for(self._ensure_warm(url), self.timeout)
+            latency, status, reused, handshake_ms = await asyncio.wait_for(self._head(url), self.timeout)
+
+            result = ProbeResult(url, round(latency, 1), status)
+            result.reused = reused
+            result.handshake_ms = round(handshake_ms, 1) if handshake_ms is not None else None
+            return result
+
+        except asyncio.TimeoutError:
+            return ProbeResult.failure(url, ErrorCode.REQUEST_TIMEOUT)
+        except OSError:
+            return ProbeResult.failure(url, ErrorCode.CONNECTION_FAILED)
+        except Exception as e:
+            return ProbeResult.failure(url, ErrorCode.UNEXPECTED, str(e))
+
+    async def _ensure_warm(self, url):
+        # Warm mode never times a request on a fresh connection: prime one first
+        parts = urlsplit(url)
+        secure = parts.scheme == "https"
+        origin = (parts.scheme, parts.hostname, parts.port or (443 if secure else 80))
+        if not self._idle_connections.get(origin):
+            await self._head(url, force_new=True)
+
+    async def _head(self, url, force_new=False):
+        # Returns (latency, status, reused, handshake_ms). A new connection's
+        # latency includes its handshake, so reused and new samples measure
+        # warm RTT and cold setup cost respectively.
+        parts = urlsplit(url)
+        secure = parts.scheme == "https"
+        host = parts.hostname
+        port = parts.port or (443 if secure else 80)
+        origin = (parts.scheme, host, port)
+
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        request = self._build_request("HEAD", parts.netloc, path)
+
+        idle = self._idle_connections.setdefault(origin, [])
+        while True:
+            reused = bool(idle) and not force_new and self.connection_mode != "cold"
+            handshake_ms = None
+            if reused:
+                reader, writer = idle.pop()
+            else:
+                start_time = time.perf_counter()
+                reader, writer = await asyncio.open_connection(
+                    host, port,
+                    ssl=self.ssl_context if secure else None,
+                    server_hostname=host if secure else None
+                )
+                handshake_ms = (time.perf_counter() - start_time) * 1000
+
+            try:
+                start_time = time.perf_counter()
+                writer.write(request)
+                await writer.drain()
+                status_line = await reader.readline()
+                end_time = time.perf_counter()
+            except BaseException:
+                writer.close()
+                raise
+
+            if status_line:
+                break
+
+            # The server dropped an idle keep-alive connection; retry on a fresh one
+            writer.close()
+            if not reused:
+                raise ConnectionError("Connection closed by server")
+
+        try:
+            status = int(status_line.split()[1])
+            keep_alive = True
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "connection" and value.strip().lower() == "close":
+                    keep_alive = False
+        except BaseException:
+            writer.close()
+            raise
+
+        if keep_alive and line and self.connection_mode != "cold" and len(idle) < self.pool_size:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+        latency = (end_time - start_time) * 1000
+        if handshake_ms is not None:
+            latency += handshake_ms
+        return latency, status, reused, handshake_ms
+
+    async def _phased_get(self, url):
+        loop = asyncio.get_running_loop()
+        host, port, secure, netloc, path = split_url(url)
+
+        start_time = time.perf_counter()
+        addresses = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        dns_ms = (time.perf_counter() - start_time) * 1000
+
+        address = addresses[0][4]
+        start_time = time.perf_counter()
+        reader, writer = await asyncio.open_connection(address[0], address[1])
+        connect_ms = (time.perf_counter() - start_time) * 1000
+
+        try:
+            tls_ms = None
+            if secure:
+                if not hasattr(writer, "start_tls"):
+                    # StreamWriter.start_tls only exists on Python 3.11+; time the
+                    # phases on a worker thread instead of folding TLS into connect
+                    return await loop.run_in_executor(
+                        None, phased_http_ping, url, self.timeout, self.headers, self.ssl_context
+                    )
+                start_time = time.perf_counter()
+                await writer.start_tls(self.ssl_context, server_hostname=host)
+                tls_ms = (time.perf_counter() - start_time) * 1000
+
+            start_time = time.perf_counter()
+            writer.write(build_get_request(netloc, path, self.headers))
+            await writer.drain()
+            status_line = await reader.readline()
+            ttfb_ms = (time.perf_counter() - start_time) * 1000
+
+            if not status_line:
+                raise ConnectionError("Connection closed by server")
+            return phase_result(url, parse_status(status_line), dns_ms, connect_ms, tls_ms, ttfb_ms)
+        finally:
+            writer.close()
+
+    def _build_request(self, method, netloc, path):
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {netloc}", "Connection: keep-alive"]
+        lines.extend(f"{name}: {value}" for name, value in self.headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
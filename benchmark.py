@@ -0,0 +1,331 @@
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+
+from ping_monitor import CONNECTION_MODES, PROBE_ENGINES, PingMonitor
+from probe_result import ErrorCode
+from result_bus import OVERFLOW_POLICIES
+
+BENCH_REGION = "BENCH"
+BENCH_PROBE_TYPES = ("http", "tcp", "udp")
+SCENARIOS = ("cycles", "loop")
+
+
+def _start_standins(probe_type, config):
+    from standin_server import StandinHTTPServer, StandinTCPServer, StandinUDPEchoServer
+
+    servers = []
+    for index in range(config['servers']):
+        blackhole = index < config['blackhole']
+        seed = config['seed'] + index if config['seed'] is not None else None
+        if probe_type == "tcp":
+            server = StandinTCPServer(blackhole=blackhole)
+        elif probe_type == "udp":
+            server = StandinUDPEchoServer(delay=config['delay'], jitter=config['jitter'], loss=config['loss'],
+                                          seed=seed, blackhole=blackhole)
+        else:
+            server = StandinHTTPServer(server_delay=config['delay'], jitter=config['jitter'], loss=config['loss'],
+                                       blackhole=blackhole, seed=seed, certfile=config['certfile'],
+                                       keyfile=config['keyfile'])
+        servers.append(server.start())
+    return servers
+
+
+def _serve_standins(probe_type, config, ready, stop_event):
+    servers = _start_standins(probe_type, config)
+    ready.send([server.url for server in servers])
+    stop_event.wait()
+    for server in servers:
+        server.stop()
+
+
+class ImpairmentLab:
+    # Stand-in servers with injected delay, jitter, loss and blackholing. They
+    # run in a child process, so CPU time measured here belongs to the probe
+    # pipeline alone. Endpoints are spread round-robin over the servers, and
+    # the first `blackhole` servers never answer.
+    def __init__(self, probe_type="http", servers=8, endpoints=64, delay=0.02, jitter=0.0, loss=0.0,
+                 blackhole=0, tls=False, seed=None):
+        if probe_type not in BENCH_PROBE_TYPES:
+            raise ValueError(f"Unknown probe type: {probe_type}")
+        self.probe_type = probe_type
+        self.config = {
+            'servers': servers,
+            'delay': delay,
+            'jitter': jitter,
+            'loss': loss,
+            'blackhole': min(blackhole, servers),
+            'seed': seed,
+            'certfile': None,
+            'keyfile': None
+        }
+        self.endpoint_count = endpoints
+        self.tls = tls and probe_type == "http"
+        self.endpoints = []
+        self.blackholed = set()
+
+        self._process = None
+        self._stop_event = None
+
+    def start(self, timeout=30):
+        if self.tls:
+            from standin_server import generate_self_signed_cert
+            self.config['certfile'], self.config['keyfile'] = generate_self_signed_cert()
+
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        self._stop_event = context.Event()
+        self._process = context.Process(
+            target=_serve_standins,
+            args=(self.probe_type, self.config, sender, self._stop_event),
+            daemon=True
+        )
+        self._process.start()
+        if not receiver.poll(timeout):
+            self.stop()
+            raise RuntimeError("Stand-in servers did not start")
+        urls = receiver.recv()
+
+        for index in range(self.endpoint_count):
+            server = index % len(urls)
+            endpoint = f"{urls[server].rstrip('/')}/probe/{index}"
+            self.endpoints.append(endpoint)
+            if server < self.config['blackhole']:
+                self.blackholed.add(endpoint)
+        return self
+
+    def stop(self):
+        if self._process is None:
+            return
+        self._stop_event.set()
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = None
+
+    def client_ssl_context(self):
+        import ssl
+        return ssl.create_default_context(cafile=self.config['certfile'])
+
+    def expected_latency(self):
+        # Mean injected delay in ms; a TCP handshake has none to compare against
+        if self.probe_type == "tcp":
+            return None
+        return (self.config['delay'] + self.config['jitter'] / 2) * 1000
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def _summary(values):
+    return {
+        'mean': round(sum(values) / len(values), 2),
+        'p50': round(_percentile(values, 0.50), 2),
+        'p95': round(_percentile(values, 0.95), 2),
+        'max': round(max(values), 2)
+    }
+
+
+def _make_monitor(lab, engine, args, callback=None):
+    monitor = PingMonitor(
+        callback=callback,
+        engine=engine,
+        probe_type=lab.probe_type,
+        max_in_flight=args.max_in_flight,
+        probe_spacing=args.probe_spacing,
+        cycle_budget=args.cycle_budget,
+        callback_policy=args.callback_policy,
+        connection_mode=args.connection_mode,
+        log_callback=lambda message: None
+    )
+    monitor.RIOT_ENDPOINTS = {BENCH_REGION: lab.endpoints}
+    monitor.set_region(BENCH_REGION)
+    if lab.tls:
+        monitor.ssl_context = lab.client_ssl_context()
+    return monitor
+
+
+def _probe_report(lab, batches, seconds, cpu_seconds):
+    expected = lab.expected_latency()
+    probes = sum(len(batch) for batch in batches)
+    errors = []
+    failures = {}
+    measured = lost = blackholed = answered = 0
+
+    for batch in batches:
+        for url, latency, error in zip(batch.urls, batch.latency, batch.error):
+            if url in lab.blackholed:
+                blackholed += 1
+                answered += latency == latency
+                continue
+            measured += 1
+            if latency != latency:
+                lost += 1
+                name = ErrorCode(error).name
+                failures[name] = failures.get(name, 0) + 1
+            elif expected is not None:
+                errors.append(latency - expected)
+
+    report = {
+        'probes': probes,
+        'seconds': round(seconds, 3),
+        'probes_per_second': round(probes / seconds, 1) if seconds else 0.0,
+        'cpu_us_per_probe': round(cpu_seconds / probes * 1e6, 1) if probes else 0.0,
+        'cpu_percent': round(cpu_seconds / seconds * 100, 1) if seconds else 0.0,
+        'loss_percent': round(lost / measured * 100, 2) if measured else 0.0,
+        'injected_loss_percent': round(lab.config['loss'] * 100, 2),
+        'blackholed_probes': blackholed,
+        'blackholed_answered': answered,
+        'failures': failures
+    }
+    if errors:
+        # Measured latency minus the mean injected delay: the probe
+        # pipeline's own overhead and bias
+        report['error_ms'] = _summary(errors)
+    return report
+
+
+def bench_cycles(lab, engine, args):
+    # Back-to-back _run_http_ping_tests calls: raw pipeline throughput
+    monitor = _make_monitor(lab, engine, args)
+    monitor._prewarm_connections([BENCH_REGION])
+    monitor._run_http_ping_tests(BENCH_REGION)
+
+    batches = []
+    cpu_start = time.process_time()
+    start_time = time.perf_counter()
+    for _ in range(args.cycles):
+        batches.append(monitor._run_http_ping_tests(BENCH_REGION))
+    seconds = time.perf_counter() - start_time
+    cpu_seconds = time.process_time() - cpu_start
+
+    monitor.close()
+
+    report = {'scenario': 'cycles', 'engine': engine, 'probe_type': lab.probe_type,
+              'endpoints': len(lab.endpoints), 'cycles': len(batches)}
+    report.update(_probe_report(lab, batches, seconds, cpu_seconds))
+    return report
+
+
+def bench_loop(lab, engine, args):
+    # The real monitor loop with a GUI-like callback on the bus. Callback
+    # latency runs from the cycle's last probe result to the callback, so it
+    # includes stats updates, bus queueing and any backlog from slow callbacks.
+    callback_latencies = []
+
+    def callback(batch, stats):
+        callback_latencies.append((time.perf_counter_ns() - max(batch.timestamp_ns)) / 1e6)
+        if args.callback_cost:
+            time.sleep(args.callback_cost)
+
+    batches = []
+    monitor = _make_monitor(lab, engine, args, callback=callback)
+    monitor.subscribe(lambda topic, payload: batches.append(payload[0]), topics=('cycle',), name='bench',
+                      maxsize=4096)
+
+    # Warmed before the clock starts: blackholed servers hold the prewarm
+    # until its connect timeout, which would otherwise eat the duration
+    monitor._prewarm_connections([BENCH_REGION])
+    monitor.prewarm = False
+
+    cpu_start = time.process_time()
+    start_time = time.perf_counter()
+    monitor.start_monitor(args.interval)
+    time.sleep(args.duration)
+    monitor.stop_monitor()
+    monitor.monitor_thread.join(timeout=args.cycle_budget + 5)
+    monitor.flush(timeout=args.callback_cost * len(batches) + 2)
+    seconds = time.perf_counter() - start_time
+    cpu_seconds = time.process_time() - cpu_start
+
+    callback_metrics = monitor.get_bus_metrics()['callback']
+    missed = monitor.scheduler.missed_deadlines
+    monitor.close()
+
+    report = {'scenario': 'loop', 'engine': engine, 'probe_type': lab.probe_type,
+              'endpoints': len(lab.endpoints), 'cycles': len(batches),
+              'expected_cycles': int(args.duration / args.interval), 'missed_deadlines': missed,
+              'callbacks': len(callback_latencies), 'callbacks_dropped': callback_metrics['dropped'],
+              'callbacks_coalesced': callback_metrics['coalesced']}
+    report.update(_probe_report(lab, batches, seconds, cpu_seconds))
+    if callback_latencies:
+        report['callback_latency_ms'] = _summary(callback_latencies)
+    return report
+
+
+def format_report(report):
+    line = (f"{report['scenario']:<6} {report['engine']:<7} {report['probe_type']:<4} "
+            f"{report['endpoints']} endpoints x {report['cycles']} cycles: "
+            f"{report['probes_per_second']:.0f} probes/s, {report['cpu_us_per_probe']:.0f} us CPU/probe, "
+            f"loss {report['loss_percent']:.1f}% (injected {report['injected_loss_percent']:.1f}%)")
+    if 'error_ms' in report:
+        error = report['error_ms']
+        line += f", error p50 {error['p50']:+.2f} ms p95 {error['p95']:+.2f} ms"
+    if 'callback_latency_ms' in report:
+        latency = report['callback_latency_ms']
+        line += (f", callback p50 {latency['p50']:.2f} ms p95 {latency['p95']:.2f} ms"
+                 f", {report['missed_deadlines']} missed deadline(s)")
+    if report['failures']:
+        line += ", failures " + ", ".join(f"{name}={count}" for name, count in sorted(report['failures'].items()))
+    return line
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the probe pipeline against local impaired stand-ins")
+    parser.add_argument('--scenario', choices=SCENARIOS, nargs='+', default=list(SCENARIOS))
+    parser.add_argument('--engine', choices=PROBE_ENGINES, nargs='+', default=list(PROBE_ENGINES))
+    parser.add_argument('--probe-type', choices=BENCH_PROBE_TYPES, default='http')
+    parser.add_argument('--servers', type=int, default=8)
+    parser.add_argument('--endpoints', type=int, default=64)
+    parser.add_argument('--delay', type=float, default=0.02, help="injected delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="injected random extra delay in seconds")
+    parser.add_argument('--loss', type=float, default=0.0, help="fraction of requests left unanswered")
+    parser.add_argument('--blackhole', type=int, default=0, help="number of servers that never answer")
+    parser.add_argument('--tls', action='store_true', help="serve HTTPS with a throwaway certificate")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--cycles', type=int, default=20, help="cycles for the cycles scenario")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds for the loop scenario")
+    parser.add_argument('--interval', type=float, default=1.0, help="probe interval for the loop scenario")
+    parser.add_argument('--max-in-flight', type=int, default=64)
+    parser.add_argument('--probe-spacing', type=float, default=0.0)
+    parser.add_argument('--cycle-budget', type=float, default=4.0)
+    parser.add_argument('--connection-mode', choices=CONNECTION_MODES, default='auto')
+    parser.add_argument('--callback-policy', choices=OVERFLOW_POLICIES, default='coalesce-latest')
+    parser.add_argument('--callback-cost', type=float, default=0.0,
+                        help="seconds each simulated GUI callback takes")
+    parser.add_argument('--json', action='store_true', help="print one JSON report per line")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = {'cycles': bench_cycles, 'loop': bench_loop}
+
+    lab = ImpairmentLab(args.probe_type, servers=args.servers, endpoints=args.endpoints, delay=args.delay,
+                        jitter=args.jitter, loss=args.loss, blackhole=args.blackhole, tls=args.tls,
+                        seed=args.seed)
+    status = 0
+    with lab:
+        for scenario in args.scenario:
+            for engine in args.engine:
+                report = scenarios[scenario](lab, engine, args)
+                print(json.dumps(report) if args.json else format_report(report), flush=True)
+                if not report['cycles']:
+                    print(f"Warning: no {scenario} cycle completed with the {engine} engine; "
+                          f"raise --duration or lower --cycle-budget", file=sys.stderr)
+                    status = 1
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,296 @@
+import concurrent.futures
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+STEP_MARKER = "@@step"
+
+
+class Step:
+    # One action of a plan: a cmd.exe command line or a Python callable.
+    # Steps that share a `batch` key run in plan order inside one script
+    # invocation. `after` names steps that must finish first; a failed
+    # prerequisite with check=True skips its dependents.
+    def __init__(self, name, command=None, action=None, batch=None, after=(), check=True, group=None):
+        if (command is None) == (action is None):
+            raise ValueError(f"Step {name} needs exactly one of command or action")
+        self.name = name
+        self.command = command
+        self.action = action
+        self.batch = batch
+        self.after = tuple(after)
+        self.check = check
+        self.group = group
+
+
+class StepResult:
+    def __init__(self, step, returncode=None, output="", elapsed_ms=0.0, skipped=False):
+        self.step = step
+        self.returncode = returncode
+        self.output = output
+        self.elapsed_ms = elapsed_ms
+        self.skipped = skipped
+
+    @property
+    def ok(self):
+        return not self.skipped and self.returncode == 0
+
+    def describe(self):
+        if self.skipped:
+            return f"  skip  {self.step.name}"
+        status = "ok  " if self.ok else "FAIL"
+        detail = "" if self.ok else f" (exit {self.returncode})"
+        return f"  {status}  {self.step.name:<40} {self.elapsed_ms:7.0f} ms{detail}"
+
+
+class PlanReport:
+    def __init__(self, results, elapsed_ms):
+        self.results = results
+        self.elapsed_ms = elapsed_ms
+
+    def group_ok(self, group):
+        # A group succeeds when every step it has to get right did
+        return all(result.ok for result in self.results if result.step.group == group and result.step.check)
+
+    def groups(self):
+        groups = []
+        for result in self.results:
+            if result.step.group and result.step.group not in groups:
+                groups.append(result.step.group)
+        return groups
+
+    def failures(self, group=None):
+        return [result for result in self.results
+                if not result.ok and result.step.check and group in (None, result.step.group)]
+
+    def describe(self):
+        return "\n".join(result.describe() for result in self.results)
+
+    def to_dicts(self):
+        return [{
+            'step': result.step.name,
+            'group': result.step.group,
+            'ok': result.ok,
+            'skipped': result.skipped,
+            'returncode': result.returncode,
+            'elapsed_ms': round(result.elapsed_ms, 1)
+        } for result in self.results]
+
+
+class CommandRunner:
+    # Runs commands through cmd.exe and callables in-process. A batch becomes
+    # one .cmd script that echoes a marker with each command's exit code, so
+    # every step still gets its own result and timing from a single spawn.
+    def run_command(self, command):
+        start_time = time.perf_counter()
+        completed = subprocess.run(command, shell=True, capture_output=True, text=True)
+        output = (completed.stdout + completed.stderr).strip()
+        return completed.returncode, output, (time.perf_counter() - start_time) * 1000
+
+    def run_script(self, commands, requires):
+        # requires[i] lists earlier indexes that must exit 0 for command i to run
+        lines = ["@echo off"]
+        for index, command in enumerate(commands):
+            for required in requires[index]:
+                lines.append(f'if not "%STEP{required}%"=="0" goto skip{index}')
+            lines.append(command)
+            lines.append(f"set STEP{index}=%ERRORLEVEL%")
+            lines.append(f"echo {STEP_MARKER} {index} %STEP{index}%")
+            lines.append(f"goto done{index}")
+            lines.append(f":skip{index}")
+            lines.append(f"set STEP{index}=skipped")
+            lines.append(f"echo {STEP_MARKER} {index} skipped")
+            lines.append(f":done{index}")
+
+        with tempfile.NamedTemporaryFile('w', suffix='.cmd', delete=False) as script:
+            script.write("\r\n".join(lines) + "\r\n")
+        try:
+            return self._read_markers(['cmd', '/d', '/c', script.name], len(commands))
+        finally:
+            os.remove(script.name)
+
+    def _read_markers(self, argv, count):
+        results = [None] * count
+        output = []
+        start_time = last = time.perf_counter()
+        process = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        for line in process.stdout:
+            position = line.find(STEP_MARKER)
+            if position < 0:
+                output.append(line)
+                continue
+            output.append(line[:position])
+            index, code = line[position + len(STEP_MARKER):].split()
+            now = time.perf_counter()
+            returncode = None if code == "skipped" else int(code)
+            results[int(index)] = (returncode, "".join(output).strip(), (now - last) * 1000)
+            output = []
+            last = now
+        process.wait()
+
+        elapsed = (time.perf_counter() - start_time) * 1000
+        return [result or (-1, "Script ended before this step", elapsed) for result in results]
+
+    def call(self, action):
+        start_time = time.perf_counter()
+        try:
+            returncode = 1 if action() is False else 0
+            output = ""
+        except Exception as e:
+            returncode, output = 1, str(e)
+        return returncode, output, (time.perf_counter() - start_time) * 1000
+
+
+class FakeRunner(CommandRunner):
+    # Records what would run instead of running it. `returncodes` maps a
+    # substring of a command (or of a callable's __name__) to the exit code it
+    # should report; `delay` is the simulated cost of one process spawn.
+    def __init__(self, returncodes=None, delay=0.0, outputs=None):
+        self.returncodes = dict(returncodes or {})
+        self.outputs = dict(outputs or {})
+        self.delay = delay
+        self.invocations = []
+        self._lock = threading.Lock()
+
+    def _lookup(self, table, command, default):
+        for pattern, value in table.items():
+            if pattern in command:
+                return value
+        return default
+
+    def _record(self, kind, payload):
+        with self._lock:
+            self.invocations.append((kind, payload))
+
+    def run_command(self, command):
+        self._record('command', command)
+        time.sleep(self.delay)
+        return (self._lookup(self.returncodes, command, 0), self._lookup(self.outputs, command, ""),
+                self.delay * 1000)
+
+    def run_script(self, commands, requires):
+        self._record('script', list(commands))
+        time.sleep(self.delay)
+        results = []
+        for index, command in enumerate(commands):
+            # The one spawn is charged to the first command, as a real script would
+            elapsed = self.delay * 1000 if index == 0 else 0.0
+            if any(results[required][0] != 0 for required in requires[index]):
+                results.append((None, "", elapsed))
+                continue
+            results.append((self._lookup(self.returncodes, command, 0), self._lookup(self.outputs, command, ""),
+                            elapsed))
+        return results
+
+    def call(self, action):
+        name = getattr(action, '__name__', repr(action))
+        self._record('call', name)
+        return self._lookup(self.returncodes, name, 0), "", 0.0
+
+
+class CommandPlan:
+    # Collects steps, then runs them as jobs: each batch is one job, every
+    # other step is a job of its own, and jobs with no unfinished
+    # prerequisites run concurrently.
+    def __init__(self, runner=None, max_workers=4):
+        self.runner = runner or CommandRunner()
+        self.max_workers = max_workers
+        self.steps = []
+        self._names = {}
+
+    def add(self, name, command=None, action=None, batch=None, after=(), check=True, group=None):
+        if name in self._names:
+            raise ValueError(f"Duplicate step: {name}")
+        for required in after:
+            if required not in self._names:
+                raise ValueError(f"Step {name} runs after unknown step {required}")
+        step = Step(name, command, action, batch, after, check, group)
+        self._names[name] = step
+        self.steps.append(step)
+        return step
+
+    def _jobs(self):
+        jobs = []
+        batches = {}
+        for step in self.steps:
+            if step.batch is None or step.command is None:
+                jobs.append([step])
+            elif step.batch in batches:
+                batches[step.batch].append(step)
+            else:
+                batches[step.batch] = [step]
+                jobs.append(batches[step.batch])
+        return jobs
+
+    def run(self):
+        jobs = self._jobs()
+        job_of = {step.name: index for index, job in enumerate(jobs) for step in job}
+        prerequisites = [
+            {job_of[required] for step in job for required in step.after} - {index}
+            for index, job in enumerate(jobs)
+        ]
+
+        results = {}
+        start_time = time.perf_counter()
+        waiting = set(range(len(jobs)))
+        finished = set()
+        running = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while waiting or running:
+                for index in sorted(waiting):
+                    if prerequisites[index] <= finished:
+                        waiting.discard(index)
+                        future = executor.submit(self._run_job, jobs[index], dict(results))
+                        running[future] = index
+                if not running:
+                    break
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    finished.add(running.pop(future))
+                    results.update(future.result())
+
+        ordered = [results.get(step.name) or StepResult(step, skipped=True) for step in self.steps]
+        return PlanReport(ordered, (time.perf_counter() - start_time) * 1000)
+
+    def _blocked(self, step, results):
+        for required in step.after:
+            result = results.get(required)
+            if result is not None and not result.ok and self._names[required].check:
+                return True
+        return False
+
+    def _run_job(self, job, results):
+        if len(job) == 1:
+            step = job[0]
+            if self._blocked(step, results):
+                return {step.name: StepResult(step, skipped=True)}
+            if step.action is not None:
+                returncode, output, elapsed = self.runner.call(step.action)
+            else:
+                returncode, output, elapsed = self.runner.run_command(step.command)
+            return {step.name: StepResult(step, returncode, output, elapsed)}
+
+        job_results = {}
+        commands = []
+        requires = []
+        included = []
+        for step in job:
+            skipped_prerequisite = any(required in job_results and self._names[required].check
+                                       for required in step.after)
+            if skipped_prerequisite or self._blocked(step, results):
+                job_results[step.name] = StepResult(step, skipped=True)
+                continue
+            # Prerequisites inside the batch are checked by the script itself
+            requires.append([included.index(required) for required in step.after
+                             if required in included and self._names[required].check])
+            commands.append(step.command)
+            included.append(step.name)
+
+        if commands:
+            outcomes = self.runner.run_script(commands, requires)
+            for name, (returncode, output, elapsed) in zip(included, outcomes):
+                step = self._names[name]
+                job_results[name] = StepResult(step, returncode, output, elapsed, skipped=returncode is None)
+        return job_results
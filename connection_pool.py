@@ -0,0 +1,220 @@
+import concurrent.futures
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from probe_result import ErrorCode, ProbeResult
+
+POOL_MODES = ("auto", "warm", "cold")
+
+
+def origin_of(url):
+    parts = urlsplit(url)
+    secure = parts.scheme == "https"
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return (parts.scheme, parts.hostname, parts.port or (443 if secure else 80)), path
+
+
+class _TimedConnection:
+    # Mixed into urllib3's connection classes: records the TCP (+TLS)
+    # handshake time and how many requests the connection has served since
+    # it was opened, which is what tags a sample reused or new
+    endpoint = None
+    served = 0
+    handshake_ms = None
+
+    def connect(self):
+        start_time = time.perf_counter()
+        super().connect()
+        self.handshake_ms = (time.perf_counter() - start_time) * 1000
+        self.served = 0
+        self.endpoint.connected()
+
+
+class _EndpointAdapter(HTTPAdapter):
+    # A requests adapter whose urllib3 pools open timed connections
+    def __init__(self, endpoint, ssl_context, **kwargs):
+        self.endpoint = endpoint
+        self.ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block, ssl_context=self.ssl_context, **pool_kwargs)
+        fields = {'endpoint': self.endpoint}
+        http = type('TimedHTTPConnection', (_TimedConnection, HTTPConnection), fields)
+        https = type('TimedHTTPSConnection', (_TimedConnection, HTTPSConnection), fields)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('TimedHTTPConnectionPool', (HTTPConnectionPool,), {'ConnectionCls': http}),
+            'https': type('TimedHTTPSConnectionPool', (HTTPSConnectionPool,), {'ConnectionCls': https})
+        }
+
+
+class EndpointPool:
+    # Keep-alive connections to one origin: a requests adapter mounted for
+    # that origin alone, whose urllib3 pool keeps at most `size` idle
+    def __init__(self, origin, size, ssl_context):
+        self.origin = origin
+        self.size = size
+        self.opened = 0
+        self._lock = threading.Lock()
+        self.adapter = _EndpointAdapter(self, ssl_context, pool_connections=1, pool_maxsize=size)
+
+    def connected(self):
+        # Prewarm connects from several threads at once
+        with self._lock:
+            self.opened += 1
+
+    def idle_count(self):
+        pools = self.adapter.poolmanager.pools
+        idle = 0
+        for key in pools.keys():
+            queue = getattr(pools.get(key), 'pool', None)
+            if queue is not None:
+                idle += sum(1 for connection in list(queue.queue)
+                            if connection is not None and connection.sock is not None)
+        return idle
+
+    def close(self):
+        self.adapter.close()
+
+
+class ConnectionPools:
+    # Explicit per-origin pools on a requests session. A probe sends a HEAD
+    # and, when that succeeds, times a GET up to the first body chunk; the
+    # mode decides what that timed GET measures:
+    #   auto  reuse an idle connection when there is one, else open a new one
+    #   warm  always measure on a connection that has already served a request
+    #   cold  always open (and then close) a new connection
+    # Every result is tagged with `reused`. A new connection's latency includes
+    # its handshake, which is also reported on its own as handshake_ms.
+    def __init__(self, size=2, mode="auto", timeout=3, headers=None, ssl_context=None):
+        if mode not in POOL_MODES:
+            raise ValueError(f"Unknown connection mode: {mode}")
+        self.size = size
+        self.mode = mode
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self.ssl_context = ssl_context
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        if mode == "cold":
+            self.session.headers['Connection'] = 'close'
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, url):
+        origin, _ = origin_of(url)
+        parts = urlsplit(url)
+        prefix = f"{parts.scheme}://{parts.netloc}/"
+        with self._lock:
+            pool = self._pools.get(origin)
+            if pool is None:
+                pool = self._pools[origin] = EndpointPool(origin, self.size, self.ssl_context)
+            if self.session.adapters.get(prefix) is not pool.adapter:
+                self.session.mount(prefix, pool.adapter)
+            return pool
+
+    def prewarm(self, urls):
+        # Fills every origin's pool in parallel so the first cycle is already
+        # warm; each connection attempt is bounded by the probe timeout
+        if self.mode == "cold":
+            return 0
+        jobs = []
+        warming = set()
+        for url in urls:
+            pool = self._pool(url)
+            if pool.origin not in warming:
+                warming.add(pool.origin)
+                jobs.extend(url for _ in range(self.size - pool.idle_count()))
+        if not jobs:
+            return 0
+
+        warmed = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(jobs), 16)) as executor:
+            for future in concurrent.futures.as_completed([executor.submit(self._warm_one, url) for url in jobs]):
+                warmed += future.result()
+        return warmed
+
+    def _warm_one(self, url):
+        try:
+            self._request("HEAD", url)
+        except requests.RequestException:
+            return 0
+        return 1
+
+    def _request(self, method, url):
+        # Returns (response, latency_ms, reused, handshake_ms). The body past
+        # the first chunk is read after the timer stops, so the connection
+        # can go back to its pool.
+        start_time = time.perf_counter()
+        response = self.session.request(method, url, timeout=self.timeout, stream=True,
+                                        allow_redirects=method == "GET")
+        # Taken before the body is read: a fully read response hands its
+        # connection back to the pool
+        connection = response.raw.connection
+        try:
+            if method == "GET":
+                next(response.iter_content(chunk_size=1024), None)
+            latency = (time.perf_counter() - start_time) * 1000
+
+            reused = bool(connection is not None and connection.served)
+            handshake_ms = connection.handshake_ms if connection is not None and not reused else None
+            if connection is not None:
+                connection.served += 1
+
+            response.raw.drain_conn()
+            if self.mode == "cold" and connection is not None:
+                # Closed here rather than left to the server, whose FIN can
+                # arrive after the pool has handed the socket out again
+                connection.close()
+        finally:
+            response.raw.release_conn()
+        return response, latency, reused, handshake_ms
+
+    def probe(self, url):
+        self._pool(url)
+        try:
+            response, latency, reused, handshake_ms = self._request("HEAD", url)
+            if response.ok:
+                try:
+                    response, latency, reused, handshake_ms = self._request("GET", url)
+                    if self.mode == "warm" and not reused:
+                        # Another probe took the connection the HEAD warmed
+                        response, latency, reused, handshake_ms = self._request("GET", url)
+                except requests.RequestException:
+                    pass
+
+            result = ProbeResult(url, round(latency, 1), response.status_code)
+            result.reused = reused
+            result.handshake_ms = round(handshake_ms, 1) if handshake_ms is not None else None
+            return result
+
+        except requests.exceptions.Timeout:
+            return ProbeResult.failure(url, ErrorCode.REQUEST_TIMEOUT)
+        except requests.exceptions.ConnectionError:
+            return ProbeResult.failure(url, ErrorCode.CONNECTION_FAILED)
+        except Exception as e:
+            return ProbeResult.failure(url, ErrorCode.UNEXPECTED, str(e))
+
+    def stats(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        stats = {}
+        for pool in pools:
+            scheme, host, port = pool.origin
+            stats[f"{scheme}://{host}:{port}"] = {'idle': pool.idle_count(), 'opened': pool.opened}
+        return stats
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+        self.session.close()
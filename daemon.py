@@ -0,0 +1,259 @@
+import time
+
+_START_TIME = time.perf_counter()
+
+import argparse
+import json
+import math
+import signal
+import sys
+import threading
+from datetime import datetime
+
+from ping_monitor import CONNECTION_MODES, PROBE_ENGINES, PROBE_TYPES, PingMonitor
+
+
+def _clean(value):
+    if hasattr(value, 'to_dicts'):
+        return _clean(value.to_dicts())
+    if isinstance(value, dict):
+        return {key: _clean(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clean(item) for item in value]
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class JsonLinesEmitter:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        record = {'event': event, 'time': datetime.now().isoformat()}
+        record.update(fields)
+        line = json.dumps(_clean(record), separators=(',', ':'))
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def _enable_qos(emitter):
+    # Elevation is only requested here, so plain monitoring never needs admin
+    import pyuac
+
+    if not pyuac.isUserAdmin():
+        emitter.emit('elevating', reason='QoS policy changes require administrator privileges')
+        pyuac.runAsAdmin()
+        return None
+
+    from qos_policy import QosPolicy
+    qos = QosPolicy()
+    success = qos.enable_qos()
+    report = qos.last_report
+    emitter.emit('qos', success=success, elapsed_ms=round(report.elapsed_ms, 1) if report else None,
+                 steps=report.to_dicts() if report else [], diff=qos.last_diff)
+    return success
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless League of Legends ping monitor")
+    parser.add_argument('--region', default='NA')
+    parser.add_argument('--interval', type=float, default=5)
+    parser.add_argument('--all-regions', action='store_true', help="probe every region under one scheduler")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="probe faster when the link degrades and back off when it is stable")
+    parser.add_argument('--floor-interval', type=float, default=30.0, help="slowest adaptive interval in seconds")
+    parser.add_argument('--probe-budget', type=float, default=10.0, help="adaptive probes-per-second limit")
+    parser.add_argument('--engine', choices=PROBE_ENGINES, default='thread')
+    parser.add_argument('--probe-type', choices=PROBE_TYPES, default='http')
+    parser.add_argument('--udp-port', type=int, default=5000,
+                        help="echo port for udp probes and packet trains whose target has no port")
+    parser.add_argument('--connection-mode', choices=CONNECTION_MODES, default='auto',
+                        help="reuse keep-alive connections when idle (auto), always (warm) or never (cold)")
+    parser.add_argument('--pool-size', type=int, default=2, help="keep-alive connections kept per origin")
+    parser.add_argument('--no-prewarm', action='store_true', help="skip opening pooled connections at start")
+    parser.add_argument('--storage-dir', default=None)
+    parser.add_argument('--packet-train', default=None, metavar='TARGET',
+                        help="UDP reflector for packet-train loss and jitter, e.g. udp://host:5000")
+    parser.add_argument('--train-rate', type=float, default=64, help="packet-train datagrams per second")
+    parser.add_argument('--format', choices=('json', 'text'), default='json')
+    parser.add_argument('--once', action='store_true', help="run a single probe cycle and exit")
+    parser.add_argument('--fleet', default=None, metavar='FILE',
+                        help="monitor the targets listed in FILE across a pool of worker processes")
+    parser.add_argument('--workers', type=int, default=None, help="fleet worker processes (default: CPU count)")
+    parser.add_argument('--qos', action='store_true', help="apply QoS optimizations before monitoring")
+    parser.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                        help="serve live stats in OpenMetrics format on http://HOST:PORT/metrics")
+    parser.add_argument('--metrics-host', default='127.0.0.1')
+    parser.add_argument('--instrument', action='store_true',
+                        help="time the monitor's own scheduling, cycles, stats updates and callbacks")
+    parser.add_argument('--instrument-dump', type=float, default=None, metavar='SECONDS',
+                        help="report the self-timing every SECONDS (implies --instrument)")
+    args = parser.parse_args(argv)
+    # Fleet workers run no PingMonitor, so there is nothing to export or time
+    if args.fleet:
+        for flag, value in (('--metrics-port', args.metrics_port), ('--instrument', args.instrument),
+                            ('--instrument-dump', args.instrument_dump)):
+            if value:
+                parser.error(f"{flag} is not supported with --fleet")
+    return args
+
+
+def _install_stop_handlers():
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    if hasattr(signal, 'SIGBREAK'):
+        signal.signal(signal.SIGBREAK, request_stop)
+    return stop_event
+
+
+def run_fleet(args, emitter, stop_event):
+    from fleet import FleetMonitor, load_targets
+
+    targets = load_targets(args.fleet)
+    if not targets:
+        print(f"No targets in {args.fleet}", file=sys.stderr)
+        return 2
+
+    # Per-batch events stay small; per-target stats are only emitted at exit
+    if args.format == 'json':
+        fleet = FleetMonitor(targets, workers=args.workers, interval=args.interval, probe_type=args.probe_type,
+                             udp_port=args.udp_port,
+                             callback=lambda batch: emitter.emit('fleet_batch', **batch),
+                             log_callback=lambda message: emitter.emit('log', message=message))
+    else:
+        fleet = FleetMonitor(targets, workers=args.workers, interval=args.interval, probe_type=args.probe_type,
+                             udp_port=args.udp_port)
+
+    fleet.start()
+    if args.format == 'json':
+        emitter.emit('started', targets=len(targets), workers=fleet.workers, interval=args.interval,
+                     startup_ms=round((time.perf_counter() - _START_TIME) * 1000, 1))
+
+    while not stop_event.wait(1.0):
+        if args.once and fleet.batches >= fleet.active_workers:
+            break
+
+    fleet.stop()
+    if args.format == 'json':
+        emitter.emit('stopped', summary=fleet.get_summary(), targets=fleet.get_target_stats())
+    else:
+        print(json.dumps(_clean(fleet.get_summary()), indent=2))
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    emitter = JsonLinesEmitter()
+
+    if args.qos and _enable_qos(emitter) is None:
+        return 0
+
+    if args.fleet:
+        return run_fleet(args, emitter, _install_stop_handlers())
+
+    instruments = None
+    if args.instrument or args.instrument_dump:
+        from instrumentation import Instrumentation
+        instruments = Instrumentation()
+
+    if args.format == 'json':
+        monitor = PingMonitor(
+            callback=lambda results, stats: emitter.emit(
+                'cycle', region=stats['region'], results=results, stats=stats
+            ),
+            engine=args.engine,
+            probe_type=args.probe_type,
+            udp_port=args.udp_port,
+            storage_dir=args.storage_dir,
+            log_callback=lambda message: emitter.emit('log', message=message),
+            multi_region=args.all_regions,
+            packet_train=args.packet_train,
+            train_rate=args.train_rate,
+            adaptive=args.adaptive,
+            floor_interval=args.floor_interval,
+            probe_budget=args.probe_budget,
+            pool_size=args.pool_size,
+            connection_mode=args.connection_mode,
+            prewarm=not args.no_prewarm,
+            instruments=instruments
+        )
+    else:
+        monitor = PingMonitor(engine=args.engine, probe_type=args.probe_type, udp_port=args.udp_port,
+                              storage_dir=args.storage_dir,
+                              multi_region=args.all_regions, packet_train=args.packet_train,
+                              train_rate=args.train_rate, adaptive=args.adaptive,
+                              floor_interval=args.floor_interval, probe_budget=args.probe_budget,
+                              pool_size=args.pool_size, connection_mode=args.connection_mode,
+                              prewarm=not args.no_prewarm, instruments=instruments)
+
+    if args.format == 'json':
+        monitor.subscribe_alerts(lambda event: emitter.emit('alert', **event))
+    else:
+        monitor.subscribe_alerts(lambda event: monitor.log_message(f"ALERT: {event['message']}"))
+
+    if not monitor.set_region(args.region):
+        print(f"Unknown region: {args.region}", file=sys.stderr)
+        return 2
+
+    if args.once:
+        monitor.open_storage()
+        try:
+            if args.packet_train:
+                monitor._run_packet_train()
+            results = monitor.run_single_test()
+            monitor.flush()
+            if args.format == 'text':
+                monitor._print_results(results)
+        finally:
+            monitor.close()
+        return 0
+
+    exporter = None
+    if args.metrics_port is not None:
+        from metrics_server import MetricsExporter
+        exporter = MetricsExporter(monitor, args.metrics_host, args.metrics_port).start()
+        monitor.log_message(f"Serving metrics on {exporter.url}")
+
+    stop_event = _install_stop_handlers()
+    monitor.start_monitor(args.interval)
+    if args.format == 'json':
+        emitter.emit('started', region=monitor.current_region, interval=args.interval,
+                     startup_ms=round((time.perf_counter() - _START_TIME) * 1000, 1))
+
+    if args.instrument_dump:
+        if args.format == 'json':
+            instruments.start_dump(args.instrument_dump, lambda snapshot: emitter.emit('instrumentation', **snapshot))
+        else:
+            from instrumentation import format_summary
+            instruments.start_dump(args.instrument_dump,
+                                   lambda snapshot: monitor.log_message(format_summary(snapshot)))
+
+    # Event.wait with a timeout keeps the main thread responsive to signals on Windows
+    while not stop_event.wait(1.0):
+        pass
+
+    monitor.stop_monitor()
+    monitor.flush()
+    if exporter:
+        exporter.stop()
+    if instruments:
+        instruments.stop_dump()
+    if args.format == 'json':
+        emitter.emit('stopped', stats=monitor.get_current_stats(), bus=monitor.get_bus_metrics(),
+                     instrumentation=monitor.get_instrumentation())
+    monitor.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
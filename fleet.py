@@ -0,0 +1,295 @@
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from array import array
+from datetime import datetime
+
+from probe_result import ErrorCode
+from quantile_sketch import QuantileSketch
+from streaming_stats import Ewma, RollingWindow
+
+# A worker that stayed up this long before exiting starts its backoff over
+RESTART_RESET_SECONDS = 300.0
+
+
+def load_targets(path):
+    # Accepts a JSON list of URLs, a JSON {group: [urls]} mapping, or a plain
+    # text file with one URL per line ("group url" also works; # comments)
+    with open(path) as f:
+        text = f.read()
+
+    if path.endswith('.json'):
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return [(group, url) for group, urls in data.items() for url in urls]
+        return [("default", url) for url in data]
+
+    targets = []
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        parts = line.split()
+        targets.append((parts[0], parts[1]) if len(parts) > 1 else ("default", parts[0]))
+    return targets
+
+
+def shard_targets(targets, workers):
+    # Stable hashing keeps a target on the same worker across restarts
+    shards = [[] for _ in range(workers)]
+    for index, (_, url) in enumerate(targets):
+        shards[zlib.crc32(url.encode()) % workers].append((index, url))
+    return shards
+
+
+def _fleet_worker(shard_id, shard, options, results, stop_event):
+    # Each worker owns its scheduler and event loop, so a shard full of hung
+    # sockets only ever delays its own batches
+    from async_probe import AsyncProbeEngine
+    from probe_result import CycleBatch
+    from scheduler import ProbeScheduler
+
+    indexes = [index for index, _ in shard]
+    urls = [url for _, url in shard]
+    interval = options['interval']
+    spacing = min(options['probe_spacing'], interval * 0.25 / max(len(urls) - 1, 1))
+    offsets = [position * spacing for position in range(len(urls))]
+
+    engine = AsyncProbeEngine(max_in_flight=options['max_in_flight'], probe_type=options['probe_type'],
+                              udp_port=options['udp_port'])
+    scheduler = ProbeScheduler(interval)
+    scheduler.set_keys([shard_id])
+    threading.Thread(target=lambda: (stop_event.wait(), scheduler.stop()), daemon=True).start()
+
+    try:
+        while scheduler.wait():
+            started = time.time()
+            cycle = engine.run_cycle(urls, offsets, options['cycle_budget'])
+
+            # Only the typed columns cross the process boundary: target index,
+            # latency (NaN on failure) and error code, a few bytes per probe
+            positions = {}
+            for position, url in enumerate(urls):
+                positions.setdefault(url, []).append(indexes[position])
+            batch = CycleBatch(cycle)
+            targets = array('I', (positions[url].pop() for url in batch.urls))
+
+            results.put((shard_id, started, round((time.time() - started) * 1000, 1),
+                         (targets, batch.latency, batch.error)))
+    finally:
+        engine.close()
+
+
+class TargetStats:
+    def __init__(self, group, url):
+        self.group = group
+        self.url = url
+        self.total = 0
+        self.failed = 0
+        self.last_latency = None
+        self.last_error = None
+        self.recent = RollingWindow(20)
+        self.ewma = Ewma()
+        self.sketch = QuantileSketch()
+
+    def add(self, latency, error):
+        self.total += 1
+        if latency != latency:
+            self.failed += 1
+            self.last_error = error
+            return
+        self.last_latency = latency
+        self.recent.add(latency)
+        self.ewma.add(latency)
+        self.sketch.add(latency)
+
+    def snapshot(self):
+        stats = {
+            'group': self.group,
+            'url': self.url,
+            'total_tests': self.total,
+            'failed_tests': self.failed,
+            'packet_loss_rate': round(self.failed / self.total * 100, 1) if self.total else 0,
+            'last_latency': self.last_latency,
+            'last_error': ErrorCode(self.last_error).name if self.last_error is not None else None
+        }
+        if self.recent:
+            stats['recent_average'] = round(self.recent.mean, 1)
+            stats['jitter'] = round(self.recent.stdev, 1)
+            stats['ewma_ping'] = round(self.ewma.value, 1)
+            stats.update(self.sketch.percentiles())
+        return stats
+
+
+class FleetMonitor:
+    def __init__(self, targets, workers=None, interval=5, probe_type="http", udp_port=5000, max_in_flight=256,
+                 cycle_budget=None, probe_spacing=0.025, callback=None, log_callback=None,
+                 max_restarts=5, restart_backoff=1.0, max_restart_backoff=60.0, clock=time.monotonic):
+        self.targets = targets
+        self.workers = max(1, min(workers or os.cpu_count() or 1, len(targets) or 1))
+        self.options = {
+            'interval': interval,
+            'probe_type': probe_type,
+            'udp_port': udp_port,
+            'max_in_flight': max_in_flight,
+            'cycle_budget': cycle_budget or interval * 0.8,
+            'probe_spacing': probe_spacing
+        }
+        self.callback = callback
+        self.log_callback = log_callback
+        self.max_restarts = max_restarts
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max_restart_backoff
+        self.clock = clock
+
+        self.target_stats = [TargetStats(group, url) for group, url in targets]
+        self.group_sketches = {}
+        self.batches = 0
+        self.probes = 0
+
+        # spawn behaves the same on Windows and POSIX and never forks the
+        # parent's threads or sockets into the workers
+        self._context = multiprocessing.get_context('spawn')
+        self._results = self._context.Queue()
+        self._stop_event = self._context.Event()
+        self._shards = shard_targets(targets, self.workers)
+        self._processes = {}
+        self._spawned_at = {}
+        self._restarts = {}
+        self._restart_due = {}
+        self.failed_shards = {}
+        self._reader = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    def _spawn(self, shard_id):
+        process = self._context.Process(
+            target=_fleet_worker,
+            args=(shard_id, self._shards[shard_id], self.options, self._results, self._stop_event),
+            name=f"fleet-{shard_id}",
+            daemon=True
+        )
+        process.start()
+        self._processes[shard_id] = process
+        self._spawned_at[shard_id] = self.clock()
+
+    @property
+    def active_workers(self):
+        # Workers that are running or waiting to be restarted
+        return len(self._processes) - len(self.failed_shards)
+
+    def start(self):
+        self._running = True
+        self.start_time = time.time()
+        for shard_id, shard in enumerate(self._shards):
+            if shard:
+                self._spawn(shard_id)
+
+        self._reader = threading.Thread(target=self._read_results, daemon=True)
+        self._reader.start()
+        self.log_message(f"Fleet monitoring {len(self.targets)} targets across {len(self._processes)} workers")
+
+    def stop(self):
+        self._running = False
+        self._stop_event.set()
+        for process in self._processes.values():
+            process.join(timeout=self.options['cycle_budget'] + 1)
+            if process.is_alive():
+                process.terminate()
+        if self._reader:
+            self._reader.join(timeout=1)
+        self.log_message("Fleet monitoring stopped")
+
+    def _read_results(self):
+        checked = self.clock()
+        while self._running:
+            if self.clock() - checked > 1.0:
+                self._check_workers()
+                checked = self.clock()
+            try:
+                shard_id, started, cycle_ms, batch = self._results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            self._merge(batch)
+            if self.callback:
+                failed = sum(1 for latency in batch[1] if latency != latency)
+                self.callback({
+                    'shard': shard_id,
+                    'started': started,
+                    'cycle_ms': cycle_ms,
+                    'targets': len(batch[0]),
+                    'failed': failed
+                })
+
+    def _check_workers(self):
+        # A crashed worker is restarted with the same shard, after a backoff
+        # that doubles with each quick restart. After max_restarts the shard
+        # is given up on and reported in failed_shards.
+        now = self.clock()
+        for shard_id, process in list(self._processes.items()):
+            if not self._running or process.is_alive() or shard_id in self.failed_shards:
+                continue
+
+            due = self._restart_due.get(shard_id)
+            if due is not None:
+                if now >= due:
+                    del self._restart_due[shard_id]
+                    self._spawn(shard_id)
+                continue
+
+            restarts = self._restarts.get(shard_id, 0)
+            if now - self._spawned_at[shard_id] > RESTART_RESET_SECONDS:
+                restarts = 0
+            if restarts >= self.max_restarts:
+                self.failed_shards[shard_id] = process.exitcode
+                self.log_message(f"Fleet worker {shard_id} exited ({process.exitcode}) after {restarts} restart(s); "
+                                 f"its {len(self._shards[shard_id])} target(s) are no longer probed")
+                continue
+
+            delay = min(self.restart_backoff * 2 ** restarts, self.max_restart_backoff)
+            self._restarts[shard_id] = restarts + 1
+            self._restart_due[shard_id] = now + delay
+            self.log_message(f"Fleet worker {shard_id} exited ({process.exitcode}), restarting in {delay:.0f}s")
+
+    def _merge(self, batch):
+        with self._lock:
+            targets, latencies, errors = batch
+            self.batches += 1
+            self.probes += len(targets)
+            for index, latency, error in zip(targets, latencies, errors):
+                target = self.target_stats[index]
+                target.add(latency, error)
+                if latency == latency:
+                    self.group_sketches.setdefault(target.group, QuantileSketch()).add(latency)
+
+    def get_target_stats(self):
+        with self._lock:
+            return [target.snapshot() for target in self.target_stats]
+
+    def get_summary(self):
+        with self._lock:
+            elapsed = time.time() - self.start_time if hasattr(self, 'start_time') else 0
+            failed = sum(target.failed for target in self.target_stats)
+            return {
+                'targets': len(self.targets),
+                'workers': len(self._processes),
+                'failed_shards': sorted(self.failed_shards),
+                'batches': self.batches,
+                'probes': self.probes,
+                'probes_per_second': round(self.probes / elapsed, 1) if elapsed else 0,
+                'packet_loss_rate': round(failed / self.probes * 100, 1) if self.probes else 0,
+                'groups': {group: sketch.percentiles() for group, sketch in self.group_sketches.items()}
+            }
+
+    def log_message(self, message):
+        if self.log_callback:
+            self.log_callback(message)
+            return
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
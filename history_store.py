@@ -0,0 +1,136 @@
+import math
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class _Ring:
+    # Parallel typed columns preallocated to full capacity; they never resize,
+    # so memoryviews handed out by slices stay valid while new samples arrive
+    def __init__(self, capacity, columns):
+        self.capacity = capacity
+        self.columns = {
+            name: array(typecode, bytes(array(typecode).itemsize * capacity))
+            for name, typecode in columns
+        }
+        self.count = 0
+        self._next = 0
+
+    def append(self, **values):
+        for name, value in values.items():
+            self.columns[name][self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _physical(self, index):
+        return (self._next - self.count + index) % self.capacity
+
+    def segments(self, start, stop):
+        # Logical [start, stop) as at most two contiguous physical ranges
+        if start >= stop:
+            return []
+        first = self._physical(start)
+        length = stop - start
+        if first + length <= self.capacity:
+            return [(first, first + length)]
+        return [(first, self.capacity), (0, first + length - self.capacity)]
+
+
+class _LogicalColumn:
+    def __init__(self, ring, name):
+        self._ring = ring
+        self._column = ring.columns[name]
+
+    def __len__(self):
+        return self._ring.count
+
+    def __getitem__(self, index):
+        return self._column[self._ring._physical(index)]
+
+
+class HistoryView:
+    def __init__(self, ring, start, stop):
+        self.segments = [
+            {name: memoryview(column)[first:last] for name, column in ring.columns.items()}
+            for first, last in ring.segments(start, stop)
+        ]
+
+    def __len__(self):
+        return sum(len(segment['latency']) for segment in self.segments)
+
+    def column(self, name):
+        for segment in self.segments:
+            yield from segment[name]
+
+    def latencies(self, successful_only=True):
+        for segment in self.segments:
+            for latency in segment['latency']:
+                # Failures carry NaN latencies
+                if not successful_only or latency == latency:
+                    yield latency
+
+    def to_lists(self):
+        names = self.segments[0].keys() if self.segments else ()
+        return {name: [value for segment in self.segments for value in segment[name].tolist()] for name in names}
+
+
+class PingHistoryStore:
+    def __init__(self, capacity=131072, endpoint_capacity=32768):
+        self.endpoint_capacity = endpoint_capacity
+        self._ring = _Ring(capacity, (
+            ('timestamp_ns', 'q'), ('endpoint', 'I'), ('latency', 'd'), ('status', 'h')
+        ))
+        self._endpoint_ids = {}
+        self.endpoints = []
+        self._series = {}
+
+    def endpoint_id(self, url):
+        endpoint_id = self._endpoint_ids.get(url)
+        if endpoint_id is None:
+            endpoint_id = len(self.endpoints)
+            self._endpoint_ids[url] = endpoint_id
+            self.endpoints.append(url)
+            self._series[endpoint_id] = _Ring(self.endpoint_capacity, (
+                ('timestamp_ns', 'q'), ('latency', 'd'), ('status', 'h')
+            ))
+        return endpoint_id
+
+    def append(self, url, latency, status, timestamp_ns=None):
+        # Timestamps are perf_counter_ns values, like ProbeResult.timestamp_ns
+        if timestamp_ns is None:
+            timestamp_ns = time.perf_counter_ns()
+        if latency is None:
+            latency = math.nan
+        endpoint_id = self.endpoint_id(url)
+
+        self._ring.append(timestamp_ns=timestamp_ns, endpoint=endpoint_id, latency=latency, status=status)
+        self._series[endpoint_id].append(timestamp_ns=timestamp_ns, latency=latency, status=status)
+
+    def add_batch(self, batch):
+        # Reads the batch's columns directly, so each sample keeps the time it
+        # was taken and its HTTP status (-1 when there was none). Probes finish
+        # out of order; time order keeps view() able to bisect.
+        for index in sorted(range(len(batch)), key=batch.timestamp_ns.__getitem__):
+            self.append(batch.urls[index], batch.latency[index], batch.status[index], batch.timestamp_ns[index])
+
+    def view(self, start=None, end=None, endpoint=None):
+        if endpoint is None:
+            ring = self._ring
+        elif endpoint in self._endpoint_ids:
+            ring = self._series[self._endpoint_ids[endpoint]]
+        else:
+            return HistoryView(self._ring, 0, 0)
+
+        timestamps = _LogicalColumn(ring, 'timestamp_ns')
+        first = 0 if start is None else bisect_left(timestamps, start)
+        last = ring.count if end is None else bisect_right(timestamps, end)
+        return HistoryView(ring, first, last)
+
+    def latest(self, limit, endpoint=None):
+        ring = self._ring if endpoint is None else self._series.get(self._endpoint_ids.get(endpoint))
+        if ring is None:
+            return HistoryView(self._ring, 0, 0)
+        return HistoryView(ring, max(ring.count - limit, 0), ring.count)
+
+    def __len__(self):
+        return self._ring.count
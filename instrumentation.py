@@ -0,0 +1,116 @@
+import threading
+import time
+
+from quantile_sketch import QuantileSketch
+
+# Metrics shown by format_summary, in display order
+SUMMARY_METRICS = (
+    ("schedule_lag_ms", "lag"),
+    ("cycle_ms", "cycle"),
+    ("update_stats_ms", "stats"),
+    ("callback_ms", "callback"),
+    ("tk_tick_lag_ms", "tk tick")
+)
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sketch = QuantileSketch()
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.sketch.add(value)
+
+    def snapshot(self):
+        snapshot = {
+            'count': self.count,
+            'mean': round(self.total / self.count, 3) if self.count else 0.0,
+            'max': round(self.max, 3)
+        }
+        snapshot.update(self.sketch.percentiles())
+        return snapshot
+
+
+class Instrumentation:
+    # Timings of the monitor's own hot paths, kept apart from the network
+    # numbers so a jump in reported ping can be pinned on the network or on
+    # the tool. Owners hold None when it is off, so the disabled cost is one
+    # attribute test per call site.
+    def __init__(self):
+        self.started = time.monotonic()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._dump_thread = None
+        self._dump_stopped = threading.Event()
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.add(value)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        # Gauges keep their latest value and the highest value seen
+        with self._lock:
+            previous = self._gauges.get(name)
+            peak = max(previous[1], value) if previous else value
+            self._gauges[name] = (value, peak)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'uptime': round(time.monotonic() - self.started, 1),
+                'histograms': {name: histogram.snapshot() for name, histogram in self._histograms.items()},
+                'counters': dict(self._counters),
+                'gauges': {name: {'value': value, 'max': peak} for name, (value, peak) in self._gauges.items()}
+            }
+
+    def start_dump(self, interval, sink):
+        # Hands a snapshot to sink(snapshot) every interval seconds
+        if self._dump_thread and self._dump_thread.is_alive():
+            return False
+        self._dump_stopped.clear()
+
+        def dump():
+            while not self._dump_stopped.wait(interval):
+                try:
+                    sink(self.snapshot())
+                except Exception:
+                    pass
+
+        self._dump_thread = threading.Thread(target=dump, name="instrumentation-dump", daemon=True)
+        self._dump_thread.start()
+        return True
+
+    def stop_dump(self):
+        self._dump_stopped.set()
+        if self._dump_thread:
+            self._dump_thread.join(timeout=1)
+            self._dump_thread = None
+
+
+def format_summary(snapshot):
+    parts = []
+    histograms = snapshot['histograms']
+    for name, label in SUMMARY_METRICS:
+        if name in histograms:
+            histogram = histograms[name]
+            parts.append(f"{label} p50 {histogram['p50']:.1f} / p95 {histogram['p95']:.1f} ms")
+    for name, gauge in snapshot['gauges'].items():
+        parts.append(f"{name.replace('_', ' ')} {gauge['value']} (max {gauge['max']})")
+    for name, count in snapshot['counters'].items():
+        parts.append(f"{name.replace('_', ' ')} {count}")
+    return "Self-timing: " + ", ".join(parts) if parts else "Self-timing: no samples yet"
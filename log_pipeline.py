@@ -0,0 +1,49 @@
+import queue
+import time
+from datetime import datetime
+
+
+class LogPipeline:
+    # Turns everything queued since the last GUI tick into one block of text.
+    # A message repeated within dedup_window is held back and later reported
+    # once with its repeat count.
+    def __init__(self, max_lines=1000, dedup_window=10.0, clock=time.monotonic):
+        self.max_lines = max_lines
+        self.dedup_window = dedup_window
+        self.clock = clock
+        self._recent = {}
+
+    def drain(self, log_queue):
+        now = self.clock()
+        lines = self._expired_summaries(now)
+
+        try:
+            while True:
+                timestamp, level, message = log_queue.get_nowait()
+                key = (level, message)
+                entry = self._recent.get(key)
+                if entry is not None and now - entry[0] < self.dedup_window:
+                    entry[1] += 1
+                    continue
+                if entry is not None and entry[1]:
+                    lines.append(self._summary(level, message, entry[1]))
+                self._recent[key] = [now, 0]
+                lines.append(f"[{timestamp}] {level}: {message}")
+        except queue.Empty:
+            pass
+
+        # Only the tail can survive trimming, so never hand more than that to Tk
+        return lines[-self.max_lines:]
+
+    def _expired_summaries(self, now):
+        lines = []
+        for key, (first_seen, repeats) in list(self._recent.items()):
+            if now - first_seen >= self.dedup_window:
+                if repeats:
+                    lines.append(self._summary(key[0], key[1], repeats))
+                del self._recent[key]
+        return lines
+
+    def _summary(self, level, message, repeats):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        return f"[{timestamp}] {level}: {message} (repeated {repeats} more times)"
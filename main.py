@@ -1,12 +1,19 @@
+import argparse
+import os
 import threading
+import time
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 from datetime import datetime
 import queue
-import pyuac
+from log_pipeline import LogPipeline
+from status_view import StatusViewModel
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ping_data")
 
 class NetworkOptimizerGUI:
-    def __init__(self):
+    def __init__(self, max_log_lines=1000, refresh_rate=10, instrument=False, instrument_dump=None,
+                 metrics_port=None):
         self.root = tk.Tk()
         self.root.title("League of Legends Network Optimizer")
         self.root.geometry("800x600")
@@ -16,6 +23,7 @@ class NetworkOptimizerGUI:
         style.theme_use('clam')
         
         self.log_queue = queue.Queue()
+        self.log_pipeline = LogPipeline(max_lines=max_log_lines)
         self.ping_queue = queue.Queue()
         
         self.qos_enabled = tk.BooleanVar()
@@ -24,10 +32,33 @@ class NetworkOptimizerGUI:
         self.packet_loss = tk.StringVar(value="0%")
         
         self.qos_thread = None
+        self.relaunch_as_admin = False
         self.ping_thread = None
         self.ping_monitor = None
+        self.metrics_port = metrics_port
+        self.metrics_exporter = None
+        
+        # Self-timing shared with the ping monitor; None keeps it switched off
+        self.instruments = None
+        self._last_tick = None
+        if instrument or instrument_dump:
+            from instrumentation import Instrumentation
+            self.instruments = Instrumentation()
+            if instrument_dump:
+                self.instruments.start_dump(instrument_dump, self.log_instrumentation)
         
         self.setup_gui()
+        self.status_view = StatusViewModel(
+            self.root,
+            ping_var=self.current_ping,
+            ping_label=self.ping_label,
+            loss_var=self.packet_loss,
+            avg_var=self.avg_ping,
+            jitter_var=self.jitter,
+            rtt_var=self.network_rtt,
+            server_var=self.server_time,
+            refresh_rate=refresh_rate
+        )
         self.start_log_processor()
         
     def setup_gui(self):
@@ -49,9 +80,9 @@ class NetworkOptimizerGUI:
         status_frame.columnconfigure(3, weight=1)
         
         ttk.Label(status_frame, text="Current Ping:").grid(row=0, column=0, sticky=tk.W)
-        ping_label = ttk.Label(status_frame, textvariable=self.current_ping, 
-                              font=('Arial', 12, 'bold'), foreground='green')
-        ping_label.grid(row=0, column=1, sticky=tk.W, padx=(10, 20))
+        self.ping_label = ttk.Label(status_frame, textvariable=self.current_ping, 
+                                   font=('Arial', 12, 'bold'), foreground='green')
+        self.ping_label.grid(row=0, column=1, sticky=tk.W, padx=(10, 20))
         
         ttk.Label(status_frame, text="Packet Loss:").grid(row=0, column=2, sticky=tk.W)
         loss_label = ttk.Label(status_frame, textvariable=self.packet_loss, 
@@ -71,6 +102,14 @@ class NetworkOptimizerGUI:
         self.jitter = tk.StringVar(value="-- ms")
         ttk.Label(stats_frame, textvariable=self.jitter, font=('Arial', 10)).grid(row=0, column=3, sticky=tk.W, padx=(10, 0))
         
+        ttk.Label(stats_frame, text="Network RTT:").grid(row=1, column=0, sticky=tk.W)
+        self.network_rtt = tk.StringVar(value="-- ms")
+        ttk.Label(stats_frame, textvariable=self.network_rtt, font=('Arial', 10)).grid(row=1, column=1, sticky=tk.W, padx=(10, 20))
+        
+        ttk.Label(stats_frame, text="Server Time:").grid(row=1, column=2, sticky=tk.W)
+        self.server_time = tk.StringVar(value="-- ms")
+        ttk.Label(stats_frame, textvariable=self.server_time, font=('Arial', 10)).grid(row=1, column=3, sticky=tk.W, padx=(10, 0))
+        
         qos_status_label = ttk.Label(status_frame, text="QoS Status:")
         qos_status_label.grid(row=1, column=0, sticky=tk.W, pady=(10, 0))
         
@@ -99,7 +138,9 @@ class NetworkOptimizerGUI:
         ttk.Label(advanced_frame, text="Ping Interval:").grid(row=0, column=0, sticky=tk.W)
         self.ping_interval = tk.StringVar(value="5")
         interval_spinbox = ttk.Spinbox(advanced_frame, from_=1, to=30, width=10, 
-                                     textvariable=self.ping_interval)
+                                     textvariable=self.ping_interval, command=self.on_interval_change)
+        interval_spinbox.bind('<Return>', self.on_interval_change)
+        interval_spinbox.bind('<FocusOut>', self.on_interval_change)
         interval_spinbox.grid(row=0, column=1, sticky=tk.W, padx=(10, 20))
         ttk.Label(advanced_frame, text="seconds").grid(row=0, column=2, sticky=tk.W, padx=(5, 20))
         
@@ -110,6 +151,19 @@ class NetworkOptimizerGUI:
         region_combo.grid(row=0, column=4, sticky=tk.W, padx=(10, 0))
         region_combo.bind('<<ComboboxSelected>>', self.on_region_change)
         
+        self.all_regions = tk.BooleanVar(value=False)
+        ttk.Checkbutton(advanced_frame, text="Monitor all regions", 
+                        variable=self.all_regions).grid(row=1, column=0, columnspan=3, sticky=tk.W, pady=(5, 0))
+        
+        self.adaptive_rate = tk.BooleanVar(value=False)
+        ttk.Checkbutton(advanced_frame, text="Adaptive probe rate", 
+                        variable=self.adaptive_rate).grid(row=2, column=0, columnspan=3, sticky=tk.W, pady=(5, 0))
+        
+        ttk.Label(advanced_frame, text="UDP Reflector:").grid(row=1, column=3, sticky=tk.W, pady=(5, 0))
+        self.reflector = tk.StringVar(value="")
+        ttk.Entry(advanced_frame, textvariable=self.reflector, 
+                  width=22).grid(row=1, column=4, sticky=tk.W, padx=(10, 0), pady=(5, 0))
+        
         log_frame = ttk.LabelFrame(main_frame, text="Activity Log", padding="10")
         log_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
         log_frame.columnconfigure(0, weight=1)
@@ -133,20 +187,42 @@ class NetworkOptimizerGUI:
         
     def log_message(self, message, level="INFO"):
         timestamp = datetime.now().strftime("%H:%M:%S")
-        formatted_message = f"[{timestamp}] {level}: {message}\n"
-        self.log_queue.put(formatted_message)
+        self.log_queue.put((timestamp, level, message))
         
     def start_log_processor(self):
-        try:
-            while True:
-                message = self.log_queue.get_nowait()
-                self.log_text.insert(tk.END, message)
-                self.log_text.see(tk.END)
-        except queue.Empty:
-            pass
+        if self.instruments:
+            self.sample_gui_backlog()
+        
+        lines = self.log_pipeline.drain(self.log_queue)
+        
+        if lines:
+            self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+            
+            line_count = int(self.log_text.index('end-1c').split('.')[0]) - 1
+            excess = line_count - self.log_pipeline.max_lines
+            if excess > 0:
+                self.log_text.delete('1.0', f'{excess + 1}.0')
+            
+            self.log_text.see(tk.END)
         
         self.root.after(100, self.start_log_processor)
         
+    def sample_gui_backlog(self):
+        # Runs on the Tk thread, the only place Tk may be asked about its queue
+        now = time.perf_counter()
+        if self._last_tick is not None:
+            # The processor asks for a 100 ms tick; the rest is time the event loop spent elsewhere
+            self.instruments.observe('tk_tick_lag_ms', (now - self._last_tick) * 1000 - 100)
+        self._last_tick = now
+        
+        self.instruments.set_gauge('log_queue_depth', self.log_queue.qsize())
+        pending = self.root.tk.splitlist(self.root.tk.call('after', 'info'))
+        self.instruments.set_gauge('tk_after_backlog', len(pending))
+        
+    def log_instrumentation(self, snapshot):
+        from instrumentation import format_summary
+        self.log_message(format_summary(snapshot), "DEBUG")
+        
     def clear_log(self):
         self.log_text.delete(1.0, tk.END)
         
@@ -156,10 +232,27 @@ class NetworkOptimizerGUI:
         else:
             self.disable_qos()
             
+    def ensure_admin(self):
+        # Monitoring runs unelevated; only QoS changes ask for administrator rights
+        import pyuac
+        
+        if pyuac.isUserAdmin():
+            return True
+        
+        if messagebox.askyesno("Administrator Required",
+                               "QoS optimization requires administrator privileges.\n"
+                               "Restart the application as administrator?"):
+            self.relaunch_as_admin = True
+            self.root.destroy()
+        return False
+        
     def enable_qos(self):
         if self.qos_thread and self.qos_thread.is_alive():
             self.log_message("QoS optimization already in progress", "WARNING")
             return
+        
+        if not self.ensure_admin():
+            return
             
         self.qos_button.config(text="Enabling QoS...", state='disabled')
         self.log_message("Starting QoS optimization...")
@@ -173,6 +266,15 @@ class NetworkOptimizerGUI:
             qos = QosPolicy()
             success = qos.enable_qos()
             
+            if qos.last_diff:
+                self.log_message(f"QoS state: {qos.last_diff['in_place']} setting(s) already in place, "
+                                 f"{len(qos.last_diff['changed'])} changed", "INFO")
+            if qos.last_report and qos.last_report.results:
+                report = qos.last_report
+                slowest = max(report.results, key=lambda result: result.elapsed_ms)
+                self.log_message(f"QoS plan ran {len(report.results)} steps in {report.elapsed_ms:.0f} ms "
+                                 f"(slowest: {slowest.step.name}, {slowest.elapsed_ms:.0f} ms)", "INFO")
+            
             if success:
                 self.root.after(0, self.qos_success)
                 self.log_message("QoS optimization applied successfully", "SUCCESS")
@@ -198,6 +300,9 @@ class NetworkOptimizerGUI:
         self.status_bar.config(text="QoS optimization failed")
         
     def disable_qos(self):
+        if not self.ensure_admin():
+            return
+        
         try:
             from qos_policy import QosPolicy
             qos = QosPolicy()
@@ -247,7 +352,19 @@ class NetworkOptimizerGUI:
             from ping_monitor import PingMonitor
             
             # Create ping monitor with GUI callback
-            self.ping_monitor = PingMonitor(callback=self.ping_callback)
+            # The display only needs the newest cycle per region, so a slow Tk
+            # loop coalesces pending updates instead of queueing them
+            self.ping_monitor = PingMonitor(callback=self.ping_callback, callback_policy='coalesce-latest',
+                                            storage_dir=DATA_DIR,
+                                            multi_region=self.all_regions.get(),
+                                            packet_train=self.reflector.get().strip() or None,
+                                            adaptive=self.adaptive_rate.get(),
+                                            instruments=self.instruments)
+            self.ping_monitor.set_region(self.selected_region.get())
+            self.ping_monitor.subscribe_alerts(self.alert_callback)
+            
+            if self.metrics_port is not None:
+                self.start_metrics_exporter()
             
             # Start the monitoring
             self.ping_monitor.start_monitor(interval)
@@ -264,9 +381,26 @@ class NetworkOptimizerGUI:
             new_region = self.selected_region.get()
             if self.ping_monitor.set_region(new_region):
                 self.log_message(f"Region changed to {new_region}", "INFO")
+                self.status_view.update(stats=self.ping_monitor.get_current_stats())
             else:
                 self.log_message(f"Failed to change region to {new_region}", "ERROR")
         
+    def on_interval_change(self, event=None):
+        # A running monitor moves onto the new interval's grid without a restart
+        if not (self.ping_monitor and self.ping_monitor.is_monitoring):
+            return
+        try:
+            interval = float(self.ping_interval.get())
+        except ValueError:
+            return
+        if interval == self.ping_monitor.interval:
+            return
+        if interval < 1 or interval > 10:
+            self.log_message("Interval must be between 1 and 10 seconds", "WARNING")
+            return
+        self.ping_monitor.reconfigure(interval)
+        self.log_message(f"Ping interval changed to {interval}s", "INFO")
+        
     def export_stats(self):
         if self.ping_monitor:
             try:
@@ -282,74 +416,59 @@ class NetworkOptimizerGUI:
     
     def ping_callback(self, test_results, stats):
         try:
-            successful_results = [r for r in test_results if r.get('success', False)]
+            # With all regions monitored, only the selected region drives the display
+            if stats.get('region', self.selected_region.get()) != self.selected_region.get():
+                return
             
-            if successful_results:
-                best_ping = min(r['latency'] for r in successful_results)
-                self.root.after(0, lambda: self.update_ping_display(str(best_ping)))
-                
-                avg_ping = sum(r['latency'] for r in successful_results) / len(successful_results)
+            latencies = test_results.successful_latencies()
+            
+            if latencies:
+                best_ping = min(latencies)
+                avg_ping = sum(latencies) / len(latencies)
                 self.log_message(f"Ping: {avg_ping:.1f}ms avg, {best_ping:.1f}ms best")
             else:
+                best_ping = None
                 self.log_message("All ping tests failed", "WARNING")
-                self.root.after(0, lambda: self.update_ping_display("Timeout"))
             
             total_tests = len(test_results)
-            failed_tests = len([r for r in test_results if not r.get('success', False)])
+            failed_tests = test_results.failure_count
             loss_percent = (failed_tests / total_tests) * 100 if total_tests > 0 else 0
+            if 'packet_train' in stats:
+                loss_percent = stats['packet_loss_rate']
             
-            self.root.after(0, lambda: self.update_packet_loss(loss_percent))
-            
-            self.root.after(0, lambda: self.update_stats_display(stats))
+            self.status_view.update(ping=best_ping, packet_loss=loss_percent, stats=stats)
             
-            for result in test_results:
-                if not result.get('success', False):
-                    self.log_message(f"Failed to ping {result['url']}: {result.get('error', 'Unknown error')}", "WARNING")
+            for result in test_results.failures():
+                reason = result.error_message if result.error else f"HTTP {result.status}"
+                self.log_message(f"Failed to ping {result.url}: {reason}", "WARNING")
                     
         except Exception as e:
             self.log_message(f"Error processing ping results: {str(e)}", "ERROR")
     
-    def update_stats_display(self, stats):
-        try:
-            self.avg_ping.set(f"{stats.get('recent_average', 0):.1f} ms")
-            self.jitter.set(f"{stats.get('jitter', 0):.1f} ms")
-        except Exception as e:
-            self.log_message(f"Error updating stats display: {str(e)}", "ERROR")
-            
-    def update_ping_display(self, ping_time):
+    def start_metrics_exporter(self):
+        from metrics_server import MetricsExporter
         try:
-            ping_value = float(ping_time)
-            self.current_ping.set(f"{ping_value:.0f} ms")
-            
-            ping_label = None
-            for widget in self.root.winfo_children():
-                if hasattr(widget, 'winfo_children'):
-                    for child in widget.winfo_children():
-                        if hasattr(child, 'winfo_children'):
-                            for grandchild in child.winfo_children():
-                                if isinstance(grandchild, ttk.Label) and grandchild.cget('textvariable') == str(self.current_ping):
-                                    ping_label = grandchild
-                                    break
-            
-            if ping_label:
-                if ping_value < 50:
-                    ping_label.config(foreground='green')
-                elif ping_value < 100:
-                    ping_label.config(foreground='orange')
-                else:
-                    ping_label.config(foreground='red')
-                    
-        except ValueError:
-            pass
-            
-    def update_packet_loss(self, loss_percent):
-        self.packet_loss.set(f"{loss_percent:.1f}%")
-        
+            self.metrics_exporter = MetricsExporter(self.ping_monitor, port=self.metrics_port).start()
+            self.log_message(f"Serving metrics on {self.metrics_exporter.url}", "INFO")
+        except OSError as e:
+            self.metrics_exporter = None
+            self.log_message(f"Metrics endpoint unavailable: {e}", "WARNING")
+    
+    def alert_callback(self, event):
+        level = "INFO" if event['type'] == 'loss_recovered' else "WARNING"
+        self.log_message(f"Alert: {event['message']}", level)
+    
     def stop_ping_monitor(self):
         self.ping_monitoring.set(False)
         
         if self.ping_monitor:
-            self.ping_monitor.stop_monitor()
+            # Closed off the Tk thread: draining the bus waits on callbacks
+            # that log through Tk. The monitor is kept for Export Stats.
+            threading.Thread(target=self.ping_monitor.close, daemon=True).start()
+        
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+            self.metrics_exporter = None
             
         self.ping_button.config(text="Start Ping Monitor")
         self.log_message("Ping monitor stopped", "INFO")
@@ -364,16 +483,24 @@ class NetworkOptimizerGUI:
         self.log_message("Network Optimizer GUI started", "INFO")
         self.root.mainloop()
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="League of Legends Network Optimizer")
+    parser.add_argument('--instrument', action='store_true', help="time the tool's own hot paths")
+    parser.add_argument('--instrument-dump', type=float, default=None, metavar='SECONDS',
+                        help="log the self-timing every SECONDS (implies --instrument)")
+    parser.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                        help="serve live stats in OpenMetrics format on http://127.0.0.1:PORT/metrics")
+    args = parser.parse_args(argv)
+    
     try: 
-        if not pyuac.isUserAdmin():
-            print("Administrator privileges required. Re-launching as admin...")
-            pyuac.runAsAdmin()
-        else:
-            print("Running with administrator privileges")
-            
-            app = NetworkOptimizerGUI()
-            app.run()
+        app = NetworkOptimizerGUI(instrument=args.instrument, instrument_dump=args.instrument_dump,
+                                  metrics_port=args.metrics_port)
+        app.run()
+        
+        if app.relaunch_as_admin:
+            import pyuac
+            print("Re-launching as admin...")
+            pyuac.runAsAdmin(wait=False)
             
     except Exception as e:
         print(f"Application failed to start: {e}")
@@ -0,0 +1,183 @@
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Latency bucket upper bounds in ms; exported in seconds
+LATENCY_BUCKETS = (5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000, 2000, 5000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, latency):
+        self.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.count += 1
+        self.total += latency
+
+    def render(self, name, labels, lines):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound / 1000)} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {self.count}")
+        lines.append(f"{name}_count{_labels(**labels)} {self.count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {round(self.total / 1000, 6)}")
+
+
+class MetricsExporter:
+    # Serves live monitor stats in OpenMetrics text format. Counters and
+    # histograms are fed from each published cycle on the exporter's own bus
+    # thread, which then renders the whole page once. A scrape only reads
+    # the last rendered page, so it never touches the probe path and costs
+    # the same however much history the monitor keeps.
+    def __init__(self, monitor, host="127.0.0.1", port=9464):
+        self.monitor = monitor
+        self.host = host
+        self.port = port
+        self.started = time.time()
+
+        self.endpoint_latency = {}
+        self.region_latency = {}
+        self.probes = {}
+        self.failures = {}
+        self.region_stats = {}
+        self.last_cycle = {}
+
+        self._page = "# EOF\n"
+        self._subscription = None
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = exporter.page().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        # Subscribed only once the port is bound, so a port in use leaves
+        # nothing behind; drop-oldest rather than coalescing, so no cycle is
+        # left out of the counters
+        self._subscription = self.monitor.subscribe(self._on_cycle, topics=('cycle',), name='metrics',
+                                                    maxsize=1024)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._subscription:
+            self.monitor.bus.unsubscribe(self._subscription)
+            self._subscription = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def page(self):
+        # The rendered page is swapped in whole, so reading it needs no lock;
+        # only uptime is computed per scrape
+        started = getattr(self.monitor, 'start_time', self.started)
+        return (self._page[:-len("# EOF\n")] +
+                "# TYPE ping_monitor_uptime_seconds gauge\n"
+                "# UNIT ping_monitor_uptime_seconds seconds\n"
+                f"ping_monitor_uptime_seconds {round(time.time() - started, 3)}\n"
+                "# EOF\n")
+
+    def _on_cycle(self, topic, payload):
+        batch, stats = payload
+        region = stats['region']
+        region_histogram = self.region_latency.setdefault(region, LatencyHistogram())
+
+        for result in batch:
+            key = (region, result.url)
+            self.probes[key] = self.probes.get(key, 0) + 1
+            if result.success:
+                self.endpoint_latency.setdefault(key, LatencyHistogram()).add(result.latency)
+                region_histogram.add(result.latency)
+                continue
+            reason = result.error.name.lower() if result.error else "http_status"
+            failure_key = (region, result.url, reason)
+            self.failures[failure_key] = self.failures.get(failure_key, 0) + 1
+
+        self.region_stats[region] = stats
+        self.last_cycle[region] = time.time()
+        self._page = self._render()
+
+    def _render(self):
+        lines = []
+
+        lines.append("# TYPE ping_probe_latency_seconds histogram")
+        lines.append("# UNIT ping_probe_latency_seconds seconds")
+        lines.append("# HELP ping_probe_latency_seconds Latency of successful probes per endpoint.")
+        for (region, url), histogram in self.endpoint_latency.items():
+            histogram.render("ping_probe_latency_seconds", {'region': region, 'endpoint': url}, lines)
+
+        lines.append("# TYPE ping_region_latency_seconds histogram")
+        lines.append("# UNIT ping_region_latency_seconds seconds")
+        lines.append("# HELP ping_region_latency_seconds Latency of successful probes per region.")
+        for region, histogram in self.region_latency.items():
+            histogram.render("ping_region_latency_seconds", {'region': region}, lines)
+
+        lines.append("# TYPE ping_probes counter")
+        lines.append("# HELP ping_probes Probes sent.")
+        for (region, url), count in self.probes.items():
+            lines.append(f"ping_probes_total{_labels(region=region, endpoint=url)} {count}")
+
+        lines.append("# TYPE ping_probe_failures counter")
+        lines.append("# HELP ping_probe_failures Failed probes by reason.")
+        for (region, url, reason), count in self.failures.items():
+            lines.append(f"ping_probe_failures_total{_labels(region=region, endpoint=url, reason=reason)} {count}")
+
+        gauges = (
+            ("ping_jitter_seconds", "jitter", 0.001, "Latency jitter (packet-train jitter when configured)."),
+            ("ping_recent_latency_seconds", "recent_average", 0.001, "Mean of the last ten successful probes."),
+            ("ping_packet_loss_ratio", "packet_loss_rate", 0.01, "Rolling loss (packet-train loss when configured).")
+        )
+        for name, key, scale, help_text in gauges:
+            lines.append(f"# TYPE {name} gauge")
+            if name.endswith("_seconds"):
+                lines.append(f"# UNIT {name} seconds")
+            lines.append(f"# HELP {name} {help_text}")
+            for region, stats in self.region_stats.items():
+                if key in stats:
+                    lines.append(f"{name}{_labels(region=region)} {round(stats[key] * scale, 6)}")
+
+        lines.append("# TYPE ping_last_cycle_timestamp_seconds gauge")
+        lines.append("# UNIT ping_last_cycle_timestamp_seconds seconds")
+        for region, timestamp in self.last_cycle.items():
+            lines.append(f"ping_last_cycle_timestamp_seconds{_labels(region=region)} {round(timestamp, 3)}")
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
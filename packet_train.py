@@ -0,0 +1,150 @@
+import argparse
+import json
+import select
+import socket
+import struct
+import time
+
+from socket_probes import split_target
+
+TRAIN_PACKET = struct.Struct('!2sIQ')
+TRAIN_MAGIC = b'PT'
+
+
+class PacketTrain:
+    # Sends `count` small timestamped datagrams at a game-like tick rate to a
+    # reflector and measures what comes back: true loss, duplicates,
+    # reordering and RFC 3550 interarrival jitter
+    def __init__(self, target, rate_hz=64, count=64, payload_size=48, timeout=1.0, default_port=5000):
+        self.target = target
+        self.address = split_target(target, default_port, web_ports=False)
+        self.rate_hz = rate_hz
+        self.count = count
+        self.payload_size = max(payload_size, TRAIN_PACKET.size)
+        self.timeout = timeout
+
+    def run(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        padding = b'\0' * (self.payload_size - TRAIN_PACKET.size)
+        spacing_ns = int(1e9 / self.rate_hz)
+
+        sent = 0
+        arrivals = []
+        answered = set()
+        try:
+            sock.connect(socket.getaddrinfo(self.address[0], self.address[1], socket.AF_INET, socket.SOCK_DGRAM)[0][4])
+            start_ns = time.perf_counter_ns()
+            deadline_ns = start_ns + (self.count - 1) * spacing_ns + int(self.timeout * 1e9)
+
+            while True:
+                now_ns = time.perf_counter_ns()
+                if sent < self.count and now_ns >= start_ns + sent * spacing_ns:
+                    try:
+                        sock.send(TRAIN_PACKET.pack(TRAIN_MAGIC, sent, now_ns) + padding)
+                    except OSError:
+                        pass
+                    sent += 1
+                    continue
+
+                if now_ns >= deadline_ns or (sent == self.count and len(answered) == self.count):
+                    break
+
+                wake_ns = deadline_ns if sent == self.count else start_ns + sent * spacing_ns
+                readable, _, _ = select.select([sock], [], [], max(wake_ns - now_ns, 0) / 1e9)
+                if not readable:
+                    continue
+
+                while True:
+                    try:
+                        data = sock.recv(self.payload_size + 64)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except OSError:
+                        break
+                    received_ns = time.perf_counter_ns()
+                    if len(data) >= TRAIN_PACKET.size:
+                        magic, sequence, sent_ns = TRAIN_PACKET.unpack_from(data)
+                        if magic == TRAIN_MAGIC and sequence < sent:
+                            arrivals.append((sequence, sent_ns, received_ns))
+                            answered.add(sequence)
+        finally:
+            sock.close()
+
+        return train_summary(self.target, sent, arrivals)
+
+
+def train_summary(target, sent, arrivals):
+    seen = set()
+    duplicates = 0
+    reordered = 0
+    highest = -1
+    jitter = 0.0
+    previous_transit = None
+    round_trips = []
+
+    for sequence, sent_ns, received_ns in arrivals:
+        if sequence in seen:
+            duplicates += 1
+            continue
+        seen.add(sequence)
+
+        if sequence < highest:
+            reordered += 1
+        highest = max(highest, sequence)
+
+        # RFC 3550 section 6.4.1: J += (|D(i-1, i)| - J) / 16, in arrival order
+        transit = (received_ns - sent_ns) / 1e6
+        round_trips.append(transit)
+        if previous_transit is not None:
+            jitter += (abs(transit - previous_transit) - jitter) / 16
+        previous_transit = transit
+
+    received = len(seen)
+    return {
+        "target": target,
+        "sent": sent,
+        "received": received,
+        "lost": sent - received,
+        "loss_percent": round((sent - received) / sent * 100, 2) if sent else 0.0,
+        "duplicates": duplicates,
+        "reordered": reordered,
+        "jitter": round(jitter, 3),
+        "rtt_min": round(min(round_trips), 3) if round_trips else None,
+        "rtt_avg": round(sum(round_trips) / len(round_trips), 3) if round_trips else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="UDP packet train and local reflector")
+    parser.add_argument('target', nargs='?', help="reflector to measure, e.g. udp://127.0.0.1:5000")
+    parser.add_argument('--rate', type=float, default=64, help="datagrams per second")
+    parser.add_argument('--count', type=int, default=64)
+    parser.add_argument('--reflect', action='store_true', help="run a local reflector instead")
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--delay', type=float, default=0.0, help="reflector delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="reflector random extra delay in seconds")
+    parser.add_argument('--loss', type=float, default=0.0, help="reflector drop fraction")
+    parser.add_argument('--duplicate', type=float, default=0.0, help="reflector duplicate fraction")
+    args = parser.parse_args(argv)
+
+    if args.reflect:
+        from standin_server import StandinUDPEchoServer
+        reflector = StandinUDPEchoServer(port=args.port, delay=args.delay, jitter=args.jitter,
+                                         loss=args.loss, duplicate=args.duplicate).start()
+        print(f"Reflecting on {reflector.url}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            reflector.stop()
+        return 0
+
+    if not args.target:
+        parser.error("a target is required unless --reflect is given")
+    print(json.dumps(PacketTrain(args.target, rate_hz=args.rate, count=args.count).run()))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
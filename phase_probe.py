@@ -0,0 +1,89 @@
+import socket
+import ssl
+import time
+from urllib.parse import urlsplit
+
+from probe_result import ErrorCode, ProbeResult
+
+
+def _elapsed_ms(start_time):
+    return (time.perf_counter() - start_time) * 1000
+
+
+def build_get_request(netloc, path, headers):
+    lines = [f"GET {path} HTTP/1.1", f"Host: {netloc}", "Connection: close"]
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def split_url(url):
+    parts = urlsplit(url)
+    secure = parts.scheme == "https"
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return parts.hostname, parts.port or (443 if secure else 80), secure, parts.netloc, path
+
+
+def parse_status(head):
+    return int(head.split(b"\r\n", 1)[0].split()[1])
+
+
+def phase_result(url, status, dns_ms, connect_ms, tls_ms, ttfb_ms):
+    # The TCP handshake is one network round trip with no server work in it,
+    # so whatever TTFB takes beyond it is time spent in the server
+    result = ProbeResult(url, round(ttfb_ms, 1), status)
+    result.dns_ms = round(dns_ms, 1)
+    result.connect_ms = round(connect_ms, 1)
+    result.tls_ms = round(tls_ms, 1) if tls_ms is not None else None
+    result.ttfb_ms = round(ttfb_ms, 1)
+    return result
+
+
+def phased_http_ping(url, timeout=3, headers=None, ssl_context=None):
+    host, port, secure, netloc, path = split_url(url)
+    sock = None
+    try:
+        start_time = time.perf_counter()
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        dns_ms = _elapsed_ms(start_time)
+
+        family, socktype, proto, _, address = addresses[0]
+        sock = socket.socket(family, socktype, proto)
+        sock.settimeout(timeout)
+        start_time = time.perf_counter()
+        sock.connect(address)
+        connect_ms = _elapsed_ms(start_time)
+
+        tls_ms = None
+        if secure:
+            context = ssl_context or ssl.create_default_context()
+            sock = context.wrap_socket(sock, server_hostname=host, do_handshake_on_connect=False)
+            start_time = time.perf_counter()
+            sock.do_handshake()
+            tls_ms = _elapsed_ms(start_time)
+
+        start_time = time.perf_counter()
+        sock.sendall(build_get_request(netloc, path, headers))
+        head = sock.recv(4096)
+        ttfb_ms = _elapsed_ms(start_time)
+
+        while head and b"\r\n" not in head:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            head += chunk
+        if not head:
+            raise ConnectionError("Connection closed by server")
+
+        return phase_result(url, parse_status(head), dns_ms, connect_ms, tls_ms, ttfb_ms)
+
+    except socket.timeout:
+        return ProbeResult.failure(url, ErrorCode.REQUEST_TIMEOUT)
+    except OSError:
+        return ProbeResult.failure(url, ErrorCode.CONNECTION_FAILED)
+    except Exception as e:
+        return ProbeResult.failure(url, ErrorCode.UNEXPECTED, str(e))
+    finally:
+        if sock is not None:
+            sock.close()
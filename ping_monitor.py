@@ -1,14 +1,147 @@
 import time
-import concurrent.futures
 from datetime import datetime, timedelta
-import requests
-import statistics
 import threading
-from collections import deque
 import json
+from adaptive_rate import AdaptiveRateController
+from anomaly_detector import AnomalyDetector
+from history_store import PingHistoryStore
+from probe_result import CycleBatch, ErrorCode, ProbeResult
+from quantile_sketch import QuantileSketch
+from result_bus import ResultBus
+from scheduler import ProbeScheduler
+from streaming_stats import Ewma, RollingWindow, Welford
+from timeseries_store import TimeSeriesStore
+
+PROBE_ENGINES = ("thread", "asyncio")
+PROBE_TYPES = ("http", "phased", "tcp", "udp")
+CONNECTION_MODES = ("auto", "warm", "cold")
+PACKET_TRAIN_KEY = "packet-train"
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'application/json,text/plain,*/*',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Cache-Control': 'no-cache'
+}
+
+class RegionState:
+    def __init__(self, history_size=100, history_capacity=131072):
+        self.ping_history = RollingWindow(history_size)
+        # Endpoints such as europe.api are shared by several regions, so each
+        # region keeps its own typed history
+        self.history = PingHistoryStore(capacity=history_capacity)
+        self.recent_pings = RollingWindow(10)
+        self.packet_loss_history = RollingWindow(20)
+        self.rtt_history = RollingWindow(10)
+        self.server_time_history = RollingWindow(10)
+        self.lifetime_ping = Welford()
+        self.ewma_ping = Ewma()
+        self.train_loss_history = RollingWindow(20)
+        self.last_train = None
+        # Samples on reused connections measure warm RTT; samples on new ones
+        # include the handshake, so the two are kept as separate series
+        self.warm_pings = RollingWindow(history_size)
+        self.cold_pings = RollingWindow(history_size)
+        self.handshake_history = RollingWindow(20)
+        
+        self.stats = {
+            'total_tests': 0,
+            'successful_tests': 0,
+            'failed_tests': 0,
+            'average_ping': 0,
+            'min_ping': float('inf'),
+            'max_ping': 0,
+            'packet_loss_rate': 0
+        }
+    
+    def update(self, batch):
+        successful_pings = batch.successful_latencies()
+        self.stats['total_tests'] += len(batch)
+        self.stats['successful_tests'] += batch.success_count
+        self.stats['failed_tests'] += batch.failure_count
+        
+        for ping in successful_pings:
+            self.ping_history.add(ping)
+            self.recent_pings.add(ping)
+            self.lifetime_ping.add(ping)
+            self.ewma_ping.add(ping)
+        
+        if successful_pings:
+            self.stats['average_ping'] = round(self.ping_history.mean, 1)
+            self.stats['min_ping'] = min(self.stats['min_ping'], min(successful_pings))
+            self.stats['max_ping'] = max(self.stats['max_ping'], max(successful_pings))
+        
+        for latency, reused in zip(batch.latency, batch.reused):
+            if latency != latency or reused < 0:
+                continue
+            if reused:
+                self.warm_pings.add(latency)
+            else:
+                self.cold_pings.add(latency)
+        
+        for result in batch:
+            if result.connect_ms is not None and result.success:
+                self.rtt_history.add(result.network_rtt)
+                self.server_time_history.add(result.server_time)
+            if result.handshake_ms is not None:
+                self.handshake_history.add(result.handshake_ms)
+        
+        if batch:
+            current_packet_loss = batch.failure_count / len(batch) * 100
+            self.packet_loss_history.add(current_packet_loss)
+            self.stats['packet_loss_rate'] = round(self.packet_loss_history.mean, 1)
+    
+    def update_train(self, summary):
+        self.train_loss_history.add(summary['loss_percent'])
+        self.last_train = summary
+    
+    def snapshot(self):
+        stats = self.stats.copy()
+        
+        if self.recent_pings:
+            stats['recent_average'] = round(self.recent_pings.mean, 1)
+            stats['jitter'] = round(self.recent_pings.stdev, 1)
+            stats['ewma_ping'] = round(self.ewma_ping.value, 1)
+            stats['lifetime_stdev'] = round(self.lifetime_ping.stdev, 1)
+        else:
+            stats['recent_average'] = 0
+            stats['jitter'] = 0
+        
+        if self.rtt_history:
+            stats['network_rtt'] = round(self.rtt_history.mean, 1)
+            stats['server_time'] = round(self.server_time_history.mean, 1)
+        
+        if self.warm_pings:
+            stats['warm_ping'] = round(self.warm_pings.mean, 1)
+        if self.cold_pings:
+            stats['cold_ping'] = round(self.cold_pings.mean, 1)
+        if self.handshake_history:
+            stats['handshake_ms'] = round(self.handshake_history.mean, 1)
+        
+        # A packet train measures real datagram loss and RFC 3550 jitter, so
+        # it replaces the HTTP-derived estimates whenever one is configured
+        if self.last_train:
+            stats['http_failure_rate'] = stats['packet_loss_rate']
+            stats['packet_loss_rate'] = round(self.train_loss_history.mean, 1)
+            stats['jitter'] = round(self.last_train['jitter'], 1)
+            stats['packet_train'] = dict(self.last_train)
+        
+        return stats
 
 class PingMonitor:
-    def __init__(self, callback=None):
+    def __init__(self, callback=None, engine="thread", max_in_flight=64, probe_type="http", history_size=100,
+                 history_capacity=131072, storage_dir=None, log_callback=None, multi_region=False,
+                 probe_spacing=0.025, cycle_budget=4.0, udp_port=5000, packet_train=None,
+                 train_rate=64, train_count=64, adaptive=False, fast_interval=1.0, floor_interval=30.0,
+                 probe_budget=10.0, callback_policy="drop-oldest", callback_queue=256, pool_size=2,
+                 connection_mode="auto", prewarm=True, instruments=None):
+        if engine not in PROBE_ENGINES:
+            raise ValueError(f"Unknown probe engine: {engine}")
+        if probe_type not in PROBE_TYPES:
+            raise ValueError(f"Unknown probe type: {probe_type}")
+        if connection_mode not in CONNECTION_MODES:
+            raise ValueError(f"Unknown connection mode: {connection_mode}")
+        
         self.RIOT_ENDPOINTS = {
             "NA": [
                 "https://clientconfig.rpg.riotgames.com/api/v1/config/public",
@@ -37,184 +170,425 @@ class PingMonitor:
         self.current_region = "NA"
         self.current_endpoints = self.RIOT_ENDPOINTS[self.current_region]
         
-        self.ping_history = deque(maxlen=100)
-        self.packet_loss_history = deque(maxlen=20)
+        self.history_size = history_size
+        self.region_states = {}
+        self.history_capacity = history_capacity
+        self.storage_dir = storage_dir
+        self.storage = None
+        self.endpoint_sketches = {}
+        self.region_sketches = {}
+        self.connection_sketches = {}
         
         self.is_monitoring = False
         self.monitor_thread = None
         self.callback = callback
+        self.log_callback = log_callback
+        self.engine = engine
+        self.probe_type = probe_type
+        self.max_in_flight = max_in_flight
+        self.async_engine = None
+        self.multi_region = multi_region
+        self.probe_spacing = probe_spacing
+        self.cycle_budget = cycle_budget
+        self.executor = None
+        self._in_flight = {}
+        self.udp_port = udp_port
+        self.udp_probes = {}
+        self.packet_train = packet_train
+        self.train_rate = train_rate
+        self.train_count = train_count
+        self._train_thread = None
+        self.adaptive = adaptive
+        self.fast_interval = fast_interval
+        self.floor_interval = floor_interval
+        self.probe_budget = probe_budget
+        self.rate_controller = None
         
-        self.stats = {
-            'total_tests': 0,
-            'successful_tests': 0,
-            'failed_tests': 0,
-            'average_ping': 0,
-            'min_ping': float('inf'),
-            'max_ping': 0,
-            'packet_loss_rate': 0
-        }
+        # Consumers hang off the bus with their own bounded queues, so the
+        # monitor thread only ever enqueues and never waits on a slow consumer
+        self.bus = ResultBus(on_error=self._log_consumer_error)
+        self.storage_subscription = None
+        # Self-timing of the monitor's own hot paths; None keeps it switched off
+        self.instruments = instruments
+        if callback:
+            self.bus.subscribe(self._deliver_cycle, topics=('cycle',), name='callback',
+                               maxsize=callback_queue, policy=callback_policy)
+        self.detector = AnomalyDetector()
+        self.detector.subscribe(lambda event: self.bus.publish('alert', event, key=event['endpoint']))
+        self.interval = 5
+        self.scheduler = None
         
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'application/json,text/plain,*/*',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Cache-Control': 'no-cache'
-        })
+        # Connection pools and the CA bundle are only loaded by the probe
+        # modes that need them, which keeps headless cold start short
+        self.headers = dict(DEFAULT_HEADERS)
+        self.pool_size = pool_size
+        self.connection_mode = connection_mode
+        self.prewarm = prewarm
+        self._connection_pools = None
+        self._ssl_context = None
+    
+    def _region_state(self, region):
+        state = self.region_states.get(region)
+        if state is None:
+            state = self.region_states[region] = RegionState(self.history_size, self.history_capacity)
+        return state
+    
+    @property
+    def stats(self):
+        return self._region_state(self.current_region).stats
+    
+    @property
+    def ping_history(self):
+        return self._region_state(self.current_region).ping_history
+    
+    @property
+    def history(self):
+        return self._region_state(self.current_region).history
+    
+    @property
+    def packet_loss_history(self):
+        return self._region_state(self.current_region).packet_loss_history
+    
+    @property
+    def connection_pools(self):
+        if self._connection_pools is None:
+            from connection_pool import ConnectionPools
+            self._connection_pools = ConnectionPools(
+                size=self.pool_size,
+                mode=self.connection_mode,
+                headers=self.headers,
+                ssl_context=self.ssl_context
+            )
+        return self._connection_pools
+    
+    @property
+    def ssl_context(self):
+        if self._ssl_context is None:
+            import ssl
+            self._ssl_context = ssl.create_default_context()
+        return self._ssl_context
+    
+    @ssl_context.setter
+    def ssl_context(self, context):
+        self._ssl_context = context
         
     def set_region(self, region):
+        # In multi-region mode every region keeps being probed, so switching
+        # only changes which region's stats are reported as current
         if region in self.RIOT_ENDPOINTS:
             self.current_region = region
             self.current_endpoints = self.RIOT_ENDPOINTS[region]
             self.log_message(f"Region set to {region}")
+            if self.scheduler and not self.multi_region:
+                self.scheduler.set_keys(self._scheduled_regions())
             return True
         return False
     
     def get_available_regions(self):
         return list(self.RIOT_ENDPOINTS.keys())
     
-    def _http_ping(self, url, timeout=3):
-        try:
+    def _http_ping(self, url):
+        return self.connection_pools.probe(url)
+    
+    def _probe_offsets(self, count):
+        # Stagger the endpoints of a cycle instead of firing them all at once,
+        # keeping the whole spread within a quarter of the interval
+        if count < 2:
+            return [0.0] * count
+        spacing = min(self.probe_spacing, self.interval * 0.25 / (count - 1))
+        return [index * spacing for index in range(count)]
+    
+    def _probe_at(self, url, fire_at):
+        delay = fire_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return self._probe(url)
+    
+    def _probe(self, url):
+        if self.probe_type == "tcp":
+            from socket_probes import tcp_connect_ping
+            return tcp_connect_ping(url)
+        if self.probe_type == "udp":
+            probe = self.udp_probes.get(url)
+            if probe is None:
+                from socket_probes import UdpEchoProbe
+                probe = self.udp_probes[url] = UdpEchoProbe(url, self.udp_port)
+            return probe.ping()
+        if self.probe_type == "phased":
+            from phase_probe import phased_http_ping
+            return phased_http_ping(url, headers=self.headers, ssl_context=self.ssl_context)
+        return self._http_ping(url)
+    
+    def _run_http_ping_tests(self, region=None):
+        if region is None or region == self.current_region:
+            region = self.current_region
+            endpoints = self.current_endpoints
+        else:
+            endpoints = self.RIOT_ENDPOINTS[region]
+        
+        if self.engine == "asyncio":
+            test_results = self._run_async_ping_tests(endpoints)
+        else:
+            test_results = self._run_threaded_ping_tests(endpoints)
+        
+        batch = CycleBatch(test_results)
+        if self.instruments:
             start_time = time.perf_counter()
-            
-            response = self.session.head(url, timeout=timeout)
-            
-            end_time = time.perf_counter()
-            latency = (end_time - start_time) * 1000
-            
-            if response.ok:
-                try:
-                    start_time = time.perf_counter()
-                    response = self.session.get(url, timeout=timeout, stream=True)
-                    next(response.iter_content(chunk_size=1024), None)
-                    response.close()
-                    end_time = time.perf_counter()
-                    latency = (end_time - start_time) * 1000
-                except:
-                    pass 
-            
-            return {
-                "url": url,
-                "latency": round(latency, 1),
-                "status": response.status_code,
-                "success": response.ok,
-                "timestamp": datetime.now()
-            }
-            
-        except requests.exceptions.Timeout:
-            return {
-                "url": url, 
-                "error": "Request timeout", 
-                "success": False,
-                "timestamp": datetime.now()
-            }
-        except requests.exceptions.ConnectionError:
-            return {
-                "url": url, 
-                "error": "Connection failed", 
-                "success": False,
-                "timestamp": datetime.now()
-            }
-        except requests.exceptions.TooManyRedirects:
-            return {
-                "url": url, 
-                "error": "Too many redirects", 
-                "success": False,
-                "timestamp": datetime.now()
-            }
-        except Exception as e:
-            return {
-                "url": url, 
-                "error": f"Unexpected error: {str(e)}", 
-                "success": False,
-                "timestamp": datetime.now()
-            }
-    
-    def _run_http_ping_tests(self):
+            self._update_stats(batch, region)
+            self.instruments.observe('update_stats_ms', (time.perf_counter() - start_time) * 1000)
+        else:
+            self._update_stats(batch, region)
+        
+        self.bus.publish('cycle', (batch, self.get_current_stats(region)), key=region)
+        
+        return batch
+    
+    def _start_packet_train(self):
+        # A train with loss waits out its tail timeout, so it runs beside the
+        # scheduler instead of holding up the next region's cycle
+        if self._train_thread and self._train_thread.is_alive():
+            return False
+        self._train_thread = threading.Thread(target=self._run_packet_train, daemon=True)
+        self._train_thread.start()
+        return True
+    
+    def _run_packet_train(self):
+        from packet_train import PacketTrain
+        
+        region = self.current_region
+        train = PacketTrain(self.packet_train, rate_hz=self.train_rate, count=self.train_count,
+                            default_port=self.udp_port)
+        try:
+            summary = train.run()
+        except OSError as e:
+            self.log_message(f"Packet train to {self.packet_train} failed: {e}")
+            return None
+        
+        self._region_state(region).update_train(summary)
+        return summary
+    
+    def _get_async_engine(self):
+        if self.async_engine is None:
+            from async_probe import AsyncProbeEngine
+            self.async_engine = AsyncProbeEngine(
+                max_in_flight=self.max_in_flight,
+                headers=self.headers,
+                probe_type=self.probe_type,
+                ssl_context=self.ssl_context,
+                udp_port=self.udp_port,
+                pool_size=self.pool_size,
+                connection_mode=self.connection_mode
+            )
+        return self.async_engine
+    
+    def _run_async_ping_tests(self, endpoints):
+        return self._get_async_engine().run_cycle(endpoints, self._probe_offsets(len(endpoints)), self.cycle_budget)
+    
+    def _prewarm_connections(self, regions):
+        # Opens pool_size keep-alive connections per origin before the first
+        # cycle, so early samples are not all cold handshakes
+        if not self.prewarm or self.probe_type != "http" or self.connection_mode == "cold":
+            return
+        urls = []
+        for region in regions:
+            urls.extend(self.RIOT_ENDPOINTS.get(region, []))
+        if not urls:
+            return
+        
+        start_time = time.perf_counter()
+        if self.engine == "asyncio":
+            warmed = self._get_async_engine().prewarm(urls)
+        else:
+            warmed = self.connection_pools.prewarm(urls)
+        self.log_message(f"Pre-warmed {warmed} connection(s) in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    
+    def _run_threaded_ping_tests(self, endpoints):
+        import concurrent.futures
+        
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_in_flight,
+                thread_name_prefix="ping-probe"
+            )
+        
         test_results = []
-        successful_pings = []
+        start = time.monotonic()
+        future_to_url = {}
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.current_endpoints)) as executor:
-            future_to_url = {
-                executor.submit(self._http_ping, url): url 
-                for url in self.current_endpoints
-            }
+        for url, offset in zip(endpoints, self._probe_offsets(len(endpoints))):
+            # An endpoint whose last probe is still hung gets no new probe, so a
+            # blackholed host cannot pile up blocked workers
+            previous = self._in_flight.get(url)
+            if previous is not None and not previous.done():
+                test_results.append(ProbeResult.failure(url, ErrorCode.PREVIOUS_PROBE_RUNNING))
+                continue
             
-            for future in concurrent.futures.as_completed(future_to_url, timeout=10):
-                try:
-                    result = future.result()
-                    test_results.append(result)
-                    
-                    if result.get('success', False):
-                        successful_pings.append(result['latency'])
-                        
-                except concurrent.futures.TimeoutError:
-                    url = future_to_url[future]
-                    test_results.append({
-                        "url": url,
-                        "error": "Future timeout",
-                        "success": False,
-                        "timestamp": datetime.now()
-                    })
+            future = self.executor.submit(self._probe_at, url, start + offset)
+            self._in_flight[url] = future
+            future_to_url[future] = url
         
-        self._update_stats(test_results, successful_pings)
+        done, pending = concurrent.futures.wait(future_to_url, timeout=self.cycle_budget)
         
-        if self.callback:
-            self.callback(test_results, self.get_current_stats())
+        for future in done:
+            try:
+                test_results.append(future.result())
+            except Exception as e:
+                test_results.append(ProbeResult.failure(future_to_url[future], ErrorCode.UNEXPECTED, str(e)))
+        
+        for future in pending:
+            future.cancel()
+            test_results.append(ProbeResult.failure(future_to_url[future], ErrorCode.CYCLE_DEADLINE))
         
         return test_results
     
-    def _update_stats(self, test_results, successful_pings):
-        self.stats['total_tests'] += len(test_results)
-        self.stats['successful_tests'] += len(successful_pings)
-        self.stats['failed_tests'] += len(test_results) - len(successful_pings)
+    def _update_stats(self, batch, region=None):
+        region = region or self.current_region
+        state = self._region_state(region)
+        state.update(batch)
+        state.history.add_batch(batch)
         
-        if successful_pings:
-            avg_ping = statistics.mean(successful_pings)
-            min_ping = min(successful_pings)
-            max_ping = max(successful_pings)
-            
-            self.ping_history.extend(successful_pings)
-            
-            if self.ping_history:
-                self.stats['average_ping'] = round(statistics.mean(self.ping_history), 1)
-                self.stats['min_ping'] = min(self.stats['min_ping'], min_ping)
-                self.stats['max_ping'] = max(self.stats['max_ping'], max_ping)
-        
-        if test_results:
-            current_packet_loss = (len(test_results) - len(successful_pings)) / len(test_results) * 100
-            self.packet_loss_history.append(current_packet_loss)
-            
-            if self.packet_loss_history:
-                self.stats['packet_loss_rate'] = round(statistics.mean(self.packet_loss_history), 1)
+        # Storage is opened and closed outside the probe path; a cycle still
+        # finishing after close_storage is simply not persisted
+        if self.storage_subscription is not None:
+            self.bus.publish('results', batch)
+        
+        region_sketch = self.region_sketches.setdefault(region, QuantileSketch())
+        for url, latency, reused in zip(batch.urls, batch.latency, batch.reused):
+            if latency == latency:
+                self.endpoint_sketches.setdefault((region, url), QuantileSketch()).add(latency)
+                region_sketch.add(latency)
+                if reused >= 0:
+                    kind = 'warm' if reused else 'cold'
+                    self.connection_sketches.setdefault((region, kind), QuantileSketch()).add(latency)
+        
+        self.detector.observe(batch, region)
     
-    def get_current_stats(self):
-        stats = self.stats.copy()
+    def _deliver_cycle(self, topic, payload):
+        if self.instruments is None:
+            self.callback(*payload)
+            return
         
-        if self.ping_history:
-            recent_pings = list(self.ping_history)[-10:]  # Last 10 pings
-            stats['recent_average'] = round(statistics.mean(recent_pings), 1)
-            
-            if len(recent_pings) > 1:
-                stats['jitter'] = round(statistics.stdev(recent_pings), 1)
-            else:
-                stats['jitter'] = 0
-        else:
-            stats['recent_average'] = 0
-            stats['jitter'] = 0
+        batch = payload[0]
+        start_time = time.perf_counter()
+        if batch.timestamp_ns:
+            # From the cycle's last result to delivery: stats, publish and queueing
+            self.instruments.observe('callback_delay_ms', (time.perf_counter_ns() - max(batch.timestamp_ns)) / 1e6)
+        try:
+            self.callback(*payload)
+        finally:
+            self.instruments.observe('callback_ms', (time.perf_counter() - start_time) * 1000)
+    
+    def _log_consumer_error(self, name, error, suppressed):
+        more = f" ({suppressed} more since the last report)" if suppressed else ""
+        self.log_message(f"Error in {name} consumer: {error}{more}")
+    
+    def subscribe_alerts(self, callback, maxsize=256):
+        # callback(event) receives dicts with type, region, endpoint and message
+        return self.bus.subscribe(lambda topic, event: callback(event), topics=('alert',), name='alerts',
+                                  maxsize=maxsize)
+    
+    def unsubscribe_alerts(self, subscription):
+        self.bus.unsubscribe(subscription)
+    
+    def subscribe(self, handler, topics=None, name=None, maxsize=64, policy="drop-oldest"):
+        # handler(topic, payload) for 'cycle' (results, stats), 'results' and 'alert'
+        return self.bus.subscribe(handler, topics, name, maxsize, policy)
+    
+    def get_bus_metrics(self):
+        return self.bus.metrics()
+    
+    def get_instrumentation(self):
+        return self.instruments.snapshot() if self.instruments else None
+    
+    def flush(self, timeout=2.0):
+        return self.bus.drain(timeout)
+    
+    def get_current_stats(self, region=None):
+        region = region or self.current_region
+        stats = self._region_state(region).snapshot()
+        stats['region'] = region
+        
+        region_sketch = self.region_sketches.get(region)
+        if region_sketch and region_sketch.count:
+            stats.update(region_sketch.percentiles())
         
         stats['uptime'] = self._get_uptime()
+        if self.scheduler:
+            stats['missed_deadlines'] = self.scheduler.missed_deadlines
+            stats['probe_interval'] = round(self.scheduler.interval_for(region), 2)
         return stats
     
+    def get_all_region_stats(self):
+        return {region: self.get_current_stats(region) for region in self.region_states}
+    
     def _get_uptime(self):
         if hasattr(self, 'start_time'):
             return str(timedelta(seconds=int(time.time() - self.start_time)))
         return "0:00:00"
     
-    def get_ping_history(self, limit=50):
-        return list(self.ping_history)[-limit:]
+    def get_percentiles(self):
+        return {
+            'endpoints': {f"{region}/{url}": sketch.percentiles()
+                          for (region, url), sketch in self.endpoint_sketches.items()},
+            'regions': {region: sketch.percentiles() for region, sketch in self.region_sketches.items()},
+            'connections': {f"{region}/{kind}": sketch.percentiles()
+                            for (region, kind), sketch in self.connection_sketches.items()}
+        }
+    
+    def get_connection_stats(self):
+        return self._connection_pools.stats() if self._connection_pools else {}
+    
+    def merge_sketches(self, sketch_data):
+        for key, data in sketch_data.get('endpoints', {}).items():
+            # Keys are "region/url"; exports from before endpoints were kept
+            # per region use the bare url
+            region, _, url = key.partition('/')
+            if ':' in region:
+                region, url = self.current_region, key
+            self.endpoint_sketches.setdefault((region, url), QuantileSketch()).merge(QuantileSketch.from_dict(data))
+        for region, data in sketch_data.get('regions', {}).items():
+            self.region_sketches.setdefault(region, QuantileSketch()).merge(QuantileSketch.from_dict(data))
+    
+    def _get_storage(self):
+        if self.storage is None:
+            self.storage = TimeSeriesStore(self.storage_dir)
+        return self.storage
+    
+    def open_storage(self):
+        if not self.storage_dir or self.storage_subscription is not None:
+            return
+        store = self._get_storage()
+        self.storage_subscription = self.bus.subscribe(
+            lambda topic, results: store.append_batch(results),
+            topics=('results',), name='storage', maxsize=1024
+        )
+    
+    def close_storage(self):
+        # Cleared before draining so a late cycle stops publishing to it
+        subscription, self.storage_subscription = self.storage_subscription, None
+        if subscription:
+            self.bus.unsubscribe(subscription, drain=True)
+        
+        if self.storage:
+            self.storage.close()
+            self.storage = None
+    
+    def query_history(self, start, end, endpoint=None, tier='1m'):
+        if not self.storage_dir:
+            return []
+        return self._get_storage().query(start, end, endpoint, tier)
+    
+    def get_ping_history(self, limit=50, endpoint=None, region=None):
+        history = self._region_state(region or self.current_region).history
+        return list(history.latest(limit, endpoint).latencies())
+    
+    def get_history_view(self, start=None, end=None, endpoint=None, region=None):
+        return self._region_state(region or self.current_region).history.view(start, end, endpoint)
     
     def log_message(self, message):
+        if self.log_callback:
+            self.log_callback(message)
+            return
         print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
     
     def start_monitor(self, interval=5):
@@ -224,6 +598,16 @@ class PingMonitor:
         
         self.is_monitoring = True
         self.start_time = time.time()
+        self.interval = interval
+        self.open_storage()
+        self.scheduler = ProbeScheduler(interval)
+        if self.adaptive:
+            self.rate_controller = AdaptiveRateController(
+                interval,
+                fast_interval=self.fast_interval,
+                floor_interval=self.floor_interval,
+                budget=self.probe_budget
+            )
         
         self.monitor_thread = threading.Thread(
             target=self._monitor_loop,
@@ -232,7 +616,10 @@ class PingMonitor:
         )
         self.monitor_thread.start()
         
-        self.log_message(f"Started monitoring {self.current_region} region with {interval}s interval")
+        if self.multi_region:
+            self.log_message(f"Started monitoring all regions with {interval}s interval")
+        else:
+            self.log_message(f"Started monitoring {self.current_region} region with {interval}s interval")
         return True
     
     def stop_monitor(self):
@@ -240,46 +627,150 @@ class PingMonitor:
             return False
         
         self.is_monitoring = False
+        self.scheduler.stop()
         self.log_message("Monitoring stopped")
         
         if self.monitor_thread:
             self.monitor_thread.join(timeout=1)
         
+        self.close_storage()
         return True
     
+    def close(self):
+        # Releases everything the monitor owns, including the bus threads that
+        # would otherwise keep it alive; it cannot be started again afterwards
+        self.stop_monitor()
+        self.close_storage()
+        if not (self.monitor_thread and self.monitor_thread.is_alive()):
+            # A loop still finishing its last cycle closes them itself
+            self._close_engines()
+        self.bus.close()
+    
+    def reconfigure(self, interval=None):
+        if interval:
+            self.interval = interval
+        if self.rate_controller:
+            self.rate_controller.reset(interval)
+        if self.scheduler:
+            self.scheduler.set_keys(self._scheduled_regions(), interval)
+    
+    def _scheduled_regions(self):
+        regions = list(self.RIOT_ENDPOINTS) if self.multi_region else [self.current_region]
+        # The train gets its own phase slot so it never overlaps a probe cycle
+        if self.packet_train:
+            regions.append(PACKET_TRAIN_KEY)
+        return regions
+    
     def _monitor_loop(self, interval):
-        self.log_message(f"League of Legends HTTP Ping Monitor ({self.current_region})")
+        # Regions are spread across the interval on one monotonic grid, so in
+        # multi-region mode their probes never fire at the same moment
+        regions = self._scheduled_regions()
+        self.log_message(f"League of Legends HTTP Ping Monitor ({', '.join(regions)})")
+        
+        self._prewarm_connections(regions)
+        
+        scheduler = self.scheduler
+        scheduler.set_keys(regions)
+        missed = 0
+        
+        instruments = self.instruments
         
         while self.is_monitoring:
-            try:
-                results = self._run_http_ping_tests()
-                
-                if not self.callback:
-                    self._print_results(results)
-                
-                for _ in range(int(interval * 10)):
-                    if not self.is_monitoring:
-                        break
-                    time.sleep(0.1)
+            for region, deadline in scheduler.wait():
+                try:
+                    if instruments:
+                        # How far behind its intended tick this cycle starts
+                        instruments.observe('schedule_lag_ms', (scheduler.clock() - deadline) * 1000)
                     
-            except Exception as e:
-                self.log_message(f"Error in monitoring loop: {e}")
-                time.sleep(interval)
+                    if region == PACKET_TRAIN_KEY:
+                        self._start_packet_train()
+                        continue
+                    
+                    if instruments:
+                        start_time = time.perf_counter()
+                        results = self._run_http_ping_tests(region)
+                        instruments.observe('cycle_ms', (time.perf_counter() - start_time) * 1000)
+                    else:
+                        results = self._run_http_ping_tests(region)
+                    
+                    if self.rate_controller:
+                        self._adapt_rate(region, results)
+                    
+                    if not self.callback:
+                        self._print_results(results, region)
+                        
+                except Exception as e:
+                    self.log_message(f"Error in monitoring loop ({region}): {e}")
+            
+            if scheduler.missed_deadlines != missed:
+                if instruments:
+                    instruments.count('missed_deadlines', scheduler.missed_deadlines - missed)
+                self.log_message(f"Probe cycles running late: skipped {scheduler.missed_deadlines - missed} deadline(s)")
+                missed = scheduler.missed_deadlines
+        
+        self._close_engines()
+    
+    def _adapt_rate(self, region, results):
+        previous = self.scheduler.interval_for(region)
+        stats = self._region_state(region).snapshot()
+        interval = self.rate_controller.observe(region, results, stats['jitter'])
+        if abs(interval - previous) > 0.01:
+            self.scheduler.set_interval(region, interval)
+            direction = "Speeding up" if interval < previous else "Backing off"
+            message = f"{direction} {region} probes: every {interval:.1f}s"
+            controller = self.rate_controller
+            if interval > controller.floor_interval + 0.01:
+                message += (f", past the {controller.floor_interval:g}s floor to stay within "
+                            f"{controller.budget:g} probes/s")
+            self.log_message(message)
+    
+    def _close_engines(self):
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+            self._in_flight.clear()
+        
+        for probe in self.udp_probes.values():
+            probe.close()
+        self.udp_probes.clear()
+                
+        if self.async_engine:
+            self.async_engine.close()
+            self.async_engine = None
+        
+        if self._connection_pools:
+            self._connection_pools.close()
+            self._connection_pools = None
     
-    def _print_results(self, results):
+    def _print_results(self, results, region=None):
+        region = region or self.current_region
         print(f"\n{' League HTTP Ping Test ':=^60}")
-        print(f"Region: {self.current_region} | {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"Region: {region} | {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("-" * 60)
         
         for result in results:
-            if result.get('success', False):
-                status_color = "✓" if result['latency'] < 100 else "⚠" if result['latency'] < 200 else "✗"
-                print(f"{status_color} {result['url'][:45]:45} | {result['latency']:6.1f} ms | HTTP {result['status']}")
+            if result.success:
+                status_color = "✓" if result.latency < 100 else "⚠" if result.latency < 200 else "✗"
+                status = result.protocol.upper() if result.protocol else f"HTTP {result.status}"
+                if result.reused is not None:
+                    status += " (reused)" if result.reused else " (new)"
+                print(f"{status_color} {result.url[:45]:45} | {result.latency:6.1f} ms | {status}")
+            elif result.error:
+                print(f"✗ {result.url[:45]:45} | ERROR: {result.error_message}")
             else:
-                print(f"✗ {result['url'][:45]:45} | ERROR: {result.get('error', 'Unknown')}")
+                print(f"✗ {result.url[:45]:45} | ERROR: HTTP {result.status}")
         
-        stats = self.get_current_stats()
+        stats = self.get_current_stats(region)
         print(f"\nStats: Avg: {stats['recent_average']}ms | Loss: {stats['packet_loss_rate']}% | Jitter: {stats['jitter']}ms")
+        if 'packet_train' in stats:
+            train = stats['packet_train']
+            print(f"Packet train: {train['received']}/{train['sent']} received | "
+                  f"Dup: {train['duplicates']} | Reordered: {train['reordered']}")
+        if 'network_rtt' in stats:
+            print(f"Network RTT: {stats['network_rtt']}ms | Server: {stats['server_time']}ms")
+        if 'warm_ping' in stats or 'cold_ping' in stats:
+            print(f"Warm: {stats.get('warm_ping', '--')}ms | Cold: {stats.get('cold_ping', '--')}ms | "
+                  f"Handshake: {stats.get('handshake_ms', '--')}ms")
     
     def run_single_test(self):
         return self._run_http_ping_tests()
@@ -293,6 +784,16 @@ class PingMonitor:
             'endpoints': self.current_endpoints,
             'stats': self.get_current_stats(),
             'ping_history': list(self.ping_history),
+            'percentiles': self.get_percentiles(),
+            'sketches': {
+                'endpoints': {f"{region}/{url}": sketch.to_dict()
+                              for (region, url), sketch in self.endpoint_sketches.items()},
+                'regions': {region: sketch.to_dict() for region, sketch in self.region_sketches.items()}
+            },
+            'region_stats': self.get_all_region_stats() if self.multi_region else {},
+            'storage_dir': self.storage_dir,
+            'bus': self.get_bus_metrics(),
+            'instrumentation': self.get_instrumentation(),
             'export_time': datetime.now().isoformat()
         }
         
@@ -0,0 +1,185 @@
+import enum
+import math
+import time
+from array import array
+from datetime import datetime
+
+# perf_counter_ns has no epoch; an offset converts it to wall-clock time,
+# which is only needed when results are exported or displayed. The clocks
+# drift apart (NTP slewing, clock steps, suspend), so the offset is measured
+# again once it is older than this.
+WALL_ANCHOR_SECONDS = 60.0
+
+
+def _anchor():
+    counter_ns = time.perf_counter_ns()
+    return time.time_ns() - counter_ns, counter_ns
+
+
+_wall_anchor = _anchor()
+
+
+def wall_time(timestamp_ns):
+    global _wall_anchor
+    offset_ns, anchored_ns = _wall_anchor
+    if time.perf_counter_ns() - anchored_ns > WALL_ANCHOR_SECONDS * 1e9:
+        _wall_anchor = _anchor()
+        offset_ns = _wall_anchor[0]
+    return (timestamp_ns + offset_ns) / 1e9
+
+
+class ErrorCode(enum.IntEnum):
+    NONE = 0
+    REQUEST_TIMEOUT = 1
+    CONNECTION_FAILED = 2
+    # 3 was TOO_MANY_REDIRECTS; HEAD probes never follow redirects
+    CONNECT_TIMEOUT = 4
+    ECHO_TIMEOUT = 5
+    CYCLE_DEADLINE = 6
+    PREVIOUS_PROBE_RUNNING = 7
+    UNEXPECTED = 8
+
+
+ERROR_MESSAGES = {
+    ErrorCode.NONE: "",
+    ErrorCode.REQUEST_TIMEOUT: "Request timeout",
+    ErrorCode.CONNECTION_FAILED: "Connection failed",
+    ErrorCode.CONNECT_TIMEOUT: "Connect timeout",
+    ErrorCode.ECHO_TIMEOUT: "Echo timeout",
+    ErrorCode.CYCLE_DEADLINE: "Cycle deadline exceeded",
+    ErrorCode.PREVIOUS_PROBE_RUNNING: "Previous probe still running",
+    ErrorCode.UNEXPECTED: "Unexpected error"
+}
+
+
+class ProbeResult:
+    # One probe outcome. Slots keep it to a fraction of a dict, the error is
+    # a code rather than a formatted string, and the timestamp is a raw
+    # perf_counter_ns value that is only turned into a datetime on export.
+    __slots__ = ('url', 'latency', 'status', 'error', 'detail', 'protocol', 'timestamp_ns',
+                 'dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'reused', 'handshake_ms')
+
+    def __init__(self, url, latency=None, status=None, error=ErrorCode.NONE, detail=None, protocol=None,
+                 timestamp_ns=None):
+        self.url = url
+        self.latency = latency
+        self.status = status
+        self.error = error
+        self.detail = detail
+        self.protocol = protocol
+        self.timestamp_ns = timestamp_ns if timestamp_ns is not None else time.perf_counter_ns()
+        self.dns_ms = None
+        self.connect_ms = None
+        self.tls_ms = None
+        self.ttfb_ms = None
+        # Whether the probe ran on a connection that had already served a
+        # request; None for probes that have no connection to reuse
+        self.reused = None
+        self.handshake_ms = None
+
+    @classmethod
+    def failure(cls, url, error, detail=None, protocol=None):
+        return cls(url, error=error, detail=detail, protocol=protocol)
+
+    @property
+    def success(self):
+        return self.error == ErrorCode.NONE and self.status is not None and self.status < 400
+
+    @property
+    def error_message(self):
+        message = ERROR_MESSAGES[self.error]
+        return f"{message}: {self.detail}" if self.detail else message
+
+    @property
+    def network_rtt(self):
+        return self.connect_ms
+
+    @property
+    def server_time(self):
+        if self.ttfb_ms is None or self.connect_ms is None:
+            return None
+        return round(max(self.ttfb_ms - self.connect_ms, 0), 1)
+
+    @property
+    def timestamp(self):
+        return datetime.fromtimestamp(wall_time(self.timestamp_ns))
+
+    def to_dict(self):
+        result = {
+            "url": self.url,
+            "success": self.success,
+            "timestamp": self.timestamp
+        }
+        if self.error:
+            result["error"] = self.error_message
+        else:
+            result["latency"] = self.latency
+            result["status"] = self.status
+        if self.protocol:
+            result["protocol"] = self.protocol
+        if self.reused is not None:
+            result["reused"] = self.reused
+        if self.handshake_ms is not None:
+            result["handshake_ms"] = self.handshake_ms
+        if self.connect_ms is not None:
+            result.update({
+                "dns_ms": self.dns_ms,
+                "connect_ms": self.connect_ms,
+                "tls_ms": self.tls_ms,
+                "ttfb_ms": self.ttfb_ms,
+                "network_rtt": self.network_rtt,
+                "server_time": self.server_time
+            })
+        return result
+
+    def __repr__(self):
+        if self.error:
+            return f"ProbeResult({self.url!r}, error={self.error.name})"
+        return f"ProbeResult({self.url!r}, latency={self.latency}, status={self.status})"
+
+
+class CycleBatch:
+    # Columnar view of one probe cycle. Consumers read typed arrays instead of
+    # re-scanning result objects, and the columns pickle compactly when a
+    # batch crosses a process boundary.
+    def __init__(self, results=()):
+        self.results = []
+        self.urls = []
+        self.latency = array('d')
+        self.status = array('h')
+        self.error = array('B')
+        self.timestamp_ns = array('q')
+        self.reused = array('b')
+        self.success_count = 0
+        for result in results:
+            self.append(result)
+
+    def append(self, result):
+        success = result.success
+        self.results.append(result)
+        self.urls.append(result.url)
+        self.latency.append(result.latency if success else math.nan)
+        self.status.append(result.status if result.status is not None else -1)
+        self.error.append(result.error)
+        self.timestamp_ns.append(result.timestamp_ns)
+        self.reused.append(-1 if result.reused is None else result.reused)
+        self.success_count += success
+
+    def __len__(self):
+        return len(self.results)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    @property
+    def failure_count(self):
+        return len(self.results) - self.success_count
+
+    def successful_latencies(self):
+        return array('d', (latency for latency in self.latency if latency == latency))
+
+    def failures(self):
+        return [result for result in self.results if not result.success]
+
+    def to_dicts(self):
+        return [result.to_dict() for result in self.results]
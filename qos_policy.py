@@ -1,224 +1,297 @@
-import subprocess
-import winreg
+import json
 import os
+from command_plan import CommandPlan, CommandRunner, FakeRunner, Step, StepResult
+from qos_state import (KIND_GROUPS, TCP_GLOBAL_SETTINGS, TCP_PARAMETERS_KEY, TCP_REGISTRY_SETTINGS,
+                       FakeStateBackend, WindowsStateBackend, diff_state)
+
+try:
+    import winreg
+except ImportError:
+    # Only on Windows; plans can still be built and run against a fake runner
+    winreg = None
+
+def default_snapshot_path():
+    # The snapshot describes machine-wide settings, so it is kept with
+    # machine-wide application data rather than next to the code
+    program_data = os.environ.get('PROGRAMDATA')
+    if not program_data:
+        return None
+    return os.path.join(program_data, "ping-reducer", "qos_snapshot.json")
 
 class QosPolicy:
-    def __init__(self):
+    # With reconcile=True (the default) enable_qos reads the current state
+    # once, changes only what differs from the desired state and records the
+    # original values, which disable_qos then restores. With a FakeRunner
+    # and no backend, the state is an in-memory FakeStateBackend driven by
+    # that runner and the snapshot is kept in memory unless snapshot_path is
+    # given. A setting whose state cannot be read counts as a failure.
+    def __init__(self, runner=None, windows_home=None, backend=None, reconcile=True, snapshot_path=None):
         self.lol_process_name = ["LeagueClient.exe", "League of Legends.exe"]
         self.qos_policy_name = "LoL_Traffic_Priority"
         self.lol_ports = "5000-5500,8088,8443,8444"
-        self.is_windows_home = self._check_windows_edition()
+        self.runner = runner or getattr(backend, 'runner', None) or CommandRunner()
+        fake = isinstance(self.runner, FakeRunner)
+        self.backend = backend or (FakeStateBackend(runner=self.runner) if fake else WindowsStateBackend(self.runner))
+        self.reconcile = reconcile
+        self.snapshot_path = snapshot_path if snapshot_path or fake else default_snapshot_path()
+        self._snapshot = {}
+        self.last_report = None
+        self.last_diff = None
+        self.is_windows_home = self._check_windows_edition() if windows_home is None else windows_home
+        
+        self.group_messages = {
+            'standard_policy': (f"Created standard QoS policy '{self.qos_policy_name}' for ports {self.lol_ports}",
+                                "Failed to create standard QoS policy"),
+            'packet_scheduler': ("QoS Packet Scheduler service enabled",
+                                 "Warning: Could not configure QoS service"),
+            'adapter_qos': ("Network adapter QoS settings configured",
+                            "Warning: Could not configure adapter QoS"),
+            'process_priority': ("Process priorities configured for League of Legends",
+                                 "Warning: Could not set process priorities"),
+            'tcp_settings': ("TCP/IP settings optimized for gaming",
+                             "Warning: Could not configure TCP settings"),
+            'firewall': (f"Firewall rules configured for ports {self.lol_ports}",
+                         "Warning: Could not configure firewall rules"),
+            'interface': ("Network interface optimizations applied",
+                          "Warning: Could not apply network optimizations")
+        }
         
     def _check_windows_edition(self):
         try:
             gpedit_path = os.path.join(os.environ['WINDIR'], 'System32', 'gpedit.msc')
             if not os.path.exists(gpedit_path):
                 return True
-            
-            result = subprocess.run(
-                ['wmic', 'os', 'get', 'Caption', '/value'],
-                capture_output=True,
-                text=True,
-                shell=True
-            )
-            
-            if 'Home' in result.stdout:
+                
+            _, output, _ = self.runner.run_command('wmic os get Caption /value')
+            if 'Home' in output:
                 return True
                 
         except Exception as e:
             print(f"Warning: Could not determine Windows edition: {e}")
             
         return False
-    
-    def _enable_standard_qos(self):
-        try:
-            subprocess.run(
-                f'netsh int qos delete policy name="{self.qos_policy_name}"',
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-           
-            subprocess.run(
-                f'netsh int qos add policy name="{self.qos_policy_name}" '
-                f'protocol=UDP localport={self.lol_ports} priority=1',
-                shell=True,
-                check=True
-            )
-           
-            print(f"Created standard QoS policy '{self.qos_policy_name}' for ports {self.lol_ports}")
-            return True
-        except subprocess.CalledProcessError as e:
-            print(f"Failed to create standard QoS policy: {e}")
-            return self.enable_qos()
-    
-    def _enable_qos_packet_scheduler(self):
-        try:
-            subprocess.run([
-                'sc', 'config', 'Psched', 'start=', 'auto'
-            ], check=True, capture_output=True)
-            
-            subprocess.run([
-                'sc', 'start', 'Psched'
-            ], capture_output=True)
-            
-            print("QoS Packet Scheduler service enabled")
-            return True
-            
-        except subprocess.CalledProcessError as e:
-            print(f"Warning: Could not configure QoS service: {e}")
-            return False
-    
+        
+    def _plan_standard_qos(self, plan):
+        plan.add("Delete old QoS policy",
+                 f'netsh int qos delete policy name="{self.qos_policy_name}"',
+                 batch="netsh", check=False, group="standard_policy")
+        plan.add("Add QoS policy",
+                 f'netsh int qos add policy name="{self.qos_policy_name}" '
+                 f'protocol=UDP localport={self.lol_ports} priority=1',
+                 batch="netsh", after=["Delete old QoS policy"], group="standard_policy")
+                 
+    def _plan_home_optimizations(self, plan):
+        # Every group is independent of the others. The sc and netsh commands
+        # each share one script, while wmic and the registry writes run beside them
+        plan.add("Set Psched to start automatically", 'sc config Psched start= auto',
+                 batch="sc", group="packet_scheduler")
+        plan.add("Start Psched", 'sc start Psched',
+                 batch="sc", after=["Set Psched to start automatically"], check=False, group="packet_scheduler")
+                 
+        plan.add("Read adapter QoS settings", action=self._set_network_adapter_qos, group="adapter_qos")
+        
+        # One WQL query covers every League process instead of one wmic spawn each
+        names = " or ".join(f"name='{name}'" for name in self.lol_process_name)
+        plan.add("Raise League process priority",
+                 f'wmic process where "{names}" call setpriority "high priority"',
+                 check=False, group="process_priority")
+                 
+        plan.add("Write TCP registry settings", action=self._configure_tcp_settings, group="tcp_settings")
+        
+        plan.add("Delete old firewall rule",
+                 f'netsh advfirewall firewall delete rule name="{self.qos_policy_name}_UDP"',
+                 batch="netsh", check=False, group="firewall")
+        plan.add("Add firewall rule",
+                 f'netsh advfirewall firewall add rule name="{self.qos_policy_name}_UDP" '
+                 f'dir=out action=allow protocol=UDP localport={self.lol_ports} profile=any',
+                 batch="netsh", after=["Delete old firewall rule"], group="firewall")
+                 
+        for setting, value in TCP_GLOBAL_SETTINGS:
+            plan.add(f"Set TCP global {setting}={value}", f'netsh int tcp set global {setting}={value}',
+                     batch="netsh", check=False, group="interface")
+                     
     def _set_network_adapter_qos(self):
-        try:
-            adapter_key = winreg.OpenKey(
-                winreg.HKEY_LOCAL_MACHINE,
-                r"SYSTEM\CurrentControlSet\Services\Tcpip\Parameters\Interfaces",
-                0,
-                winreg.KEY_READ
-            )
-            
-            print("Network adapter QoS settings configured")
-            winreg.CloseKey(adapter_key)
-            return True
-            
-        except Exception as e:
-            print(f"Warning: Could not configure adapter QoS: {e}")
-            return False
-    
-    def _set_process_priority(self):
-        try:
-            for process_name in self.lol_process_name:
-                subprocess.run([
-                    'wmic', 'process', 'where', f'name="{process_name}"',
-                    'call', 'setpriority', '"high priority"'
-                ], capture_output=True, shell=True)
-            
-            print("Process priorities configured for League of Legends")
-            return True
+        if winreg is None:
+            raise OSError("Windows registry not available")
             
-        except Exception as e:
-            print(f"Warning: Could not set process priorities: {e}")
-            return False
-    
+        adapter_key = winreg.OpenKey(
+            winreg.HKEY_LOCAL_MACHINE,
+            r"SYSTEM\CurrentControlSet\Services\Tcpip\Parameters\Interfaces",
+            0,
+            winreg.KEY_READ
+        )
+        winreg.CloseKey(adapter_key)
+        return True
+        
     def _configure_tcp_settings(self):
-        try:
-            tcp_settings = [
-                ('TcpAckFrequency', 1),
-                ('TCPNoDelay', 1),
-                ('TcpWindowSize', 65536),
-                ('EnableTCPChimney', 1),
-            ]
-            
-            tcp_key = winreg.OpenKey(
-                winreg.HKEY_LOCAL_MACHINE,
-                r"SYSTEM\CurrentControlSet\Services\Tcpip\Parameters",
-                0,
-                winreg.KEY_SET_VALUE
-            )
-            
-            for setting, value in tcp_settings:
-                try:
-                    winreg.SetValueEx(tcp_key, setting, 0, winreg.REG_DWORD, value)
-                except Exception as e:
-                    print(f"Warning: Could not set {setting}: {e}")
-            
-            winreg.CloseKey(tcp_key)
-            print("TCP/IP settings optimized for gaming")
-            return True
+        if winreg is None:
+            raise OSError("Windows registry not available")
             
-        except Exception as e:
-            print(f"Warning: Could not configure TCP settings: {e}")
-            return False
-    
-    def _windows_firewall_priority(self):
+        tcp_key = winreg.OpenKey(
+            winreg.HKEY_LOCAL_MACHINE,
+            TCP_PARAMETERS_KEY,
+            0,
+            winreg.KEY_SET_VALUE
+        )
+        
+        for setting, value in TCP_REGISTRY_SETTINGS:
+            try:
+                winreg.SetValueEx(tcp_key, setting, 0, winreg.REG_DWORD, value)
+            except Exception as e:
+                print(f"Warning: Could not set {setting}: {e}")
+                
+        winreg.CloseKey(tcp_key)
+        return True
+        
+    def _home_state(self):
+        state = {
+            "service:Psched": {'start': 'auto', 'running': True},
+            f"process:{','.join(self.lol_process_name)}": 'high priority',
+            f"firewall:{self.qos_policy_name}_UDP": {
+                'dir': 'out', 'action': 'allow', 'protocol': 'UDP', 'localport': self.lol_ports, 'profile': 'any'
+            }
+        }
+        for setting, value in TCP_REGISTRY_SETTINGS:
+            state[f"registry:{setting}"] = value
+        for setting, value in TCP_GLOBAL_SETTINGS:
+            state[f"tcp_global:{setting}"] = value
+        return state
+        
+    def _standard_state(self):
+        return {f"qos_policy:{self.qos_policy_name}": {'protocol': 'UDP', 'localport': self.lol_ports, 'priority': 1}}
+        
+    def _load_snapshot(self):
+        if self.snapshot_path is None:
+            return dict(self._snapshot)
         try:
-            subprocess.run([
-                'netsh', 'advfirewall', 'firewall', 'delete', 'rule',
-                f'name="{self.qos_policy_name}_UDP"'
-            ], capture_output=True)
+            with open(self.snapshot_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
             
-            subprocess.run([
-                'netsh', 'advfirewall', 'firewall', 'add', 'rule',
-                f'name="{self.qos_policy_name}_UDP"',
-                'dir=out', 'action=allow', 'protocol=UDP',
-                f'localport={self.lol_ports}',
-                'profile=any'
-            ], check=True, capture_output=True)
+    def _save_snapshot(self, original):
+        # Values from an earlier apply are kept, so the snapshot always holds
+        # the state from before the first optimization
+        snapshot = self._load_snapshot()
+        for key, value in original.items():
+            snapshot.setdefault(key, value)
+        if self.snapshot_path is None:
+            self._snapshot = snapshot
+            return
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            with open(self.snapshot_path, 'w') as f:
+                json.dump(snapshot, f, indent=2)
+        except OSError as e:
+            print(f"Warning: Could not save QoS rollback snapshot: {e}")
             
-            print(f"Firewall rules configured for ports {self.lol_ports}")
-            return True
+    def _remove_snapshot(self):
+        self._snapshot = {}
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
             
-        except subprocess.CalledProcessError as e:
-            print(f"Warning: Could not configure firewall rules: {e}")
-            return False
-    
-    def _netsh_interface_optimization(self):
-        try:
-            optimizations = [
-                'netsh int tcp set global autotuninglevel=normal',
-                'netsh int tcp set global chimney=enabled',
-                'netsh int tcp set global rss=enabled',
-            ]
+    def _reconcile(self, desired, rollback=False):
+        current = self.backend.read(list(desired))
+        changes, unknown = diff_state(current, desired)
+        in_place = len(desired) - len(changes) - len(unknown)
+        self.last_diff = {'in_place': in_place, 'changed': [key for key, _, _ in changes], 'unknown': unknown}
+        
+        summary = f"{in_place} setting(s) already in place, {len(changes)} to change"
+        print(summary + (f", {len(unknown)} could not be read" if unknown else ""))
+        if changes and not rollback:
+            self._save_snapshot({key: current_value for key, current_value, _ in changes})
             
-            for cmd in optimizations:
-                try:
-                    subprocess.run(cmd, shell=True, check=True, capture_output=True)
-                except subprocess.CalledProcessError:
-                    continue
+        def build(plan):
+            for key, current_value, desired_value in changes:
+                self.backend.add_change_steps(plan, key, current_value, desired_value, KIND_GROUPS[key.split(':', 1)[0]])
+                
+        return self._run_plan(build, messages=not rollback, runner=self.backend.runner, unread=unknown)
+        
+    def _apply(self, desired, build):
+        if self.reconcile:
+            return self._reconcile(desired)
+        return self._run_plan(build)
+        
+    def _run_plan(self, build, messages=True, runner=None, unread=()):
+        plan = CommandPlan(runner or self.runner)
+        build(plan)
+        report = plan.run()
+        for key in unread:
+            # Not rewritten blindly, but not reported as in place either
+            step = Step(f"Read {key}", action=self.backend.read, group=KIND_GROUPS[key.split(':', 1)[0]])
+            report.results.append(StepResult(step, returncode=-1, output="Current state could not be read"))
+        self.last_report = report
+        if not report.results:
+            return report
             
-            print("Network interface optimizations applied")
-            return True
+        for group in report.groups() if messages else []:
+            success_message, failure_message = self.group_messages[group]
+            if report.group_ok(group):
+                print(success_message)
+                continue
+            failure = report.failures(group)[0]
+            reason = failure.output or ("skipped" if failure.skipped else f"exit code {failure.returncode}")
+            print(f"{failure_message}: {reason}")
             
-        except Exception as e:
-            print(f"Warning: Could not apply network optimizations: {e}")
-            return False
-    
+        print(f"Step timings ({report.elapsed_ms:.0f} ms total):")
+        print(report.describe())
+        return report
+        
     def enable_qos(self):
         print(f"Detected Windows Edition: {'Home' if self.is_windows_home else 'Pro/Enterprise'}")
         
         if not self.is_windows_home:
-            return self._enable_standard_qos()
+            report = self._apply(self._standard_state(), self._plan_standard_qos)
+            if report.group_ok('standard_policy'):
+                return True
+            print("Falling back to Windows Home compatible optimizations...")
         else:
             print("Applying Windows Home compatible optimizations...")
             
-            results = []
-            results.append(self._enable_qos_packet_scheduler())
-            results.append(self._set_network_adapter_qos())
-            results.append(self._set_process_priority())
-            results.append(self._configure_tcp_settings())
-            results.append(self._windows_firewall_priority())
-            results.append(self._netsh_interface_optimization())
-            
-            success_count = sum(results)
-            total_count = len(results)
+        report = self._apply(self._home_state(), self._plan_home_optimizations)
+        groups = report.groups()
+        success_count = sum(report.group_ok(group) for group in groups)
+        total_count = len(groups)
+        
+        if total_count == 0:
+            print("\nNo changes needed")
+            return True
             
-            print(f"\nApplied {success_count}/{total_count} optimizations successfully")
+        print(f"\nApplied {success_count}/{total_count} optimizations successfully")
+        
+        if success_count > 0:
+            print("Restart required for some changes to take effect")
+            return True
+        else:
+            print("No optimizations could be applied")
+            return False
             
-            if success_count > 0:
-                print("Restart required for some changes to take effect")
-                return True
-            else:
-                print("No optimizations could be applied")
-                return False
-    
     def disable_qos(self):
         try:
+            snapshot = self._load_snapshot() if self.reconcile else {}
+            if snapshot:
+                # Put back exactly what enable_qos changed, as it was before
+                report = self._reconcile(snapshot, rollback=True)
+                if report.failures():
+                    print("Warning: Could not restore every setting; the rollback snapshot was kept")
+                    return False
+                self._remove_snapshot()
+                print("QoS settings restored to their previous state")
+                return True
+                
+            plan = CommandPlan(self.runner)
             if not self.is_windows_home:
-                subprocess.run(
-                    f'netsh int qos delete policy name="{self.qos_policy_name}"',
-                    shell=True,
-                    capture_output=True
-                )
-            
-            subprocess.run([
-                'netsh', 'advfirewall', 'firewall', 'delete', 'rule',
-                f'name="{self.qos_policy_name}_UDP"'
-            ], capture_output=True)
+                plan.add("Delete QoS policy",
+                         f'netsh int qos delete policy name="{self.qos_policy_name}"',
+                         batch="netsh", check=False)
+            plan.add("Delete firewall rule",
+                     f'netsh advfirewall firewall delete rule name="{self.qos_policy_name}_UDP"',
+                     batch="netsh", check=False)
+            self.last_report = plan.run()
             
             print("QoS settings removed")
             return True
             
         except Exception as e:
             print(f"Warning: Could not fully remove QoS settings: {e}")
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,332 @@
+import copy
+import json
+
+from command_plan import FakeRunner
+
+try:
+    import winreg
+except ImportError:
+    winreg = None
+
+TCP_PARAMETERS_KEY = r"SYSTEM\CurrentControlSet\Services\Tcpip\Parameters"
+
+TCP_REGISTRY_SETTINGS = (
+    ('TcpAckFrequency', 1),
+    ('TCPNoDelay', 1),
+    ('TcpWindowSize', 65536),
+    ('EnableTCPChimney', 1),
+)
+
+TCP_GLOBAL_SETTINGS = (
+    ('autotuninglevel', 'normal'),
+    ('chimney', 'enabled'),
+    ('rss', 'enabled'),
+)
+
+# Plan group each kind of state belongs to, for the per-group messages
+KIND_GROUPS = {
+    'qos_policy': 'standard_policy',
+    'service': 'packet_scheduler',
+    'process': 'process_priority',
+    'registry': 'tcp_settings',
+    'firewall': 'firewall',
+    'tcp_global': 'interface'
+}
+
+_TCP_GLOBAL_LABELS = {
+    'receive window auto-tuning level': 'autotuninglevel',
+    'chimney offload state': 'chimney',
+    'receive-side scaling state': 'rss'
+}
+
+_START_TYPES = {
+    'AUTO_START': 'auto',
+    'DEMAND_START': 'demand',
+    'DISABLED': 'disabled',
+    'BOOT_START': 'boot',
+    'SYSTEM_START': 'system'
+}
+
+_UNKNOWN = object()
+
+
+def _ports(text):
+    ports = set()
+    for part in str(text).split(','):
+        low, _, high = part.strip().partition('-')
+        if low.isdigit():
+            ports.update(range(int(low), int(high or low) + 1))
+    return ports
+
+
+def _matches(current, desired):
+    # Desired dicts are checked field by field, so extra fields Windows
+    # reports don't count as drift
+    if current is None or desired is None:
+        return current is desired
+    if isinstance(desired, dict):
+        if not isinstance(current, dict):
+            return False
+        for field, value in desired.items():
+            if field == 'localport':
+                if _ports(current.get(field, '')) != _ports(value):
+                    return False
+            elif str(current.get(field, '')).lower() != str(value).lower():
+                return False
+        return True
+    return str(current).lower() == str(desired).lower()
+
+
+def diff_state(current, desired):
+    # Returns ([(key, current, desired)] to change, [keys that could not be read])
+    changes = []
+    unknown = []
+    for key, value in desired.items():
+        if key not in current:
+            unknown.append(key)
+        elif not _matches(current[key], value):
+            changes.append((key, current[key], value))
+    return changes, unknown
+
+
+def _fields(output):
+    fields = {}
+    for line in output.splitlines():
+        label, separator, value = line.partition(':')
+        if separator:
+            fields.setdefault(label.strip().lower(), value.strip())
+    return fields
+
+
+def _format_properties(properties):
+    return " ".join(f"{name}={value}" for name, value in properties.items())
+
+
+class WindowsStateBackend:
+    # Reads the live state with one batched script plus in-process registry
+    # reads, and turns each change into plan steps. Keys are "kind:name".
+    # A key that cannot be read is left out of the result, so it is
+    # reported as unknown rather than rewritten blindly.
+    def __init__(self, runner):
+        self.runner = runner
+
+    def _read_commands(self, key):
+        kind, name = key.split(':', 1)
+        if kind == 'firewall':
+            return [f'netsh advfirewall firewall show rule name="{name}" verbose']
+        if kind == 'qos_policy':
+            return [f'netsh int qos show policy name="{name}"']
+        if kind == 'service':
+            return [f'sc qc {name}', f'sc query {name}']
+        if kind == 'tcp_global':
+            return ['netsh int tcp show global']
+        if kind == 'process':
+            names = " or ".join(f"name='{process}'" for process in name.split(','))
+            return [f'wmic process where "{names}" get Priority /value']
+        return []
+
+    def read(self, keys):
+        commands = []
+        for key in keys:
+            for command in self._read_commands(key):
+                if command not in commands:
+                    commands.append(command)
+
+        outputs = {}
+        if commands:
+            try:
+                results = self.runner.run_script(commands, [[] for _ in commands])
+                outputs = {command: (returncode, output) for command, (returncode, output, _) in zip(commands, results)}
+            except OSError:
+                outputs = {}
+
+        state = {}
+        for key in keys:
+            kind, name = key.split(':', 1)
+            try:
+                if kind == 'registry':
+                    state[key] = self._read_registry(name)
+                    continue
+                read = [outputs.get(command) for command in self._read_commands(key)]
+                if any(result is None for result in read):
+                    continue
+                value = self._parse(kind, name, read)
+                if value is not _UNKNOWN:
+                    state[key] = value
+            except OSError:
+                continue
+        return state
+
+    def _parse(self, kind, name, read):
+        returncode, output = read[0]
+        if kind in ('firewall', 'qos_policy'):
+            if returncode != 0:
+                return None
+            fields = _fields(output)
+            if kind == 'qos_policy':
+                return {field: value for field, value in fields.items() if field in ('protocol', 'localport', 'priority')}
+            profiles = fields.get('profiles', '').lower()
+            return {
+                'dir': fields.get('direction', '').lower(),
+                'action': fields.get('action', '').lower(),
+                'protocol': fields.get('protocol', '').lower(),
+                'localport': fields.get('localport', ''),
+                'profile': 'any' if profiles in ('', 'domain,private,public') else profiles
+            }
+
+        if kind == 'service':
+            if returncode != 0:
+                return _UNKNOWN
+            start_type = _fields(output).get('start_type', '')
+            start = next((short for long_name, short in _START_TYPES.items() if long_name in start_type), None)
+            if start is None:
+                return _UNKNOWN
+            return {'start': start, 'running': 'RUNNING' in _fields(read[1][1]).get('state', '')}
+
+        if kind == 'tcp_global':
+            for label, value in _fields(output).items():
+                if _TCP_GLOBAL_LABELS.get(label) == name:
+                    return value.lower()
+            # Settings this Windows build no longer has (chimney) are not drift
+            return _UNKNOWN
+
+        if kind == 'process':
+            if returncode != 0:
+                return _UNKNOWN
+            # wmic reports base priority 13 for the high priority class. With
+            # no League process running there is nothing to raise.
+            priorities = {line.split('=', 1)[1].strip() for line in output.splitlines()
+                          if line.strip().lower().startswith('priority=')}
+            return 'high priority' if priorities <= {'13'} else 'normal'
+
+        return _UNKNOWN
+
+    def _read_registry(self, name):
+        if winreg is None:
+            raise OSError("Windows registry not available")
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, TCP_PARAMETERS_KEY, 0, winreg.KEY_READ) as key:
+            try:
+                return winreg.QueryValueEx(key, name)[0]
+            except FileNotFoundError:
+                return None
+
+    def _write_registry(self, name, value):
+        if winreg is None:
+            raise OSError("Windows registry not available")
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, TCP_PARAMETERS_KEY, 0, winreg.KEY_SET_VALUE) as key:
+            if value is None:
+                try:
+                    winreg.DeleteValue(key, name)
+                except FileNotFoundError:
+                    # Already absent, which is the state being restored
+                    pass
+            else:
+                winreg.SetValueEx(key, name, 0, winreg.REG_DWORD, value)
+        return True
+
+    def add_change_steps(self, plan, key, current, desired, group):
+        kind, name = key.split(':', 1)
+
+        if kind == 'registry':
+            plan.add(f"{'Remove' if desired is None else 'Set'} registry {name}",
+                     action=lambda: self._write_registry(name, desired), group=group)
+
+        elif kind == 'firewall':
+            if desired is None:
+                command = f'netsh advfirewall firewall delete rule name="{name}"'
+            elif current is None:
+                command = f'netsh advfirewall firewall add rule name="{name}" {_format_properties(desired)}'
+            else:
+                # Changed in place, so the rule never disappears while it is updated
+                command = f'netsh advfirewall firewall set rule name="{name}" new {_format_properties(desired)}'
+            plan.add(f"Update firewall rule {name}", command, batch="netsh", group=group)
+
+        elif kind == 'qos_policy':
+            if current is not None:
+                plan.add(f"Remove QoS policy {name}", f'netsh int qos delete policy name="{name}"',
+                         batch="netsh", group=group)
+            if desired is not None:
+                plan.add(f"Add QoS policy {name}",
+                         f'netsh int qos add policy name="{name}" {_format_properties(desired)}',
+                         batch="netsh", group=group)
+
+        elif desired is None:
+            # Services, TCP globals and priorities always have some value;
+            # there is nothing to remove
+            return
+
+        elif kind == 'service':
+            current = current or {}
+            after = []
+            if current.get('start') != desired['start']:
+                plan.add(f"Set {name} start type to {desired['start']}", f'sc config {name} start= {desired["start"]}',
+                         batch="sc", group=group)
+                after = [f"Set {name} start type to {desired['start']}"]
+            if current.get('running') != desired['running']:
+                verb = "start" if desired['running'] else "stop"
+                plan.add(f"{verb.capitalize()} {name}", f'sc {verb} {name}', batch="sc", after=after, group=group)
+
+        elif kind == 'tcp_global':
+            plan.add(f"Set TCP global {name}={desired}", f'netsh int tcp set global {name}={desired}',
+                     batch="netsh", group=group)
+
+        elif kind == 'process':
+            names = " or ".join(f"name='{process}'" for process in name.split(','))
+            plan.add("Set League process priority", f'wmic process where "{names}" call setpriority "{desired}"',
+                     check=False, group=group)
+
+
+class _FakeStateRunner(FakeRunner):
+    # Applies the fake-set / fake-delete commands that FakeStateBackend steps
+    # are made of, after FakeRunner (or the caller's `runner`, when one was
+    # given) has decided their exit codes
+    def __init__(self, backend, delay=0.0, returncodes=None, runner=None):
+        super().__init__(returncodes=returncodes, delay=delay)
+        self.backend = backend
+        self.runner = runner
+
+    def _apply(self, command, returncode):
+        verb, _, payload = command.partition(' ')
+        if returncode != 0:
+            return
+        if verb == 'fake-set':
+            key, value = json.loads(payload)
+            self.backend.state[key] = value
+        elif verb == 'fake-delete':
+            self.backend.state.pop(json.loads(payload), None)
+
+    def run_command(self, command):
+        result = self.runner.run_command(command) if self.runner else super().run_command(command)
+        self._apply(command, result[0])
+        return result
+
+    def run_script(self, commands, requires):
+        results = self.runner.run_script(commands, requires) if self.runner else super().run_script(commands, requires)
+        for command, (returncode, _, _) in zip(commands, results):
+            self._apply(command, returncode)
+        return results
+
+    def call(self, action):
+        return self.runner.call(action) if self.runner else super().call(action)
+
+
+class FakeStateBackend:
+    # Machine state held in a dict, so the diff, snapshot and rollback logic
+    # runs off Windows. Its runner applies changes through the same batched
+    # plan path as real commands; `returncodes` can make chosen keys fail,
+    # or a FakeRunner passed as `runner` decides every exit code and records
+    # the invocations.
+    def __init__(self, state=None, delay=0.0, returncodes=None, runner=None):
+        self.state = copy.deepcopy(dict(state or {}))
+        self.runner = _FakeStateRunner(self, delay, returncodes, runner)
+        self.reads = 0
+
+    def read(self, keys):
+        self.reads += 1
+        return {key: copy.deepcopy(self.state.get(key)) for key in keys}
+
+    def add_change_steps(self, plan, key, current, desired, group):
+        if desired is None:
+            plan.add(f"Remove {key}", f"fake-delete {json.dumps(key)}", batch="fake", group=group)
+        else:
+            plan.add(f"Set {key}", f"fake-set {json.dumps([key, desired])}", batch="fake", group=group)
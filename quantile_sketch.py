@@ -0,0 +1,109 @@
+import math
+
+PERCENTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("p999", 0.999))
+
+
+class QuantileSketch:
+    # DDSketch-style log-bucketed histogram: every quantile it returns is within
+    # relative_accuracy of a real sample, and sketches built with the same
+    # accuracy merge exactly by adding bucket counts
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+        if value <= 0:
+            self.zero_count += 1
+            return
+
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self._collapse_lowest()
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+        while len(self.buckets) > self.max_buckets:
+            self._collapse_lowest()
+        return self
+
+    def _collapse_lowest(self):
+        # Bounded memory costs accuracy at the fast end, which matters least
+        # for tail latency
+        lowest_count = self.buckets.pop(min(self.buckets))
+        self.buckets[min(self.buckets)] += lowest_count
+
+    def quantiles(self, qs):
+        # The q quantile is the sample at rank ceil(q * (count - 1)), counting
+        # from 0, so p95 of [10, 11, 12] is 12. Rounding the rank down instead
+        # would report the lower neighbour and understate the tail.
+        if not self.count:
+            return [0.0 for _ in qs]
+
+        results = [0.0] * len(qs)
+        indexes = sorted(self.buckets)
+        position = 0
+        seen = self.zero_count
+        for slot, q in sorted(enumerate(qs), key=lambda item: item[1]):
+            rank = math.ceil(q * (self.count - 1))
+            if rank < self.zero_count:
+                continue
+            while position < len(indexes) and seen + self.buckets[indexes[position]] <= rank:
+                seen += self.buckets[indexes[position]]
+                position += 1
+            if position == len(indexes):
+                results[slot] = self.max
+                continue
+            value = 2 * self._gamma ** indexes[position] / (self._gamma + 1)
+            results[slot] = min(max(value, self.min), self.max)
+        return results
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def percentiles(self):
+        values = self.quantiles([q for _, q in PERCENTILES])
+        return {name: round(value, 1) for (name, _), value in zip(PERCENTILES, values)}
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'max_buckets': self.max_buckets,
+            'buckets': {str(index): count for index, count in self.buckets.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'min': self.min if self.count else None,
+            'max': self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'], data['max_buckets'])
+        sketch.buckets = {int(index): count for index, count in data['buckets'].items()}
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        if data['min'] is not None:
+            sketch.min = data['min']
+        sketch.max = data['max']
+        return sketch
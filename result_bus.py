@@ -0,0 +1,198 @@
+import collections
+import threading
+import time
+
+OVERFLOW_POLICIES = ("drop-oldest", "coalesce-latest", "block")
+
+# A handler that fails every cycle is reported at most this often
+ERROR_REPORT_INTERVAL = 30.0
+
+
+def _print_error(name, error, suppressed):
+    more = f" ({suppressed} more since the last report)" if suppressed else ""
+    print(f"Warning: {name} consumer failed: {error}{more}")
+
+
+class Subscription:
+    # A bounded queue drained by its own thread, so a slow handler only ever
+    # backs up its own queue. When the queue is full:
+    #   drop-oldest      evicts the oldest pending event
+    #   coalesce-latest  keeps only the newest pending event per key
+    #   block            waits up to block_timeout for room, then drops the
+    #                    new event, so the publisher is never held for long
+    def __init__(self, name, handler, topics=None, maxsize=64, policy="drop-oldest", block_timeout=0.05,
+                 on_error=_print_error):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+
+        self.name = name
+        self.handler = handler
+        self.topics = set(topics) if topics else None
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.on_error = on_error
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_depth = 0
+        self._last_error_report = None
+        self._unreported_errors = 0
+
+        self._pending = collections.OrderedDict()
+        self._sequence = 0
+        self._busy = False
+        self._closed = False
+        self._changed = threading.Condition()
+        self._thread = threading.Thread(target=self._dispatch, name=f"bus-{name}", daemon=True)
+        self._thread.start()
+
+    def wants(self, topic):
+        return self.topics is None or topic in self.topics
+
+    def offer(self, topic, payload, key=None):
+        with self._changed:
+            if self._closed:
+                return False
+            self.published += 1
+
+            if self.policy == "coalesce-latest":
+                slot = (topic, key)
+                if slot in self._pending:
+                    self._pending[slot] = payload
+                    self._pending.move_to_end(slot)
+                    self.coalesced += 1
+                    return True
+            else:
+                self._sequence += 1
+                slot = (topic, self._sequence)
+
+            if len(self._pending) >= self.maxsize:
+                if self.policy == "block":
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._pending) >= self.maxsize and not self._closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.dropped += 1
+                            return False
+                        self._changed.wait(remaining)
+                else:
+                    self._pending.popitem(last=False)
+                    self.dropped += 1
+
+            self._pending[slot] = payload
+            self.max_depth = max(self.max_depth, len(self._pending))
+            self._changed.notify_all()
+            return True
+
+    def _dispatch(self):
+        while True:
+            with self._changed:
+                while not self._pending and not self._closed:
+                    self._changed.wait()
+                if not self._pending:
+                    return
+                (topic, _), payload = self._pending.popitem(last=False)
+                self._busy = True
+                self._changed.notify_all()
+
+            try:
+                self.handler(topic, payload)
+            except Exception as e:
+                self.errors += 1
+                self._report_error(e)
+
+            with self._changed:
+                self._busy = False
+                self.delivered += 1
+                self._changed.notify_all()
+
+    def _report_error(self, error):
+        now = time.monotonic()
+        if self._last_error_report is not None and now - self._last_error_report < ERROR_REPORT_INTERVAL:
+            self._unreported_errors += 1
+            return
+        suppressed, self._unreported_errors = self._unreported_errors, 0
+        self._last_error_report = now
+        try:
+            self.on_error(self.name, error, suppressed)
+        except Exception:
+            pass
+
+    def drain(self, timeout=2.0):
+        # Waits until everything queued so far has been handled
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self._pending or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def close(self, drain=True, timeout=2.0):
+        if drain:
+            self.drain(timeout)
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+        self._thread.join(timeout=timeout)
+
+    def metrics(self):
+        with self._changed:
+            return {
+                'policy': self.policy,
+                'depth': len(self._pending),
+                'max_depth': self.max_depth,
+                'maxsize': self.maxsize,
+                'published': self.published,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'errors': self.errors
+            }
+
+
+class ResultBus:
+    # on_error(name, error, suppressed) reports handler exceptions, rate
+    # limited per subscription; they are also counted in metrics()
+    def __init__(self, on_error=_print_error):
+        self.on_error = on_error
+        self._subscriptions = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, handler, topics=None, name=None, maxsize=64, policy="drop-oldest", block_timeout=0.05):
+        # handler(topic, payload) runs on the subscription's own thread
+        with self._lock:
+            name = name or f"subscriber-{len(self._subscriptions)}"
+            subscription = Subscription(name, handler, topics, maxsize, policy, block_timeout, self.on_error)
+            self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription, drain=False):
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+        subscription.close(drain=drain)
+
+    def publish(self, topic, payload, key=None):
+        # Copy-on-write subscriber list: publishing never takes the bus lock
+        for subscription in self._subscriptions:
+            if subscription.wants(topic):
+                subscription.offer(topic, payload, key)
+
+    def drain(self, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        return all(subscription.drain(max(deadline - time.monotonic(), 0))
+                   for subscription in self._subscriptions)
+
+    def close(self, timeout=2.0):
+        with self._lock:
+            subscriptions, self._subscriptions = self._subscriptions, []
+        for subscription in subscriptions:
+            subscription.close(timeout=timeout)
+
+    def metrics(self):
+        return {subscription.name: subscription.metrics() for subscription in self._subscriptions}
@@ -0,0 +1,90 @@
+import heapq
+import threading
+import time
+
+
+class ProbeScheduler:
+    # Deadlines sit on a fixed monotonic grid (origin + phase + k * interval),
+    # so the time a probe cycle takes never pushes later cycles back
+    def __init__(self, interval, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self.missed_deadlines = 0
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._heap = []
+        self._intervals = {}
+        self._stopped = False
+
+    def set_keys(self, keys, interval=None):
+        # Keys get evenly spread phase offsets within one interval
+        with self._lock:
+            if interval:
+                self.interval = interval
+                self._intervals.clear()
+            self._intervals = {key: value for key, value in self._intervals.items() if key in keys}
+            now = self.clock()
+            slot = self.interval / len(keys) if keys else 0
+            self._heap = [(now + order * slot, order, key) for order, key in enumerate(keys)]
+            heapq.heapify(self._heap)
+        self._wake.set()
+
+    def interval_for(self, key):
+        return self._intervals.get(key, self.interval)
+
+    def set_interval(self, key, interval):
+        # Moves one key onto its own grid; a shorter interval pulls its next
+        # deadline in so a speed-up takes effect without waiting a full tick
+        with self._lock:
+            previous = self._intervals.get(key, self.interval)
+            if interval == self.interval:
+                self._intervals.pop(key, None)
+            else:
+                self._intervals[key] = interval
+
+            for index, (deadline, order, entry_key) in enumerate(self._heap):
+                if entry_key == key:
+                    self._heap[index] = (deadline - previous + interval, order, key)
+                    heapq.heapify(self._heap)
+                    break
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    def wait(self):
+        # Blocks until at least one key is due and returns [(key, deadline)],
+        # or returns [] right away once stopped
+        while not self._stopped:
+            with self._lock:
+                timeout = None
+                if self._heap:
+                    now = self.clock()
+                    if self._heap[0][0] <= now:
+                        return self._pop_due(now)
+                    timeout = self._heap[0][0] - now
+
+            self._wake.wait(timeout)
+            self._wake.clear()
+        return []
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, order, key = heapq.heappop(self._heap)
+            interval = self._intervals.get(key, self.interval)
+            next_deadline = deadline + interval
+            if next_deadline <= now:
+                # Whole ticks already passed: skip them instead of firing a burst
+                missed = int((now - deadline) // interval)
+                self.missed_deadlines += missed
+                next_deadline = deadline + (missed + 1) * interval
+            heapq.heappush(self._heap, (next_deadline, order, key))
+            due.append((key, deadline))
+        return due
@@ -0,0 +1,151 @@
+import asyncio
+import itertools
+import socket
+import struct
+import time
+from urllib.parse import urlsplit
+
+from probe_result import ErrorCode, ProbeResult
+
+ECHO_PACKET = struct.Struct('!2sIQ')
+ECHO_MAGIC = b'LP'
+
+
+def split_target(url, default_port, web_ports=True):
+    # web_ports maps http/https URLs without a port to 80/443. UDP targets
+    # pass False: RIOT_ENDPOINTS are https URLs, but echoes go to default_port.
+    parts = urlsplit(url if "://" in url else f"//{url}")
+    if parts.port:
+        return parts.hostname, parts.port
+    if not web_ports:
+        return parts.hostname, default_port
+    if parts.scheme == "https":
+        return parts.hostname, 443
+    if parts.scheme == "http":
+        return parts.hostname, 80
+    return parts.hostname, default_port
+
+
+def socket_result(url, protocol, latency_ms):
+    return ProbeResult(url, round(latency_ms, 2), 0, protocol=protocol)
+
+
+def socket_error_result(url, protocol, error):
+    return ProbeResult.failure(url, error, protocol=protocol)
+
+
+def tcp_connect_ping(url, timeout=3, default_port=443):
+    # Only the three-way handshake is timed: no TLS, no request, no server work
+    host, port = split_target(url, default_port)
+    try:
+        family, socktype, proto, _, address = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0]
+        sock = socket.socket(family, socktype, proto)
+        try:
+            sock.settimeout(timeout)
+            start_time = time.perf_counter()
+            sock.connect(address)
+            latency = (time.perf_counter() - start_time) * 1000
+        finally:
+            sock.close()
+        return socket_result(url, "tcp", latency)
+
+    except socket.timeout:
+        return socket_error_result(url, "tcp", ErrorCode.CONNECT_TIMEOUT)
+    except OSError:
+        return socket_error_result(url, "tcp", ErrorCode.CONNECTION_FAILED)
+
+
+async def tcp_connect_ping_async(url, timeout=3, default_port=443):
+    host, port = split_target(url, default_port)
+    loop = asyncio.get_running_loop()
+    try:
+        address = (await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM))[0][4]
+        start_time = time.perf_counter()
+        _, writer = await asyncio.wait_for(asyncio.open_connection(address[0], address[1]), timeout)
+        latency = (time.perf_counter() - start_time) * 1000
+        writer.close()
+        return socket_result(url, "tcp", latency)
+
+    except asyncio.TimeoutError:
+        return socket_error_result(url, "tcp", ErrorCode.CONNECT_TIMEOUT)
+    except OSError:
+        return socket_error_result(url, "tcp", ErrorCode.CONNECTION_FAILED)
+
+
+class UdpEchoProbe:
+    # One connected datagram socket per target, reused across probes. Each
+    # probe carries a sequence number so late replies to earlier probes are
+    # recognised and discarded instead of being mistaken for this one.
+    def __init__(self, url, default_port=5000):
+        self.url = url
+        self.address = split_target(url, default_port, web_ports=False)
+        self._sequence = itertools.count(1)
+        self._sock = None
+
+    def _socket(self):
+        if self._sock is None:
+            family, socktype, proto, _, address = socket.getaddrinfo(
+                self.address[0], self.address[1], type=socket.SOCK_DGRAM
+            )[0]
+            self._sock = socket.socket(family, socktype, proto)
+            self._sock.connect(address)
+        return self._sock
+
+    def ping(self, timeout=3):
+        sequence = next(self._sequence)
+        try:
+            sock = self._socket()
+            sock.settimeout(timeout)
+            start_time = time.perf_counter()
+            deadline = start_time + timeout
+            sock.send(ECHO_PACKET.pack(ECHO_MAGIC, sequence, time.perf_counter_ns()))
+
+            while True:
+                data = sock.recv(ECHO_PACKET.size)
+                if self._matches(data, sequence):
+                    return socket_result(self.url, "udp", (time.perf_counter() - start_time) * 1000)
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise socket.timeout()
+                sock.settimeout(remaining)
+
+        except socket.timeout:
+            return socket_error_result(self.url, "udp", ErrorCode.ECHO_TIMEOUT)
+        except OSError:
+            self.close()
+            return socket_error_result(self.url, "udp", ErrorCode.CONNECTION_FAILED)
+
+    async def ping_async(self, timeout=3):
+        loop = asyncio.get_running_loop()
+        sequence = next(self._sequence)
+        try:
+            sock = self._socket()
+            sock.setblocking(False)
+            start_time = time.perf_counter()
+            await loop.sock_sendall(sock, ECHO_PACKET.pack(ECHO_MAGIC, sequence, time.perf_counter_ns()))
+
+            async def receive():
+                while True:
+                    data = await loop.sock_recv(sock, ECHO_PACKET.size)
+                    if self._matches(data, sequence):
+                        return
+
+            await asyncio.wait_for(receive(), timeout)
+            return socket_result(self.url, "udp", (time.perf_counter() - start_time) * 1000)
+
+        except asyncio.TimeoutError:
+            return socket_error_result(self.url, "udp", ErrorCode.ECHO_TIMEOUT)
+        except OSError:
+            self.close()
+            return socket_error_result(self.url, "udp", ErrorCode.CONNECTION_FAILED)
+
+    def _matches(self, data, sequence):
+        if len(data) != ECHO_PACKET.size:
+            return False
+        magic, reply_sequence, _ = ECHO_PACKET.unpack(data)
+        return magic == ECHO_MAGIC and reply_sequence == sequence
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
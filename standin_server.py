@@ -0,0 +1,289 @@
+import heapq
+import os
+import random
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def generate_self_signed_cert(directory=None, hostname="localhost"):
+    directory = directory or tempfile.mkdtemp(prefix="standin_")
+    certfile = os.path.join(directory, "standin.crt")
+    keyfile = os.path.join(directory, "standin.key")
+
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+        '-keyout', keyfile, '-out', certfile, '-days', '1',
+        '-subj', f'/CN={hostname}',
+        '-addext', f'subjectAltName=DNS:{hostname},IP:127.0.0.1'
+    ], check=True, capture_output=True)
+
+    return certfile, keyfile
+
+
+class _DelayedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, the body
+    # waits for the client's delayed ACK and adds ~40 ms to a timed GET
+    disable_nagle_algorithm = True
+
+    def _respond(self, send_body):
+        if self.server.drops_request():
+            # A lost or blackholed request never gets an answer; the client
+            # sees a timeout, just as it would on a real network
+            self.close_connection = True
+            self.server.hold(self.connection)
+            return
+        time.sleep(self.server.reply_delay())
+
+        body = b'{"status":"ok"}'
+        self.send_response(self.server.status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandinHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    # server_delay plus up to `jitter` seconds of random extra delay is added
+    # to every response. A `loss` fraction of requests, or every request while
+    # `blackhole` is set, is held unanswered until the client gives up.
+    def __init__(self, host="127.0.0.1", port=0, server_delay=0.0, tls_delay=0.0,
+                 status_code=200, certfile=None, keyfile=None, jitter=0.0, loss=0.0,
+                 blackhole=False, seed=None):
+        super().__init__((host, port), _DelayedHandler)
+        self.server_delay = server_delay
+        self.tls_delay = tls_delay
+        self.status_code = status_code
+        self.jitter = jitter
+        self.loss = loss
+        self.blackhole = blackhole
+        self.random = random.Random(seed)
+        self._stopped = threading.Event()
+
+        self.ssl_context = None
+        if certfile:
+            self.ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            self.ssl_context.load_cert_chain(certfile, keyfile)
+
+        self._thread = None
+
+    @property
+    def url(self):
+        scheme = "https" if self.ssl_context else "http"
+        host, port = self.server_address[:2]
+        return f"{scheme}://{host}:{port}/"
+
+    def reply_delay(self):
+        if self.jitter:
+            return self.server_delay + self.random.uniform(0, self.jitter)
+        return self.server_delay
+
+    def drops_request(self):
+        return self.blackhole or (self.loss and self.random.random() < self.loss)
+
+    def hold(self, connection):
+        # Reads and discards until the client closes or the server stops
+        connection.settimeout(0.2)
+        while not self._stopped.is_set():
+            try:
+                if not connection.recv(4096):
+                    return
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+
+    def finish_request(self, request, client_address):
+        # The handshake runs on the per-connection thread so that an injected
+        # TLS delay never holds up the accept loop
+        if self.ssl_context:
+            time.sleep(self.tls_delay)
+            try:
+                request = self.ssl_context.wrap_socket(request, server_side=True)
+            except (ssl.SSLError, OSError):
+                return
+
+        try:
+            self.RequestHandlerClass(request, client_address, self)
+        finally:
+            if self.ssl_context:
+                request.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class StandinTCPServer:
+    # Accepts and immediately closes connections; the kernel completes the
+    # handshake, which is all a TCP connect probe times. That also means the
+    # handshake cannot be delayed from user space, only blackholed: while
+    # `blackhole` is set nothing is accepted, the one-slot backlog fills and
+    # the kernel drops further SYNs, so connects time out.
+    def __init__(self, host="127.0.0.1", port=0, blackhole=False):
+        self.sock = socket.create_server((host, port), backlog=1)
+        self.sock.settimeout(0.2)
+        self.blackhole = blackhole
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.sock.getsockname()[:2]
+        return f"tcp://{host}:{port}"
+
+    def _serve(self):
+        while not self._stopped.is_set():
+            if self.blackhole:
+                self._stopped.wait(0.2)
+                continue
+            try:
+                connection, _ = self.sock.accept()
+                connection.close()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+        self.sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class StandinUDPEchoServer:
+    # Echoes every datagram back after `delay` seconds plus up to `jitter`
+    # seconds of random extra delay, dropping a `loss` fraction of them and
+    # sending a `duplicate` fraction twice. Delayed replies go through a heap
+    # drained by a single sender thread, so high packet rates need no thread
+    # per datagram. Jitter larger than the send spacing reorders replies.
+    # While `blackhole` is set nothing is echoed.
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, loss=0.0, seed=None, jitter=0.0, duplicate=0.0,
+                 blackhole=False):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.2)
+        self.delay = delay
+        self.loss = loss
+        self.jitter = jitter
+        self.duplicate = duplicate
+        self.blackhole = blackhole
+        self.random = random.Random(seed)
+        self.received = 0
+
+        self._queue = []
+        self._queue_ready = threading.Condition()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    @property
+    def url(self):
+        host, port = self.sock.getsockname()[:2]
+        return f"udp://{host}:{port}"
+
+    def reply_delay(self):
+        if self.jitter:
+            return self.delay + self.random.uniform(0, self.jitter)
+        return self.delay
+
+    def _receive(self):
+        order = 0
+        while not self._stopped.is_set():
+            try:
+                data, address = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            self.received += 1
+            if self.blackhole or (self.loss and self.random.random() < self.loss):
+                continue
+            copies = 2 if self.duplicate and self.random.random() < self.duplicate else 1
+            with self._queue_ready:
+                for _ in range(copies):
+                    order += 1
+                    heapq.heappush(self._queue, (time.monotonic() + self.reply_delay(), order, data, address))
+                self._queue_ready.notify()
+
+    def _send(self):
+        while not self._stopped.is_set():
+            with self._queue_ready:
+                if not self._queue:
+                    self._queue_ready.wait(0.2)
+                    continue
+                due = self._queue[0][0] - time.monotonic()
+                if due > 0:
+                    self._queue_ready.wait(due)
+                    continue
+                _, _, data, address = heapq.heappop(self._queue)
+            try:
+                self.sock.sendto(data, address)
+            except OSError:
+                pass
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._receive, daemon=True),
+            threading.Thread(target=self._send, daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._queue_ready:
+            self._queue_ready.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self.sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,71 @@
+import threading
+import time
+
+
+class StatusViewModel:
+    # Collects state changes from any thread and renders them on the Tk thread
+    # in one pass, at most refresh_rate times per second
+    def __init__(self, root, ping_var, ping_label, loss_var, avg_var, jitter_var,
+                 rtt_var=None, server_var=None, refresh_rate=10):
+        self.root = root
+        self.ping_var = ping_var
+        self.ping_label = ping_label
+        self.loss_var = loss_var
+        self.avg_var = avg_var
+        self.jitter_var = jitter_var
+        self.rtt_var = rtt_var
+        self.server_var = server_var
+        self.min_interval = 1.0 / refresh_rate
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._scheduled = False
+        self._last_render = 0.0
+        self._ping_color = None
+
+    def update(self, **changes):
+        with self._lock:
+            self._pending.update(changes)
+            if self._scheduled:
+                return
+            self._scheduled = True
+            delay = self._last_render + self.min_interval - time.monotonic()
+
+        self.root.after(max(int(delay * 1000), 0), self._render)
+
+    def _render(self):
+        with self._lock:
+            state = self._pending
+            self._pending = {}
+            self._scheduled = False
+            self._last_render = time.monotonic()
+
+        if 'ping' in state:
+            self._render_ping(state['ping'])
+        if 'packet_loss' in state:
+            self.loss_var.set(f"{state['packet_loss']:.1f}%")
+        if 'stats' in state:
+            self._render_stats(state['stats'])
+
+    def _render_ping(self, ping):
+        if ping is None:
+            self.ping_var.set("Timeout")
+            return
+
+        self.ping_var.set(f"{ping:.0f} ms")
+        if ping < 50:
+            color = 'green'
+        elif ping < 100:
+            color = 'orange'
+        else:
+            color = 'red'
+        if color != self._ping_color:
+            self.ping_label.config(foreground=color)
+            self._ping_color = color
+
+    def _render_stats(self, stats):
+        self.avg_var.set(f"{stats.get('recent_average', 0):.1f} ms")
+        self.jitter_var.set(f"{stats.get('jitter', 0):.1f} ms")
+        if 'network_rtt' in stats and self.rtt_var is not None:
+            self.rtt_var.set(f"{stats['network_rtt']:.1f} ms")
+            self.server_var.set(f"{stats['server_time']:.1f} ms")
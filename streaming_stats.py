@@ -0,0 +1,95 @@
+import math
+from array import array
+
+
+class Welford:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
+
+
+class Ewma:
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.value = None
+
+    def add(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+
+
+class RollingWindow:
+    # Fixed-size window with a sliding Welford update: adding a sample evicts
+    # the oldest one, and mean/stdev never rescan the window
+    def __init__(self, size):
+        self.size = size
+        self._values = array('d')
+        self._next = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        if len(self._values) < self.size:
+            return iter(self._values)
+        return iter(self._values[self._next:] + self._values[:self._next])
+
+    def add(self, value):
+        count = len(self._values)
+        if count < self.size:
+            self._values.append(value)
+            count += 1
+            delta = value - self.mean
+            self.mean += delta / count
+            self._m2 += delta * (value - self.mean)
+        else:
+            evicted = self._values[self._next]
+            self._values[self._next] = value
+            self._next = (self._next + 1) % self.size
+            old_mean = self.mean
+            self.mean += (value - evicted) / count
+            self._m2 += (value - evicted) * (value - self.mean + evicted - old_mean)
+            self._m2 = max(self._m2, 0.0)
+
+    def extend(self, values):
+        for value in values:
+            self.add(value)
+
+    @property
+    def variance(self):
+        count = len(self._values)
+        return self._m2 / (count - 1) if count > 1 else 0.0
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
+
+    def latest(self, limit):
+        count = len(self._values)
+        limit = max(0, min(limit, count))
+        if count < self.size:
+            return self._values[count - limit:].tolist()
+
+        start = (self._next - limit) % self.size
+        if start + limit <= self.size:
+            return self._values[start:start + limit].tolist()
+        return (self._values[start:] + self._values[:self._next]).tolist()
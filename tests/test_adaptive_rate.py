@@ -0,0 +1,27 @@
+from adaptive_rate import AdaptiveRateController
+from probe_result import CycleBatch, ProbeResult
+
+
+def _batch(probes, latency=30.0):
+    return CycleBatch([ProbeResult(f"https://example.com/{index}", latency=latency, status=200)
+                       for index in range(probes)])
+
+
+def test_budget_stretches_keys_past_the_floor():
+    controller = AdaptiveRateController(5, floor_interval=30.0, budget=10.0)
+    keys = ["NA", "EUW", "KR"]
+    intervals = {}
+    for _ in range(3):
+        for key in keys:
+            intervals[key] = controller.observe(key, _batch(200))
+
+    # 200 probes every 30 s in each of three regions would be 20 probes/s
+    assert all(interval > 30.0 for interval in intervals.values())
+    assert sum(200 / interval for interval in intervals.values()) <= 10.0 + 1e-9
+
+
+def test_floor_is_kept_when_the_budget_allows():
+    controller = AdaptiveRateController(5, floor_interval=30.0, budget=10.0)
+    for _ in range(20):
+        interval = controller.observe("NA", _batch(10))
+    assert interval == 30.0
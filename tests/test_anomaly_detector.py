@@ -0,0 +1,28 @@
+from anomaly_detector import AnomalyDetector
+
+SHARED = "https://europe.api.riotgames.com"
+
+
+def test_regions_sharing_an_endpoint_keep_separate_state():
+    detector = AnomalyDetector(warmup=5)
+    events = []
+    detector.subscribe(events.append)
+
+    # A second region at its own steady level is not a shift from the first
+    for _ in range(50):
+        detector.add("EUW", SHARED, 30.0)
+    for _ in range(50):
+        detector.add("EUNE", SHARED, 90.0)
+    assert events == []
+
+
+def test_loss_burst_counts_failures_per_region():
+    detector = AnomalyDetector(burst_failures=3)
+    events = []
+    detector.subscribe(events.append)
+
+    for _ in range(3):
+        detector.add("EUW", SHARED, None)
+        detector.add("EUNE", SHARED, 40.0)
+
+    assert [(event['type'], event['region']) for event in events] == [('loss_burst', 'EUW')]
@@ -0,0 +1,16 @@
+from async_probe import AsyncProbeEngine
+from probe_result import ErrorCode
+from standin_server import StandinTCPServer
+
+
+def test_one_bad_target_does_not_lose_the_cycle():
+    # A hostname label over 63 characters makes the IDNA codec raise
+    bad = f"tcp://{'a' * 70}.example:80"
+    with StandinTCPServer() as server:
+        good = server.url
+        engine = AsyncProbeEngine(probe_type="tcp", timeout=1)
+        results = {result.url: result for result in engine.run_cycle([good, bad], budget=2)}
+        engine.close()
+
+    assert results[good].success
+    assert results[bad].error == ErrorCode.UNEXPECTED
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from command_plan import CommandPlan, FakeRunner
+
+
+def test_steps_run_after_their_prerequisites():
+    order = []
+    lock = threading.Lock()
+
+    def step(name):
+        def action():
+            with lock:
+                order.append(name)
+        action.__name__ = name
+        return action
+
+    plan = CommandPlan(max_workers=4)
+    plan.add("first", action=step("first"))
+    plan.add("second", action=step("second"), after=["first"])
+    plan.add("third", action=step("third"), after=["second"])
+    plan.add("independent", action=step("independent"))
+    report = plan.run()
+
+    assert all(result.ok for result in report.results)
+    assert order.index("first") < order.index("second") < order.index("third")
+
+
+def test_batch_shares_one_script_and_keeps_per_step_exit_codes():
+    runner = FakeRunner(returncodes={'bad': 5})
+    plan = CommandPlan(runner)
+    plan.add("good", "netsh good", batch="netsh")
+    plan.add("bad", "netsh bad", batch="netsh", check=False)
+    plan.add("solo", "wmic solo")
+    report = plan.run()
+
+    codes = {result.step.name: result.returncode for result in report.results}
+    assert codes == {"good": 0, "bad": 5, "solo": 0}
+    assert sorted(kind for kind, _ in runner.invocations) == ['command', 'script']
+    # An unchecked failure does not fail its group
+    assert report.failures() == []
+
+
+def test_failed_checked_step_skips_dependents_inside_and_across_batches():
+    runner = FakeRunner(returncodes={'config': 1})
+    plan = CommandPlan(runner)
+    plan.add("config", "sc config", batch="sc", group="service")
+    plan.add("start", "sc start", batch="sc", after=["config"], group="service")
+    plan.add("later", "netsh later", after=["start"])
+    report = plan.run()
+
+    results = {result.step.name: result for result in report.results}
+    assert results["config"].returncode == 1
+    assert results["start"].skipped and results["later"].skipped
+    assert not report.group_ok("service")
+    assert ('command', 'netsh later') not in runner.invocations
+
+
+def test_add_rejects_duplicate_and_unknown_steps():
+    plan = CommandPlan(FakeRunner())
+    plan.add("one", "echo one")
+    with pytest.raises(ValueError):
+        plan.add("one", "echo again")
+    with pytest.raises(ValueError):
+        plan.add("two", "echo two", after=["missing"])
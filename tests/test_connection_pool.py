@@ -0,0 +1,40 @@
+from connection_pool import ConnectionPools
+from standin_server import StandinHTTPServer
+
+
+def test_opened_counts_every_connection():
+    # The delay keeps the prewarm requests in flight together, so each one
+    # opens its own connection
+    with StandinHTTPServer(server_delay=0.1) as server:
+        pools = ConnectionPools(size=8)
+        assert pools.prewarm([server.url]) == 8
+        results = [pools.probe(server.url) for _ in range(3)]
+        stats, = pools.stats().values()
+        pools.close()
+
+    assert all(result.reused for result in results)
+    assert stats == {'idle': 8, 'opened': 8}
+
+
+def test_probe_times_the_get_after_a_head():
+    with StandinHTTPServer(server_delay=0.05) as server:
+        pools = ConnectionPools()
+        result = pools.probe(server.url)
+        pools.close()
+
+    # A HEAD alone would take one delay; the timed GET takes another
+    assert result.status == 200
+    assert 50 <= result.latency < 100
+
+
+def test_cold_mode_opens_new_connections_for_every_request():
+    with StandinHTTPServer() as server:
+        pools = ConnectionPools(mode="cold")
+        results = [pools.probe(server.url) for _ in range(3)]
+        stats, = pools.stats().values()
+        pools.close()
+
+    assert not any(result.reused for result in results)
+    assert all(result.handshake_ms is not None for result in results)
+    # A HEAD and a GET per probe
+    assert stats['opened'] == 6
@@ -0,0 +1,25 @@
+import threading
+
+import daemon
+from ping_monitor import PingMonitor
+from standin_server import StandinHTTPServer
+
+
+def test_once_closes_storage_and_engines(tmp_path, monkeypatch):
+    monitors = []
+
+    with StandinHTTPServer() as server:
+        class StandinMonitor(PingMonitor):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.RIOT_ENDPOINTS = {"NA": [server.url]}
+                monitors.append(self)
+
+        monkeypatch.setattr(daemon, "PingMonitor", StandinMonitor)
+        assert daemon.main(['--once', '--format', 'text', '--storage-dir', str(tmp_path)]) == 0
+
+    monitor, = monitors
+    assert monitor.storage is None
+    assert monitor._connection_pools is None
+    assert "bus-storage" not in [thread.name for thread in threading.enumerate()]
+    assert list((tmp_path / "raw").iterdir())
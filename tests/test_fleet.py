@@ -0,0 +1,47 @@
+import pytest
+
+from daemon import parse_args
+from fleet import FleetMonitor
+
+
+class _DeadProcess:
+    exitcode = 1
+
+    def is_alive(self):
+        return False
+
+
+class _CrashingFleet(FleetMonitor):
+    def _spawn(self, shard_id):
+        self.spawns.append((shard_id, self.clock()))
+        self._processes[shard_id] = _DeadProcess()
+        self._spawned_at[shard_id] = self.clock()
+
+
+def test_crashing_worker_backs_off_then_fails():
+    clock = [1000.0]
+    messages = []
+    monitor = _CrashingFleet([("default", "http://127.0.0.1:1/")], workers=1, max_restarts=3,
+                             log_callback=messages.append, clock=lambda: clock[0])
+    monitor.spawns = []
+    monitor._running = True
+    monitor._spawn(0)
+
+    for _ in range(200):
+        clock[0] += 0.5
+        monitor._check_workers()
+
+    gaps = [later - earlier for (_, earlier), (_, later) in zip(monitor.spawns, monitor.spawns[1:])]
+    # Each crash is noticed one 0.5 s check after the spawn, then backs off
+    assert gaps == [1.5, 2.5, 4.5]
+    assert monitor.failed_shards == {0: 1}
+    assert monitor.active_workers == 0
+    assert monitor.get_summary()['failed_shards'] == [0]
+    assert "no longer probed" in messages[-1]
+
+
+@pytest.mark.parametrize("flag", [["--metrics-port", "9464"], ["--instrument"], ["--instrument-dump", "5"]])
+def test_fleet_rejects_monitor_only_flags(flag, capsys):
+    with pytest.raises(SystemExit):
+        parse_args(["--fleet", "targets.txt"] + flag)
+    assert "not supported with --fleet" in capsys.readouterr().err
@@ -0,0 +1,26 @@
+import math
+
+from history_store import PingHistoryStore
+from probe_result import CycleBatch, ErrorCode, ProbeResult
+
+
+def test_batch_keeps_each_result_time_and_status():
+    batch = CycleBatch([
+        ProbeResult("https://b.example", latency=40.0, status=200, timestamp_ns=3_000),
+        ProbeResult("https://a.example", latency=90.0, status=503, timestamp_ns=1_000),
+        ProbeResult("https://c.example", error=ErrorCode.REQUEST_TIMEOUT, timestamp_ns=2_000),
+    ])
+    store = PingHistoryStore(capacity=8, endpoint_capacity=8)
+    store.add_batch(batch)
+
+    rows = store.view().to_lists()
+    assert rows['timestamp_ns'] == [1_000, 2_000, 3_000]
+    assert [store.endpoints[endpoint] for endpoint in rows['endpoint']] == [
+        "https://a.example", "https://c.example", "https://b.example"
+    ]
+    assert rows['status'] == [503, -1, 200]
+    assert math.isnan(rows['latency'][0]) and math.isnan(rows['latency'][1])
+    assert list(store.view().latencies()) == [40.0]
+
+    assert len(store.view(start=1_500, end=2_500)) == 1
+    assert store.view(endpoint="https://a.example").to_lists()['status'] == [503]
@@ -0,0 +1,72 @@
+import re
+import urllib.request
+
+from metrics_server import LATENCY_BUCKETS, MetricsExporter
+from ping_monitor import PingMonitor
+from probe_result import CycleBatch, ErrorCode, ProbeResult
+
+URL = "https://na1.api.riotgames.com"
+
+
+def _scrape(latencies, failures=0):
+    monitor = PingMonitor(log_callback=lambda message: None)
+    exporter = MetricsExporter(monitor, port=0).start()
+    try:
+        results = [ProbeResult(URL, latency=latency, status=200) for latency in latencies]
+        results.extend(ProbeResult.failure(URL, ErrorCode.REQUEST_TIMEOUT) for _ in range(failures))
+        batch = CycleBatch(results)
+        monitor._update_stats(batch, "NA")
+        monitor.bus.publish('cycle', (batch, monitor.get_current_stats("NA")), key="NA")
+        assert monitor.flush()
+        with urllib.request.urlopen(exporter.url) as response:
+            return response.headers["Content-Type"], response.read().decode("utf-8")
+    finally:
+        exporter.stop()
+        monitor.close()
+
+
+def _samples(page, name):
+    pattern = re.compile(rf"^{name}(\{{[^}}]*\}})? (\S+)$", re.MULTILINE)
+    return [(labels, float(value)) for labels, value in pattern.findall(page)]
+
+
+def test_cycle_is_exposed_in_openmetrics_format():
+    content_type, page = _scrape([4.0, 12.0, 12.0, 60.0, 7000.0], failures=2)
+
+    assert content_type.startswith("application/openmetrics-text")
+    assert page.endswith("# EOF\n")
+    assert page.count("# EOF") == 1
+
+    assert "# TYPE ping_probe_latency_seconds histogram" in page
+    assert "# UNIT ping_probe_latency_seconds seconds" in page
+    assert "# TYPE ping_probes counter" in page
+    assert "# TYPE ping_probe_failures counter" in page
+    assert "# TYPE ping_jitter_seconds gauge" in page
+    assert "# UNIT ping_jitter_seconds seconds" in page
+    # Every UNIT line names a metric family whose TYPE was declared
+    units = re.findall(r"^# UNIT (\S+) ", page, re.MULTILINE)
+    types = re.findall(r"^# TYPE (\S+) ", page, re.MULTILINE)
+    assert units and set(units) <= set(types)
+
+    assert _samples(page, "ping_probes_total") == [(f'{{region="NA",endpoint="{URL}"}}', 7.0)]
+    assert _samples(page, "ping_probe_failures_total") == [
+        (f'{{region="NA",endpoint="{URL}",reason="request_timeout"}}', 2.0)
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    _, page = _scrape([4.0, 12.0, 12.0, 60.0, 7000.0])
+
+    buckets = _samples(page, "ping_probe_latency_seconds_bucket")
+    bounds = [re.search(r'le="([^"]+)"', labels).group(1) for labels, _ in buckets]
+    counts = [count for _, count in buckets]
+    assert bounds == [str(bound / 1000) for bound in LATENCY_BUCKETS] + ["+Inf"]
+    assert counts == sorted(counts)
+    assert counts[bounds.index("0.005")] == 1
+    assert counts[bounds.index("0.02")] == 3
+    assert counts[bounds.index("5.0")] == 4
+    assert counts[-1] == 5
+
+    assert _samples(page, "ping_probe_latency_seconds_count") == [(f'{{region="NA",endpoint="{URL}"}}', 5.0)]
+    total, = _samples(page, "ping_probe_latency_seconds_sum")
+    assert total[1] == 7.088
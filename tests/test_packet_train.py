@@ -0,0 +1,49 @@
+import random
+
+from packet_train import PacketTrain, train_summary
+from standin_server import StandinUDPEchoServer
+
+
+def test_summary_counts_duplicates_reordering_and_jitter():
+    ms = 1_000_000
+    arrivals = [
+        (0, 0, 10 * ms),
+        (2, 2 * ms, 14 * ms),
+        (1, 1 * ms, 15 * ms),
+        (1, 1 * ms, 16 * ms),
+    ]
+    summary = train_summary("udp://test", 4, arrivals)
+
+    assert summary["received"] == 3
+    assert summary["lost"] == 1
+    assert summary["loss_percent"] == 25.0
+    assert summary["duplicates"] == 1
+    assert summary["reordered"] == 1
+    # Transits 10, 12, 14 ms: J = 2/16, then J += (2 - J) / 16
+    assert summary["jitter"] == round(0.125 + (2 - 0.125) / 16, 3)
+    assert summary["rtt_min"] == 10.0
+
+
+def test_train_loss_matches_the_reflector():
+    count = 50
+    with StandinUDPEchoServer(loss=0.2, seed=3) as reflector:
+        summary = PacketTrain(reflector.url, rate_hz=250, count=count, timeout=0.5).run()
+
+    rng = random.Random(3)
+    expected = sum(rng.random() < 0.2 for _ in range(count))
+    assert summary["sent"] == count
+    assert summary["lost"] == expected
+    assert summary["duplicates"] == 0
+
+
+def test_train_counts_duplicates_and_reordering():
+    # Jitter far larger than the 4 ms send spacing reorders the replies
+    with StandinUDPEchoServer(jitter=0.05, duplicate=1.0, seed=5) as reflector:
+        summary = PacketTrain(reflector.url, rate_hz=250, count=40, timeout=0.5).run()
+
+    assert summary["lost"] == 0
+    # The train stops once every sequence is answered, so the last few
+    # duplicates can arrive after it has finished
+    assert 0 < summary["duplicates"] <= 40
+    assert summary["reordered"] > 0
+    assert summary["jitter"] > 0
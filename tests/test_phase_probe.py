@@ -0,0 +1,42 @@
+import shutil
+import ssl
+
+import pytest
+
+from phase_probe import phased_http_ping
+from probe_result import ErrorCode
+from standin_server import StandinHTTPServer, generate_self_signed_cert
+
+
+def test_server_delay_lands_in_server_time_not_connect():
+    with StandinHTTPServer(server_delay=0.1) as server:
+        result = phased_http_ping(server.url)
+
+    assert result.success and result.status == 200
+    assert result.tls_ms is None
+    assert result.connect_ms < 50
+    assert result.ttfb_ms >= 100
+    assert result.server_time >= 90
+    assert result.latency == result.ttfb_ms
+
+
+@pytest.mark.skipif(shutil.which('openssl') is None, reason="needs openssl to make a certificate")
+def test_tls_delay_lands_in_the_tls_phase(tmp_path):
+    certfile, keyfile = generate_self_signed_cert(str(tmp_path), hostname="127.0.0.1")
+    context = ssl.create_default_context(cafile=certfile)
+
+    with StandinHTTPServer(tls_delay=0.15, server_delay=0.05, certfile=certfile, keyfile=keyfile) as server:
+        result = phased_http_ping(server.url, ssl_context=context)
+
+    assert result.success
+    assert result.connect_ms < 50
+    assert result.tls_ms >= 150
+    assert 50 <= result.ttfb_ms < 150
+
+
+def test_unanswered_request_times_out():
+    with StandinHTTPServer(loss=1.0) as server:
+        result = phased_http_ping(server.url, timeout=0.3)
+
+    assert not result.success
+    assert result.error == ErrorCode.REQUEST_TIMEOUT
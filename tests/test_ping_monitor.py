@@ -0,0 +1,160 @@
+import json
+import threading
+import time
+
+import pytest
+
+from ping_monitor import PingMonitor
+from probe_result import CycleBatch, ErrorCode, ProbeResult
+from scheduler import ProbeScheduler
+from standin_server import StandinHTTPServer
+
+
+def _monitor(urls, **kwargs):
+    monitor = PingMonitor(log_callback=lambda message: None, **kwargs)
+    monitor.RIOT_ENDPOINTS = {"NA": urls}
+    monitor.set_region("NA")
+    return monitor
+
+
+def test_stop_monitor_leaves_no_storage_behind(tmp_path):
+    # The cycle is still in flight when stop_monitor gives up waiting for it
+    with StandinHTTPServer(server_delay=1.5) as server:
+        monitor = _monitor([server.url], storage_dir=str(tmp_path), prewarm=False, cycle_budget=3)
+        monitor.start_monitor(interval=1)
+        time.sleep(0.3)
+        monitor.stop_monitor()
+        time.sleep(2.0)
+
+        names = [thread.name for thread in threading.enumerate()]
+        assert monitor.storage is None
+        assert monitor.storage_subscription is None
+        assert "bus-storage" not in names
+
+
+def _batch(url, latency):
+    return CycleBatch([ProbeResult(url, latency=latency, status=200)])
+
+
+def test_ping_history_follows_the_current_region():
+    monitor = PingMonitor(log_callback=lambda message: None)
+    shared = "https://europe.api.riotgames.com"
+    monitor._update_stats(_batch(shared, 30.0), "EUW")
+    monitor._update_stats(_batch(shared, 90.0), "EUNE")
+    monitor._update_stats(_batch("https://riot.nl", 31.0), "EUW")
+
+    monitor.set_region("EUW")
+    assert monitor.get_ping_history() == [30.0, 31.0]
+    assert monitor.get_ping_history(endpoint=shared) == [30.0]
+
+    monitor.set_region("EUNE")
+    assert monitor.get_ping_history() == [90.0]
+    assert monitor.get_ping_history(region="EUW", endpoint=shared) == [30.0]
+    assert monitor.get_ping_history(region="NA") == []
+
+
+def test_endpoint_percentiles_are_kept_per_region(tmp_path):
+    monitor = PingMonitor(log_callback=lambda message: None)
+    shared = "https://europe.api.riotgames.com"
+    for _ in range(20):
+        monitor._update_stats(_batch(shared, 30.0), "EUW")
+        monitor._update_stats(_batch(shared, 90.0), "EUNE")
+
+    endpoints = monitor.get_percentiles()['endpoints']
+    assert abs(endpoints[f"EUW/{shared}"]['p99'] - 30.0) < 1
+    assert abs(endpoints[f"EUNE/{shared}"]['p50'] - 90.0) < 1
+
+    filename = str(tmp_path / "stats.json")
+    monitor.export_stats(filename)
+    with open(filename) as f:
+        sketches = json.load(f)['sketches']
+
+    merged = PingMonitor(log_callback=lambda message: None)
+    merged.merge_sketches(sketches)
+    assert set(merged.endpoint_sketches) == {("EUW", shared), ("EUNE", shared)}
+
+
+def _bus_threads():
+    return sum(thread.name.startswith("bus-") for thread in threading.enumerate())
+
+
+def test_close_releases_the_bus_threads():
+    before = _bus_threads()
+    with StandinHTTPServer() as server:
+        for _ in range(5):
+            monitor = _monitor([server.url], callback=lambda results, stats: None, prewarm=False)
+            monitor.subscribe_alerts(lambda event: None)
+            monitor.start_monitor(interval=1)
+            time.sleep(0.1)
+            monitor.close()
+    time.sleep(0.2)
+    assert _bus_threads() == before
+
+
+def test_metrics_exporter_on_a_used_port_leaves_no_subscription():
+    from metrics_server import MetricsExporter
+
+    monitor = PingMonitor(log_callback=lambda message: None)
+    exporter = MetricsExporter(monitor, port=0).start()
+    try:
+        with pytest.raises(OSError):
+            MetricsExporter(monitor, port=exporter.port).start()
+        assert list(monitor.get_bus_metrics()) == ['metrics']
+    finally:
+        exporter.stop()
+        monitor.close()
+
+
+def _timed_cycle(monitor):
+    start_time = time.monotonic()
+    batch = monitor._run_http_ping_tests()
+    return time.monotonic() - start_time, {result.url: result for result in batch}
+
+
+def test_blackholed_endpoint_is_bounded_by_the_cycle_budget():
+    with StandinHTTPServer() as good, StandinHTTPServer(blackhole=True) as hung:
+        monitor = _monitor([good.url, hung.url], prewarm=False, cycle_budget=0.5)
+        try:
+            elapsed, results = _timed_cycle(monitor)
+            assert elapsed < 1.0
+            assert results[good.url].success
+            assert results[hung.url].error == ErrorCode.CYCLE_DEADLINE
+
+            # The hung probe is still holding its worker, so it gets no new one
+            elapsed, results = _timed_cycle(monitor)
+            assert elapsed < 1.0
+            assert results[good.url].success
+            assert results[hung.url].error == ErrorCode.PREVIOUS_PROBE_RUNNING
+        finally:
+            monitor.close()
+
+
+def test_blackholed_endpoint_is_bounded_by_the_cycle_budget_on_asyncio():
+    with StandinHTTPServer() as good, StandinHTTPServer(blackhole=True) as hung:
+        monitor = _monitor([good.url, hung.url], engine="asyncio", prewarm=False, cycle_budget=0.5)
+        try:
+            # A late task is cancelled at the deadline, so every cycle ends the same way
+            for _ in range(2):
+                elapsed, results = _timed_cycle(monitor)
+                assert elapsed < 1.0
+                assert results[good.url].success
+                assert results[hung.url].error == ErrorCode.CYCLE_DEADLINE
+        finally:
+            monitor.close()
+
+
+def test_reconfigure_moves_the_schedule_onto_the_new_interval():
+    clock = [0.0]
+    monitor = _monitor(["https://example.com"])
+    monitor.interval = 5
+    monitor.scheduler = ProbeScheduler(5, clock=lambda: clock[0])
+    monitor.scheduler.set_keys(["NA"])
+    assert monitor.scheduler.wait() == [("NA", 0.0)]
+
+    clock[0] = 1.0
+    monitor.reconfigure(2)
+    assert monitor.interval == 2
+    assert monitor.scheduler.interval_for("NA") == 2
+    assert monitor.scheduler.wait() == [("NA", 1.0)]
+    clock[0] = 3.0
+    assert monitor.scheduler.wait() == [("NA", 3.0)]
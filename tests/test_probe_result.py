@@ -0,0 +1,20 @@
+import probe_result
+from probe_result import wall_time
+
+
+def test_wall_time_follows_a_clock_step(monkeypatch):
+    clock = {'counter': 10 ** 12, 'wall': 1_700_000_000 * 10 ** 9}
+    monkeypatch.setattr(probe_result.time, "perf_counter_ns", lambda: clock['counter'])
+    monkeypatch.setattr(probe_result.time, "time_ns", lambda: clock['wall'])
+    monkeypatch.setattr(probe_result, "_wall_anchor", probe_result._anchor())
+    assert wall_time(clock['counter']) == 1_700_000_000
+
+    # One second later the wall clock is stepped 5 s forward, e.g. by NTP.
+    # The old offset still applies until it is due to be measured again.
+    clock['wall'] += 6 * 10 ** 9
+    clock['counter'] += 10 ** 9
+    assert wall_time(clock['counter']) == 1_700_000_001
+
+    clock['wall'] += 60 * 10 ** 9
+    clock['counter'] += 60 * 10 ** 9
+    assert wall_time(clock['counter']) == 1_700_000_066
@@ -0,0 +1,157 @@
+import json
+import types
+
+import qos_state
+from command_plan import FakeRunner
+from qos_policy import QosPolicy
+from qos_state import FakeStateBackend, WindowsStateBackend, diff_state
+
+ORIGINAL = {
+    "service:Psched": {'start': 'demand', 'running': False},
+    "registry:TCPNoDelay": 0,
+    "tcp_global:rss": "disabled",
+}
+
+
+def _policy(backend, tmp_path, windows_home=True):
+    return QosPolicy(backend=backend, windows_home=windows_home, snapshot_path=str(tmp_path / "snapshot.json"))
+
+
+def test_second_enable_runs_no_commands(tmp_path):
+    backend = FakeStateBackend(ORIGINAL)
+    policy = _policy(backend, tmp_path)
+    assert policy.enable_qos()
+    assert backend.runner.invocations
+
+    before = len(backend.runner.invocations)
+    assert policy.enable_qos()
+    assert len(backend.runner.invocations) == before
+    assert policy.last_diff['changed'] == []
+    assert policy.last_diff['in_place'] == len(policy._home_state())
+
+
+def test_disable_restores_snapshot_and_removes_it(tmp_path):
+    backend = FakeStateBackend(ORIGINAL)
+    policy = _policy(backend, tmp_path)
+    policy.enable_qos()
+
+    snapshot = json.loads((tmp_path / "snapshot.json").read_text())
+    assert snapshot["registry:TCPNoDelay"] == 0
+    assert snapshot["firewall:LoL_Traffic_Priority_UDP"] is None
+
+    # A second enable must not overwrite the original values
+    policy.enable_qos()
+    assert json.loads((tmp_path / "snapshot.json").read_text()) == snapshot
+
+    assert policy.disable_qos()
+    assert backend.state == ORIGINAL
+    assert not (tmp_path / "snapshot.json").exists()
+
+
+def test_partial_failure_is_retried_and_keeps_the_snapshot(tmp_path):
+    backend = FakeStateBackend(ORIGINAL, returncodes={'registry:TCPNoDelay': 1})
+    policy = _policy(backend, tmp_path)
+
+    assert policy.enable_qos()
+    assert not policy.last_report.group_ok('tcp_settings')
+    assert policy.last_report.group_ok('firewall')
+    assert backend.state["registry:TCPNoDelay"] == 0
+
+    policy.enable_qos()
+    assert policy.last_diff['changed'] == ["registry:TCPNoDelay"]
+
+    # The failing key cannot be restored either, so the rollback is kept
+    backend.state["registry:TCPNoDelay"] = 5
+    assert not policy.disable_qos()
+    assert (tmp_path / "snapshot.json").exists()
+
+    backend.runner.returncodes.clear()
+    assert policy.disable_qos()
+    assert backend.state == ORIGINAL
+
+
+def test_standard_policy_falls_back_to_home_state(tmp_path):
+    backend = FakeStateBackend({}, returncodes={'qos_policy:': 1})
+    policy = _policy(backend, tmp_path, windows_home=False)
+
+    assert policy.enable_qos()
+    assert "qos_policy:LoL_Traffic_Priority" not in backend.state
+    assert backend.state["firewall:LoL_Traffic_Priority_UDP"]['localport'] == policy.lol_ports
+
+
+def test_fake_runner_never_writes_a_snapshot_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    policy = QosPolicy(runner=FakeRunner(), windows_home=True)
+    assert policy.enable_qos()
+    assert policy.snapshot_path is None
+    assert policy.disable_qos()
+    assert policy.backend.state == {}
+
+
+def test_reconcile_runs_through_the_given_fake_runner():
+    runner = FakeRunner(returncodes={'registry:TCPNoDelay': 1})
+    policy = QosPolicy(runner=runner, windows_home=True)
+
+    assert policy.enable_qos()
+    assert runner.invocations
+    assert not policy.last_report.group_ok('tcp_settings')
+    assert "registry:TCPNoDelay" not in policy.backend.state
+
+
+def test_unreadable_state_is_reported_as_failed(tmp_path):
+    backend = FakeStateBackend(ORIGINAL)
+    backend.read = lambda keys: {}
+    policy = _policy(backend, tmp_path, windows_home=False)
+
+    assert not policy.enable_qos()
+    assert not backend.runner.invocations
+    assert not policy.last_report.group_ok('firewall')
+    assert len(policy.last_report.failures()) == len(policy._home_state())
+    assert backend.state == ORIGINAL
+
+
+def test_diff_ignores_port_range_spelling_and_unreadable_keys():
+    desired = {
+        "firewall:rule": {'protocol': 'UDP', 'localport': '5000-5002,8443,8444'},
+        "tcp_global:chimney": 'enabled',
+    }
+    current = {"firewall:rule": {'protocol': 'udp', 'localport': '5000,5001-5002,8443-8444', 'action': 'allow'}}
+    assert diff_state(current, desired) == ([], ["tcp_global:chimney"])
+
+
+def test_windows_backend_parses_state_from_one_script():
+    outputs = {
+        'show rule': "Rule Name: r\nDirection: Out\nProfiles: Domain,Private,Public\nProtocol: UDP\n"
+                     "LocalPort: 5000-5500,8088,8443-8444\nAction: Allow",
+        'sc qc': "        START_TYPE         : 2   AUTO_START",
+        'sc query': "        STATE              : 4  RUNNING",
+        'tcp show global': "Receive-Side Scaling State          : enabled",
+        'get Priority': "Priority=13\n\nPriority=8\n",
+    }
+    runner = FakeRunner(outputs=outputs)
+    keys = ["firewall:r", "service:Psched", "tcp_global:rss", "tcp_global:chimney", "process:League.exe"]
+    state = WindowsStateBackend(runner).read(keys)
+
+    assert [kind for kind, _ in runner.invocations] == ['script']
+    assert state["firewall:r"]['profile'] == 'any'
+    assert state["service:Psched"] == {'start': 'auto', 'running': True}
+    assert state["tcp_global:rss"] == 'enabled'
+    assert "tcp_global:chimney" not in state
+    assert state["process:League.exe"] == 'normal'
+
+
+def test_windows_backend_treats_deleting_an_absent_value_as_done(monkeypatch):
+    class Key:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            pass
+
+    def delete_value(key, name):
+        raise FileNotFoundError(2, "The system cannot find the file specified")
+
+    fake_winreg = types.SimpleNamespace(HKEY_LOCAL_MACHINE=0, KEY_SET_VALUE=2, OpenKey=lambda *args: Key(),
+                                        DeleteValue=delete_value)
+    monkeypatch.setattr(qos_state, 'winreg', fake_winreg)
+    assert WindowsStateBackend(None)._write_registry('TcpAckFrequency', None)
@@ -0,0 +1,27 @@
+from quantile_sketch import QuantileSketch
+
+
+def _sketch(values):
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def test_quantile_rank_rounds_up():
+    sketch = _sketch([10, 11, 12])
+    assert abs(sketch.quantile(0.95) - 12) <= 12 * sketch.relative_accuracy
+    assert abs(sketch.quantile(0.5) - 11) <= 11 * sketch.relative_accuracy
+    assert abs(sketch.quantile(0.0) - 10) <= 10 * sketch.relative_accuracy
+    assert sketch.quantile(1.0) == 12
+
+
+def test_quantiles_stay_within_relative_accuracy():
+    sketch = _sketch(range(1, 101))
+    for q, expected in ((0.5, 51), (0.95, 96), (0.99, 100)):
+        assert abs(sketch.quantile(q) - expected) <= expected * sketch.relative_accuracy
+
+
+def test_merge_matches_a_single_sketch():
+    merged = _sketch(range(1, 51)).merge(_sketch(range(51, 101)))
+    assert merged.quantiles([0.5, 0.95, 0.99]) == _sketch(range(1, 101)).quantiles([0.5, 0.95, 0.99])
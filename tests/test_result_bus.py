@@ -0,0 +1,18 @@
+from result_bus import ResultBus
+
+
+def test_handler_errors_are_counted_and_reported_once_per_interval():
+    reports = []
+    bus = ResultBus(on_error=lambda name, error, suppressed: reports.append((name, str(error), suppressed)))
+
+    def broken(topic, payload):
+        raise ValueError(f"bad payload {payload}")
+
+    bus.subscribe(broken, name='storage')
+    for index in range(5):
+        bus.publish('results', index)
+    assert bus.drain()
+
+    assert bus.metrics()['storage']['errors'] == 5
+    assert reports == [('storage', 'bad payload 0', 0)]
+    bus.close()
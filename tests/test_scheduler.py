@@ -0,0 +1,70 @@
+import threading
+import time
+
+from scheduler import ProbeScheduler
+
+
+def _scheduler(interval):
+    clock = [0.0]
+    return ProbeScheduler(interval, clock=lambda: clock[0]), clock
+
+
+def test_keys_are_spread_evenly_over_one_interval():
+    scheduler, clock = _scheduler(10)
+    scheduler.set_keys(["NA", "EUW"])
+
+    assert scheduler.wait() == [("NA", 0.0)]
+    clock[0] = 5.0
+    assert scheduler.wait() == [("EUW", 5.0)]
+    clock[0] = 10.0
+    assert scheduler.wait() == [("NA", 10.0)]
+
+
+def test_slow_cycles_do_not_push_later_deadlines_back():
+    scheduler, clock = _scheduler(10)
+    scheduler.set_keys(["NA"])
+
+    deadlines = []
+    for _ in range(4):
+        for _, deadline in scheduler.wait():
+            deadlines.append(deadline)
+            # Every cycle takes 3 s, which a sleep-after-cycle loop would add on
+            clock[0] = deadline + 3.0
+        clock[0] = max(clock[0], deadlines[-1] + 10.0)
+
+    assert deadlines == [0.0, 10.0, 20.0, 30.0]
+    assert scheduler.missed_deadlines == 0
+
+
+def test_overrun_skips_whole_ticks_and_counts_them():
+    scheduler, clock = _scheduler(10)
+    scheduler.set_keys(["NA"])
+    assert scheduler.wait() == [("NA", 0.0)]
+
+    # The cycle ran until 35 s: the 10 s deadline fires once, 20 and 30 are skipped
+    clock[0] = 35.0
+    assert scheduler.wait() == [("NA", 10.0)]
+    assert scheduler.missed_deadlines == 2
+
+    clock[0] = 40.0
+    assert scheduler.wait() == [("NA", 40.0)]
+    assert scheduler.missed_deadlines == 2
+
+
+def test_stop_wakes_a_pending_wait():
+    scheduler = ProbeScheduler(60)
+    scheduler.set_keys(["NA"])
+    assert [key for key, _ in scheduler.wait()] == ["NA"]
+
+    returned = []
+    waiter = threading.Thread(target=lambda: returned.append(scheduler.wait()))
+    waiter.start()
+    time.sleep(0.1)
+
+    start_time = time.monotonic()
+    scheduler.stop()
+    waiter.join(timeout=1)
+
+    assert not waiter.is_alive()
+    assert time.monotonic() - start_time < 0.5
+    assert returned == [[]]
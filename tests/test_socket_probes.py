@@ -0,0 +1,67 @@
+import random
+import socket
+
+from probe_result import ErrorCode
+from socket_probes import UdpEchoProbe, split_target, tcp_connect_ping
+from standin_server import StandinTCPServer, StandinUDPEchoServer
+
+
+def _expected_drops(seed, loss, count):
+    # The echo server draws once per datagram to decide whether to drop it
+    rng = random.Random(seed)
+    return sum(rng.random() < loss for _ in range(count))
+
+
+def test_udp_echo_measures_the_injected_delay():
+    with StandinUDPEchoServer(delay=0.05) as server:
+        probe = UdpEchoProbe(server.url)
+        result = probe.ping(timeout=1)
+        probe.close()
+
+    assert result.success and result.protocol == "udp"
+    assert 50 <= result.latency < 250
+
+
+def test_udp_echo_loss_accounting_matches_the_server():
+    count = 40
+    with StandinUDPEchoServer(loss=0.25, seed=7) as server:
+        probe = UdpEchoProbe(server.url)
+        results = [probe.ping(timeout=0.2) for _ in range(count)]
+        probe.close()
+        received = server.received
+
+    timeouts = [result for result in results if result.error == ErrorCode.ECHO_TIMEOUT]
+    assert received == count
+    assert len(timeouts) == _expected_drops(7, 0.25, count)
+    assert all(result.success for result in results if result not in timeouts)
+
+
+def test_late_reply_to_an_earlier_probe_is_not_taken_for_the_current_one():
+    with StandinUDPEchoServer(delay=0.3) as server:
+        probe = UdpEchoProbe(server.url)
+        first = probe.ping(timeout=0.1)
+        # The first probe's echo arrives 0.2 s into this one and must be skipped
+        second = probe.ping(timeout=1)
+        probe.close()
+
+    assert first.error == ErrorCode.ECHO_TIMEOUT
+    assert second.success
+    assert second.latency >= 290
+
+
+def test_tcp_connect_succeeds_and_reports_refused_ports():
+    with StandinTCPServer() as server:
+        result = tcp_connect_ping(server.url)
+    assert result.success and result.protocol == "tcp"
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        closed_port = sock.getsockname()[1]
+    result = tcp_connect_ping(f"tcp://127.0.0.1:{closed_port}", timeout=1)
+    assert result.error == ErrorCode.CONNECTION_FAILED
+
+
+def test_udp_targets_use_the_echo_port_unless_given_one():
+    assert UdpEchoProbe('https://riot.nl', 5000).address == ('riot.nl', 5000)
+    assert UdpEchoProbe('udp://riot.nl:5100', 5000).address == ('riot.nl', 5100)
+    assert split_target('https://riot.nl', 5000) == ('riot.nl', 443)
@@ -0,0 +1,41 @@
+import time
+
+from probe_result import CycleBatch, ProbeResult
+from timeseries_store import TimeSeriesStore
+
+URL = "https://example.test/"
+
+
+def _batch(latency):
+    return CycleBatch([ProbeResult(URL, latency=latency, status=200)])
+
+
+def test_reopen_does_not_duplicate_open_rollup_buckets(tmp_path):
+    now = time.time()
+    store = TimeSeriesStore(str(tmp_path), rollup_interval=60)
+    store.append_batch(_batch(10.0), timestamp=now)
+    store.close()
+
+    store = TimeSeriesStore(str(tmp_path), rollup_interval=60)
+    store.append_batch(_batch(30.0), timestamp=now + 0.5)
+    # Flushing everything stands in for the buckets' windows ending
+    store._rollup(cutoff=now + 7200)
+    rows = store.query(now - 3600, now + 3600, tier='1m')
+    store.close()
+
+    assert len(rows) == 1
+    assert rows[0]['count'] == 2
+    assert rows[0]['min'] == 10.0 and rows[0]['max'] == 30.0
+
+
+def test_rollup_query_returns_buckets_overlapping_the_range(tmp_path):
+    start = 1699999980.0  # minute aligned
+    store = TimeSeriesStore(str(tmp_path), rollup_interval=60)
+    store.append_batch(_batch(20.0), timestamp=start + 5)
+    store._rollup(cutoff=start + 7200)
+
+    rows = store.query(start + 50, start + 60, tier='1m')
+    assert [row['timestamp'] for row in rows] == [start]
+    assert store.query(start + 3600, start + 3610, tier='1m') == []
+    assert len(store.query(start, start + 10, tier='raw')) == 1
+    store.close()
@@ -0,0 +1,294 @@
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from probe_result import wall_time
+from quantile_sketch import QuantileSketch
+
+RAW_RECORD = struct.Struct('<dIfh')
+ROLLUP_RECORD = struct.Struct('<dIIIffffff')
+ROLLUP_TIERS = (('1s', 1), ('1m', 60), ('1h', 3600))
+DEFAULT_RETENTION_DAYS = {'raw': 7, '1s': 7, '1m': 90, '1h': 730}
+
+
+class _Bucket:
+    __slots__ = ('count', 'failures', 'min', 'max', 'total', 'sketch')
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.min = float('inf')
+        self.max = 0.0
+        self.total = 0.0
+        self.sketch = QuantileSketch()
+
+    def add(self, latency):
+        if math.isnan(latency):
+            self.failures += 1
+            return
+        self.count += 1
+        self.min = min(self.min, latency)
+        self.max = max(self.max, latency)
+        self.total += latency
+        self.sketch.add(latency)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'failures': self.failures,
+            'min': self.min if self.count else None,
+            'max': self.max,
+            'total': self.total,
+            'sketch': self.sketch.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        bucket = cls()
+        bucket.count = data['count']
+        bucket.failures = data['failures']
+        if data['min'] is not None:
+            bucket.min = data['min']
+        bucket.max = data['max']
+        bucket.total = data['total']
+        bucket.sketch = QuantileSketch.from_dict(data['sketch'])
+        return bucket
+
+
+def _latency(value):
+    return None if math.isnan(value) else round(value, 1)
+
+
+def _day_name(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y%m%d')
+
+
+class TimeSeriesStore:
+    def __init__(self, directory, retention_days=None, rollup_interval=1.0, grace=2.0):
+        self.directory = directory
+        self.retention_days = dict(DEFAULT_RETENTION_DAYS, **(retention_days or {}))
+        self.rollup_interval = rollup_interval
+        self.grace = grace
+
+        for tier in self.retention_days:
+            os.makedirs(os.path.join(directory, tier), exist_ok=True)
+
+        self._endpoints_path = os.path.join(directory, 'endpoints.json')
+        self.endpoints = []
+        if os.path.exists(self._endpoints_path):
+            with open(self._endpoints_path) as f:
+                self.endpoints = json.load(f)
+        self._endpoint_ids = {url: index for index, url in enumerate(self.endpoints)}
+
+        self._lock = threading.Lock()
+        self._files = {}
+        self._pending = deque()
+        self._open_buckets = {}
+        self._last_retention = 0
+
+        # Buckets still open when the store was last closed carry on here, so
+        # a restart never writes a second row for the same bucket
+        self._open_buckets_path = os.path.join(directory, 'open_buckets.json')
+        if os.path.exists(self._open_buckets_path):
+            try:
+                with open(self._open_buckets_path) as f:
+                    for tier, start, endpoint_id, data in json.load(f):
+                        self._open_buckets[(tier, start, endpoint_id)] = _Bucket.from_dict(data)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: Could not reload open rollup buckets: {e}")
+            os.remove(self._open_buckets_path)
+
+        self._stop = threading.Event()
+        self._rollup_thread = threading.Thread(target=self._rollup_loop, daemon=True)
+        self._rollup_thread.start()
+
+    def _endpoint_id(self, url):
+        endpoint_id = self._endpoint_ids.get(url)
+        if endpoint_id is None:
+            endpoint_id = len(self.endpoints)
+            self.endpoints.append(url)
+            self._endpoint_ids[url] = endpoint_id
+            with open(self._endpoints_path, 'w') as f:
+                json.dump(self.endpoints, f)
+        return endpoint_id
+
+    def _segment_path(self, tier, day):
+        return os.path.join(self.directory, tier, f'{day}.bin')
+
+    def _append(self, tier, day, data, record_size):
+        handle = self._files.get(tier)
+        if handle is None or handle[0] != day:
+            if handle:
+                handle[1].close()
+            f = open(self._segment_path(tier, day), 'ab')
+            # Drop a torn trailing record left by a crash so offsets stay aligned
+            f.truncate(f.tell() - f.tell() % record_size)
+            f.seek(0, os.SEEK_END)
+            handle = self._files[tier] = (day, f)
+        handle[1].write(data)
+        handle[1].flush()
+
+    def append_batch(self, batch, timestamp=None):
+        if not batch:
+            return
+        if timestamp is None:
+            # Stamped with when the cycle ran rather than when it reached the
+            # store, which may be later if the writer queue was backed up
+            timestamp = wall_time(min(batch.timestamp_ns))
+
+        with self._lock:
+            records = []
+            for url, latency, status in zip(batch.urls, batch.latency, batch.status):
+                endpoint_id = self._endpoint_id(url)
+                if latency != latency:
+                    status = -1
+                records.append(RAW_RECORD.pack(timestamp, endpoint_id, latency, status))
+                self._pending.append((timestamp, endpoint_id, latency))
+
+            if records:
+                self._append('raw', _day_name(timestamp), b''.join(records), RAW_RECORD.size)
+
+    def _rollup_loop(self):
+        while not self._stop.wait(self.rollup_interval):
+            try:
+                self._rollup()
+            except Exception as e:
+                print(f"Warning: Time-series rollup failed: {e}")
+
+    def _rollup(self, cutoff=None):
+        while self._pending:
+            timestamp, endpoint_id, latency = self._pending.popleft()
+            for tier, width in ROLLUP_TIERS:
+                start = timestamp - timestamp % width
+                bucket = self._open_buckets.get((tier, start, endpoint_id))
+                if bucket is None:
+                    bucket = self._open_buckets[(tier, start, endpoint_id)] = _Bucket()
+                bucket.add(latency)
+
+        if cutoff is None:
+            cutoff = time.time() - self.grace
+        widths = dict(ROLLUP_TIERS)
+        closed = sorted(key for key in self._open_buckets if key[1] + widths[key[0]] <= cutoff)
+
+        with self._lock:
+            for tier, start, endpoint_id in closed:
+                bucket = self._open_buckets.pop((tier, start, endpoint_id))
+                if bucket.count:
+                    summary = [bucket.min, bucket.max, bucket.total / bucket.count]
+                    summary.extend(bucket.sketch.quantiles([0.5, 0.95, 0.99]))
+                else:
+                    summary = [math.nan] * 6
+                record = ROLLUP_RECORD.pack(start, endpoint_id, bucket.count, bucket.failures, *summary)
+                self._append(tier, _day_name(start), record, ROLLUP_RECORD.size)
+
+        if time.time() - self._last_retention > 60:
+            self._last_retention = time.time()
+            with self._lock:
+                self.enforce_retention()
+
+    def enforce_retention(self, now=None):
+        now = now or time.time()
+        for tier, days in self.retention_days.items():
+            oldest = _day_name(now - days * 86400)
+            for name in os.listdir(os.path.join(self.directory, tier)):
+                day = name.split('.')[0]
+                current = self._files.get(tier)
+                if day < oldest and not (current and current[0] == day):
+                    try:
+                        os.remove(os.path.join(self.directory, tier, name))
+                    except OSError as e:
+                        print(f"Warning: Could not remove {name}: {e}")
+
+    def query(self, start, end, endpoint=None, tier='raw'):
+        record = RAW_RECORD if tier == 'raw' else ROLLUP_RECORD
+        # A rollup bucket is returned when any part of it overlaps the range,
+        # so the search starts one bucket width early
+        width = dict(ROLLUP_TIERS).get(tier, 0)
+        endpoint_id = None
+        if endpoint is not None:
+            endpoint_id = self._endpoint_ids.get(endpoint)
+            if endpoint_id is None:
+                return []
+
+        rows = []
+        day = datetime.fromtimestamp(start - width, timezone.utc).date()
+        last_day = datetime.fromtimestamp(end, timezone.utc).date()
+        while day <= last_day:
+            path = self._segment_path(tier, day.strftime('%Y%m%d'))
+            day += timedelta(days=1)
+            if not os.path.exists(path) or os.path.getsize(path) < record.size:
+                continue
+
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                count = len(mapped) // record.size
+                first = self._search(mapped, record, count, start - width, inclusive=width > 0)
+                last = self._search(mapped, record, count, end, inclusive=True)
+                view = memoryview(mapped)[first * record.size:last * record.size]
+                try:
+                    for values in record.iter_unpack(view):
+                        if endpoint_id is None or values[1] == endpoint_id:
+                            rows.append(self._row(tier, values))
+                finally:
+                    view.release()
+        return rows
+
+    def _search(self, mapped, record, count, timestamp, inclusive):
+        # Records are appended in time order, so the timestamp column is sorted
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            value = struct.unpack_from('<d', mapped, middle * record.size)[0]
+            if value < timestamp or (inclusive and value == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _row(self, tier, values):
+        if tier == 'raw':
+            timestamp, endpoint_id, latency, status = values
+            return {
+                'timestamp': timestamp,
+                'url': self.endpoints[endpoint_id],
+                'latency': _latency(latency),
+                'status': status
+            }
+
+        start, endpoint_id, count, failures, low, high, mean, p50, p95, p99 = values
+        return {
+            'timestamp': start,
+            'url': self.endpoints[endpoint_id],
+            'count': count,
+            'failures': failures,
+            'min': _latency(low),
+            'max': _latency(high),
+            'mean': _latency(mean),
+            'p50': _latency(p50),
+            'p95': _latency(p95),
+            'p99': _latency(p99)
+        }
+
+    def close(self):
+        self._stop.set()
+        self._rollup_thread.join(timeout=self.rollup_interval + 1)
+        # No sample older than now can arrive any more, so only buckets whose
+        # window has ended are written; the rest wait for the next open
+        self._rollup(cutoff=time.time())
+        if self._open_buckets:
+            try:
+                with open(self._open_buckets_path, 'w') as f:
+                    json.dump([[tier, start, endpoint_id, bucket.to_dict()]
+                               for (tier, start, endpoint_id), bucket in self._open_buckets.items()], f)
+            except OSError as e:
+                print(f"Warning: Could not save open rollup buckets: {e}")
+
+        with self._lock:
+            for _, f in self._files.values():
+                f.close()
+            self._files.clear()